@@ -0,0 +1,133 @@
+import asyncio
+import os
+import sys
+from typing import List, Optional, Union
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+
+current_dir = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(current_dir))
+
+from Comun.fusion import Fusionador
+
+app = FastAPI()
+
+# Muestras fusionadas que se guardan por cliente de /ws/fusion si no alcanza a leerlas
+MAX_PENDIENTES = 200
+
+fusionador = Fusionador()
+
+# Colas de los clientes conectados a /ws/fusion
+suscriptores = set()
+
+
+def publicar():
+    """Envía a los suscriptores la muestra fusionada, si ya toca una nueva."""
+    muestra = fusionador.extraer()
+    if muestra is None:
+        return
+    for cola in suscriptores:
+        if cola.full():
+            # Cliente lento: se descarta la muestra más vieja
+            cola.get_nowait()
+        cola.put_nowait(muestra)
+
+
+def como_lista(mensajes):
+    return mensajes if isinstance(mensajes, list) else [mensajes]
+
+
+def ingresar(fuente, mensajes):
+    """Agrega uno o varios mensajes de una fuente; devuelve cuántos se aceptaron."""
+    agregar = fusionador.agregar_imu if fuente == "imu" else fusionador.agregar_vision
+    for mensaje in como_lista(mensajes):
+        if not isinstance(mensaje, dict) or "t" not in mensaje:
+            raise ValueError(f"Mensaje de {fuente} sin tiempo 't'")
+        try:
+            agregar(mensaje)
+        except (TypeError, KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"Mensaje de {fuente} inválido: {e}")
+        publicar()
+    return len(como_lista(mensajes))
+
+
+@app.post("/imu")
+async def recibir_imu(mensajes: Union[dict, List[dict]]):
+    """Lote(s) de muestras del IMU en el reloj de los sensores.
+
+    {"t": [s, ...], "angulos": {"rodilla_derecha": [°, ...], ...},
+     "eventos": [{"tipo": "talon", "t": s, "lado": "derecho"}, ...]}
+    """
+    try:
+        return {"status": "ok", "recibidos": ingresar("imu", mensajes)}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.post("/vision")
+async def recibir_vision(mensajes: Union[dict, List[dict]]):
+    """Frame(s) de la visión en el reloj de la cámara.
+
+    {"t": s, "angulos": [6 ángulos de COLUMNAS_ANGULOS], "validos": [der, izq], "fase": "MID-STANCE"}
+    """
+    try:
+        return {"status": "ok", "recibidos": ingresar("vision", mensajes)}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+async def recibir_flujo(websocket, fuente):
+    """Recibe mensajes JSON de una fuente hasta que el cliente se desconecta."""
+    await websocket.accept()
+    try:
+        while True:
+            mensajes = await websocket.receive_json()
+            try:
+                ingresar(fuente, mensajes)
+            except ValueError as e:
+                await websocket.send_json({"status": "error", "message": str(e)})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+
+@app.websocket("/ws/imu")
+async def imu_ws(websocket: WebSocket):
+    await recibir_flujo(websocket, "imu")
+
+
+@app.websocket("/ws/vision")
+async def vision_ws(websocket: WebSocket):
+    await recibir_flujo(websocket, "vision")
+
+
+@app.websocket("/ws/fusion")
+async def fusion_ws(websocket: WebSocket):
+    """Envía cada muestra fusionada en cuanto se produce.
+
+    Cada mensaje es un JSON con "t" (línea de tiempo de los sensores),
+    "angulos" (°, por articulación), "porcentaje_ciclo", "fase" y "fuentes".
+    """
+    await websocket.accept()
+    cola = asyncio.Queue(maxsize=MAX_PENDIENTES)
+    suscriptores.add(cola)
+    try:
+        while True:
+            await websocket.send_json(await cola.get())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        suscriptores.discard(cola)
+
+
+@app.get("/estado")
+async def estado():
+    """Desfase estimado entre relojes, zancada y corrección de cada articulación."""
+    return {**fusionador.estado(), "suscriptores": len(suscriptores)}
+
+
+@app.post("/reiniciar")
+async def reiniciar(max_desfase: Optional[float] = None):
+    """Empieza una nueva fusión (otro paciente o sesión)."""
+    global fusionador
+    config = {} if max_desfase is None else {"max_desfase": max_desfase}
+    fusionador = Fusionador(**config)
+    return {"status": "ok", "message": "Fusión reiniciada"}
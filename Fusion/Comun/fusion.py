@@ -0,0 +1,361 @@
+# Fusión de sensores inerciales y visión computacional en una misma línea de tiempo.
+# Los dos servicios corren por separado, cada uno con su reloj y su retraso:
+# la visión entrega los ángulos de cada frame con la latencia de mediapipe y
+# los sensores entregan lotes de muestras por BLE. Aquí:
+#   1. AlineadorEventos estima el desfase entre ambos relojes con la
+#      correlación cruzada de los contactos iniciales que detecta cada fuente
+#      (el talón del DetectorPasos y el inicio de la fase en la visión).
+#   2. FusionArticulacion combina cada ángulo con un filtro complementario:
+#      los incrementos del IMU dan la dinámica (suaves, a 200 Hz, pero con
+#      deriva) y la visión corrige el valor absoluto (sin deriva, pero con
+#      ruido y a 30 fps). La misma corrección absorbe el desfase de montaje
+#      entre el ángulo del IMU y la convención de la visión.
+#   3. FaseFusion sigue el porcentaje del ciclo de la marcha: avanza con la
+#      duración de la zancada, se reinicia en cada talón del IMU y se corrige
+#      hacia la fase que predice la visión.
+# Todo se actualiza conforme llegan los datos, con costo acotado por muestra:
+# cada frame se empareja con el IMU con una búsqueda binaria en su historial.
+
+import math
+from bisect import bisect_left
+from collections import deque
+
+import numpy as np
+
+# Columnas de ángulos de la visión (COLUMNAS_ANGULOS de VisionComputacional/Comun/cinematica.py)
+ARTICULACIONES_VISION = ["cadera_derecha", "rodilla_derecha", "tobillo_derecha",
+                         "cadera_izquierda", "rodilla_izquierda", "tobillo_izquierda"]
+
+# Las fases de la visión son las de la pierna izquierda; el contacto inicial
+# derecho es el inicio del pre-balanceo izquierdo (VisionComputacional/Comun/ciclos.py)
+CONTACTO_VISION = {"izquierdo": "INITIAL CONTACT", "derecho": "PRE-SWING"}
+
+# Fases del ciclo (pierna izquierda) y porcentaje del ciclo en que terminan (Perry, 1992)
+FASES = [
+    ("INITIAL CONTACT", 2), ("LOADING RESPONSE", 12), ("MID-STANCE", 31), ("TERMINAL STANCE", 50),
+    ("PRE-SWING", 62), ("INITIAL SWING", 75), ("MID-SWING", 87), ("TERMINAL SWING", 100),
+]
+CENTRO_FASE = {}
+_inicio = 0
+for _fase, _fin in FASES:
+    CENTRO_FASE[_fase] = (_inicio + _fin) / 2
+    _inicio = _fin
+
+# Porcentaje del ciclo izquierdo en que ocurre el contacto inicial de cada pie
+CONTACTO_PORCENTAJE = {"izquierdo": 0.0, "derecho": 50.0}
+
+CONFIG_FUSION = dict(
+    max_desfase=0.5,          # s; desfase máximo entre relojes (menor que media zancada)
+    ancho_evento=0.04,        # s; tolerancia al comparar eventos de ambas fuentes
+    paso_desfase=0.005,       # s; resolución de la búsqueda del desfase
+    eventos_alineacion=16,    # últimos eventos de cada fuente usados para alinear
+    eventos_minimos=4,        # pares de eventos a menos de ancho_evento para aceptar un desfase
+    confirmacion_fase=2,      # frames seguidos para aceptar un contacto inicial de la visión
+    ganancia_vision=0.05,     # peso de cada corrección de la visión sobre el ángulo
+    ganancia_fase=0.1,        # peso de cada corrección de la visión sobre la fase
+    zancada_inicial=1.1,      # s; duración de la zancada antes de medirla
+    historial=3.0,            # s de muestras del IMU que se conservan para emparejar frames
+    frecuencia_salida=50.0,   # muestras por segundo del flujo fusionado
+)
+
+
+def fase_de_porcentaje(porcentaje):
+    for fase, fin in FASES:
+        if porcentaje < fin:
+            return fase
+    return FASES[-1][0]
+
+
+def estimar_desfase(eventos_imu, eventos_vision, **config):
+    """Desfase d (s) tal que t_imu ≈ t_vision + d, por correlación cruzada de eventos.
+
+    `eventos_imu` y `eventos_vision` son {lado: tiempos}. Cada evento se
+    representa con una gaussiana de ancho `ancho_evento` y se busca el
+    desplazamiento dentro de ±`max_desfase` que más eventos del mismo lado
+    hace coincidir. Devuelve (desfase, emparejados) o (None, 0), donde
+    emparejados es el número de eventos del IMU que quedan a menos de
+    `ancho_evento` de un evento de la visión con ese desfase.
+    """
+    config = {**CONFIG_FUSION, **config}
+    ancho = config['ancho_evento']
+    desfases = np.arange(-config['max_desfase'], config['max_desfase'] + 1e-9, config['paso_desfase'])
+    puntaje = np.zeros(len(desfases))
+    # Diferencias t_imu - t_vision (eventos del IMU x eventos de la visión) de cada lado
+    pares = []
+    for lado, tiempos_imu in eventos_imu.items():
+        tiempos_vision = eventos_vision.get(lado)
+        if not len(tiempos_imu) or tiempos_vision is None or not len(tiempos_vision):
+            continue
+        diferencias = np.subtract.outer(np.asarray(tiempos_imu), np.asarray(tiempos_vision))
+        pares.append(diferencias)
+        # Sólo importan los pares que pueden quedar dentro de la ventana
+        diferencias = diferencias[np.abs(diferencias) <= config['max_desfase'] + 3 * ancho]
+        if len(diferencias):
+            puntaje += np.exp(-0.5 * ((diferencias[None, :] - desfases[:, None]) / ancho) ** 2).sum(axis=1)
+    if not puntaje.any():
+        return None, 0
+    i = int(np.argmax(puntaje))
+    # Refinamiento parabólico alrededor del máximo
+    desfase = desfases[i]
+    if 0 < i < len(desfases) - 1:
+        a, b, c = puntaje[i - 1], puntaje[i], puntaje[i + 1]
+        curvatura = a - 2 * b + c
+        if curvatura < 0:
+            desfase += 0.5 * (a - c) / curvatura * config['paso_desfase']
+    emparejados = sum(int(np.any(np.abs(diferencias - desfase) <= ancho, axis=1).sum())
+                      for diferencias in pares)
+    return float(desfase), emparejados
+
+
+class AlineadorEventos:
+    """Desfase entre el reloj de la visión y el del IMU, a partir de sus contactos iniciales."""
+
+    def __init__(self, **config):
+        self.config = {**CONFIG_FUSION, **config}
+        n = self.config['eventos_alineacion']
+        self.eventos = {"imu": {lado: deque(maxlen=n) for lado in CONTACTO_VISION},
+                        "vision": {lado: deque(maxlen=n) for lado in CONTACTO_VISION}}
+        self.desfase = 0.0
+        self.emparejados = 0
+        self.alineado = False
+
+    def agregar(self, fuente, lado, t):
+        self.eventos[fuente][lado].append(t)
+        desfase, emparejados = estimar_desfase(self.eventos["imu"], self.eventos["vision"], **self.config)
+        if desfase is not None and emparejados >= self.config['eventos_minimos']:
+            self.desfase = desfase
+            self.emparejados = emparejados
+            self.alineado = True
+
+
+class FusionArticulacion:
+    """Filtro complementario de un ángulo articular (convención de la visión).
+
+    El ángulo fusionado es imu + correccion: el IMU aporta toda la dinámica
+    y cada frame de la visión mueve la corrección una fracción
+    (`ganancia_vision`) del error medido en el instante del frame, que llega
+    tarde; así la deriva y el desfase de montaje del IMU se corrigen sin
+    pasarle el ruido de la visión. Un frame más nuevo que la última muestra
+    del IMU espera a que ésta lo alcance.
+    Sin IMU el valor es el de la visión y sin visión el del IMU.
+    """
+
+    def __init__(self, **config):
+        self.config = {**CONFIG_FUSION, **config}
+        self.valor = None
+        self.t = None
+        self.imu = None
+        # Historial de tiempos y valores del IMU para emparejar los frames que llegan tarde
+        self.tiempos = deque()
+        self.valores = deque()
+        # Frames de la visión que llegaron antes que las muestras del IMU de su instante
+        self.pendientes = deque()
+        self.pares = 0
+        self.correccion = 0.0
+
+    def agregar_imu(self, tiempos, valores):
+        self.tiempos.extend(tiempos)
+        self.valores.extend(valores)
+        if not self.tiempos:
+            return
+        self.t, self.imu = self.tiempos[-1], self.valores[-1]
+        while self.tiempos[0] < self.t - self.config['historial']:
+            self.tiempos.popleft()
+            self.valores.popleft()
+        while self.pendientes and self.pendientes[0][0] <= self.t:
+            self._corregir(*self.pendientes.popleft())
+        self.valor = self.imu + self.correccion
+
+    def agregar_vision(self, t, v):
+        if self.imu is None:
+            # Sólo visión
+            self.valor = v
+            self.t = t
+        elif t > self.t:
+            self.pendientes.append((t, v))
+            while self.pendientes[0][0] < t - self.config['historial']:
+                self.pendientes.popleft()
+        else:
+            self._corregir(t, v)
+            self.valor = self.imu + self.correccion
+
+    def _imu_en(self, t):
+        """Valor del IMU interpolado en t, o None si t no está en el historial."""
+        if not self.tiempos or t < self.tiempos[0] or t > self.tiempos[-1]:
+            return None
+        i = bisect_left(self.tiempos, t)
+        t1, x1 = self.tiempos[i], self.valores[i]
+        if i == 0 or t1 == t:
+            return x1
+        t0, x0 = self.tiempos[i - 1], self.valores[i - 1]
+        return x0 + (t - t0) / (t1 - t0) * (x1 - x0)
+
+    def _corregir(self, t, v):
+        x = self._imu_en(t)
+        if x is None:
+            return
+
+        self.pares += 1
+        error = v - (x + self.correccion)
+        # El primer frame fija la corrección; los siguientes la ajustan poco a poco
+        self.correccion += error if self.pares == 1 else self.config['ganancia_vision'] * error
+
+    def calibracion(self):
+        return {"correccion": round(self.correccion, 1), "pares": self.pares}
+
+
+class FaseFusion:
+    """Porcentaje del ciclo de la marcha (pierna izquierda) y su fase."""
+
+    def __init__(self, **config):
+        self.config = {**CONFIG_FUSION, **config}
+        self.porcentaje = None
+        self.t = None
+        self.zancada = self.config['zancada_inicial']
+        self.ultimo_contacto = {}
+
+    def avanzar(self, t):
+        if self.porcentaje is not None and self.t is not None and t > self.t:
+            self.porcentaje = (self.porcentaje + 100 * (t - self.t) / self.zancada) % 100
+        self.t = t if self.t is None else max(self.t, t)
+
+    def contacto_imu(self, t, lado):
+        """Talón detectado por el IMU en el instante t (ya en la línea de tiempo común)."""
+        anterior = self.ultimo_contacto.get(lado)
+        if anterior is not None and 0.4 < t - anterior < 2.5:
+            self.zancada += 0.3 * ((t - anterior) - self.zancada)
+        self.ultimo_contacto[lado] = t
+        ahora = self.t if self.t is not None else t
+        self.porcentaje = (CONTACTO_PORCENTAJE[lado] + 100 * (ahora - t) / self.zancada) % 100
+        self.t = ahora
+
+    def fase_vision(self, t, fase):
+        centro = CENTRO_FASE.get(fase)
+        if centro is None:
+            return
+        if self.porcentaje is None:
+            self.porcentaje = centro
+            self.t = t
+            return
+        # Error circular entre la fase de la visión y la estimada en el instante del frame
+        en_t = self.porcentaje - 100 * (self.t - t) / self.zancada
+        error = (centro - en_t + 50) % 100 - 50
+        self.porcentaje = (self.porcentaje + self.config['ganancia_fase'] * error) % 100
+
+    def estado(self):
+        if self.porcentaje is None:
+            return None, None
+        return round(self.porcentaje, 1), fase_de_porcentaje(self.porcentaje)
+
+
+class Fusionador:
+    """Une los flujos del IMU y de la visión en un solo flujo fusionado.
+
+    Uso:
+        fusionador = Fusionador()
+        fusionador.agregar_imu({"t": [...], "angulos": {"rodilla_derecha": [...]},
+                                "eventos": [{"tipo": "talon", "t": 12.3, "lado": "derecho"}]})
+        fusionador.agregar_vision({"t": 12.31, "angulos": [...6], "validos": [True, True],
+                                   "fase": "MID-STANCE"})
+        muestra = fusionador.extraer()      # estado fusionado, a lo más `frecuencia_salida` por segundo
+
+    Los tiempos del IMU definen la línea de tiempo común; los de la visión
+    se corrigen con el desfase estimado. Cada muestra de salida tiene "t",
+    "angulos" {articulación: grados}, "porcentaje_ciclo", "fase" y "fuentes"
+    (las fuentes de las que ya se recibieron datos).
+    """
+
+    def __init__(self, **config):
+        self.config = {**CONFIG_FUSION, **config}
+        self.alineador = AlineadorEventos(**self.config)
+        self.articulaciones = {nombre: FusionArticulacion(**self.config) for nombre in ARTICULACIONES_VISION}
+        self.fase = FaseFusion(**self.config)
+        self.fase_anterior = None
+        self.repeticiones = 0
+        self.inicio_fase = None
+        self.t = None
+        self.siguiente = None
+        self.ultimo_imu = None
+        self.ultima_vision = None
+        self.muestras_imu = 0
+        self.frames_vision = 0
+
+    def agregar_imu(self, mensaje):
+        tiempos = mensaje.get("t", [])
+        for nombre, valores in mensaje.get("angulos", {}).items():
+            if nombre in self.articulaciones:
+                self.articulaciones[nombre].agregar_imu(tiempos, valores)
+        for evento in mensaje.get("eventos", []):
+            if evento.get("tipo") == "talon" and evento.get("lado") in CONTACTO_PORCENTAJE:
+                self.alineador.agregar("imu", evento["lado"], evento["t"])
+                self.fase.contacto_imu(evento["t"], evento["lado"])
+        if len(tiempos):
+            self.muestras_imu += len(tiempos)
+            self.ultimo_imu = tiempos[-1]
+            self._avanzar(tiempos[-1])
+
+    def agregar_vision(self, mensaje):
+        self.frames_vision += 1
+        t_vision = mensaje["t"]
+        fase = mensaje.get("fase")
+        self._contactos_vision(t_vision, fase)
+
+        t = t_vision + self.alineador.desfase
+        validos = mensaje.get("validos", [True, True])
+        for j, (nombre, valor) in enumerate(zip(ARTICULACIONES_VISION, mensaje.get("angulos", []))):
+            # Columnas 0-2: lado derecho; 3-5: izquierdo
+            if validos[j // 3] and valor is not None:
+                self.articulaciones[nombre].agregar_vision(t, float(valor))
+        if fase is not None:
+            self.fase.fase_vision(t, fase)
+        self.ultima_vision = t
+        if self.ultimo_imu is None:
+            # Sin IMU la línea de tiempo avanza con la visión
+            self._avanzar(t)
+
+    def _contactos_vision(self, t, fase):
+        # Un contacto inicial es el inicio de la fase correspondiente,
+        # confirmado en `confirmacion_fase` frames seguidos
+        if fase == self.fase_anterior:
+            self.repeticiones += 1
+        else:
+            self.fase_anterior = fase
+            self.repeticiones = 1
+            self.inicio_fase = t
+        if self.repeticiones == self.config['confirmacion_fase']:
+            for lado, contacto in CONTACTO_VISION.items():
+                if fase == contacto:
+                    self.alineador.agregar("vision", lado, self.inicio_fase)
+
+    def _avanzar(self, t):
+        self.t = t if self.t is None else max(self.t, t)
+        self.fase.avanzar(self.t)
+
+    def extraer(self):
+        """Estado fusionado actual, o None si no pasó 1/frecuencia_salida desde la muestra anterior."""
+        if self.t is None:
+            return None
+        periodo = 1.0 / self.config['frecuencia_salida']
+        if self.siguiente is None:
+            self.siguiente = self.t
+        if self.t < self.siguiente:
+            return None
+        n = int(math.floor((self.t - self.siguiente) / periodo)) + 1
+        self.siguiente += n * periodo
+        porcentaje, fase = self.fase.estado()
+        angulos = {nombre: round(a.valor, 1) for nombre, a in self.articulaciones.items() if a.valor is not None}
+        fuentes = [f for f, activo in (("imu", self.ultimo_imu is not None),
+                                       ("vision", self.ultima_vision is not None)) if activo]
+        return {"t": round(self.t, 3), "angulos": angulos, "porcentaje_ciclo": porcentaje,
+                "fase": fase, "fuentes": fuentes}
+
+    def estado(self):
+        return {
+            "desfase_vision": round(self.alineador.desfase, 3),
+            "alineado": self.alineador.alineado,
+            "eventos_emparejados": self.alineador.emparejados,
+            "muestras_imu": self.muestras_imu,
+            "frames_vision": self.frames_vision,
+            "zancada": round(self.fase.zancada, 3),
+            "calibracion": {nombre: a.calibracion() for nombre, a in self.articulaciones.items() if a.pares},
+        }
@@ -0,0 +1,87 @@
+# Cliente de los servicios que alimentan a la fusión (Fusion/API.py).
+# Los productores (API de los sensores y API de la visión) no deben
+# detenerse si la fusión está caída o es lenta: `enviar` sólo deja el
+# mensaje en una cola acotada y una tarea del event loop lo manda por el
+# WebSocket (/ws/imu o /ws/vision), reconectándose cuando se pierde el enlace.
+# Si la cola se llena se descartan los mensajes más viejos.
+
+import asyncio
+import json
+
+from websockets.asyncio.client import connect
+from websockets.exceptions import WebSocketException
+
+CONFIG_CLIENTE = dict(
+    max_pendientes=200,   # mensajes en espera antes de descartar los más viejos
+    reintento=2.0,        # s entre intentos de conexión
+)
+
+
+class ClienteFusion:
+    """Envía mensajes JSON a un WebSocket de entrada del servicio de fusión.
+
+    Uso (dentro del event loop):
+        cliente = ClienteFusion("ws://localhost:8002/ws/imu")
+        cliente.enviar({"t": [...], "angulos": {...}, "eventos": [...]})
+        await cliente.cerrar()
+    """
+
+    def __init__(self, url, **config):
+        self.config = {**CONFIG_CLIENTE, **config}
+        self.url = url
+        self.cola = asyncio.Queue(maxsize=self.config['max_pendientes'])
+        self.tarea = None
+        self.conectado = False
+        self.enviados = 0
+        self.descartados = 0
+        self.error = None
+
+    def enviar(self, mensaje):
+        if self.tarea is None:
+            self.tarea = asyncio.create_task(self._ejecutar())
+        if self.cola.full():
+            self.cola.get_nowait()
+            self.descartados += 1
+        self.cola.put_nowait(mensaje)
+
+    async def _ejecutar(self):
+        while True:
+            try:
+                async with connect(self.url) as websocket:
+                    self.conectado = True
+                    self.error = None
+                    # La fusión sólo responde para avisar de mensajes inválidos
+                    lector = asyncio.create_task(self._leer_errores(websocket))
+                    try:
+                        while True:
+                            await websocket.send(json.dumps(await self.cola.get()))
+                            self.enviados += 1
+                    except asyncio.CancelledError:
+                        # Cierre normal al terminar el envío
+                        await websocket.close()
+                        raise
+                    finally:
+                        lector.cancel()
+            except (OSError, WebSocketException) as e:
+                self.error = str(e)
+            self.conectado = False
+            await asyncio.sleep(self.config['reintento'])
+
+    async def _leer_errores(self, websocket):
+        try:
+            async for respuesta in websocket:
+                self.error = json.loads(respuesta).get("message")
+        except WebSocketException:
+            # El cierre lo atiende el ciclo de envío
+            pass
+
+    async def cerrar(self):
+        if self.tarea is not None:
+            self.tarea.cancel()
+            await asyncio.gather(self.tarea, return_exceptions=True)
+            self.tarea = None
+        self.conectado = False
+
+    def estado(self):
+        return {"url": self.url, "conectado": self.conectado, "enviados": self.enviados,
+                "descartados": self.descartados, "pendientes": self.cola.qsize(), "error": self.error}
@@ -1,84 +1,47 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+import asyncio
 import cv2
 import os
-import mediapipe as mp
-import numpy as np
-import csv
-from joblib import load
+import sys
 import tempfile
 import uuid
 from typing import Dict
 import shutil
+from functools import partial
 from pathlib import Path
 
-app = FastAPI()
-
-# Diccionario para almacenar las sesiones de procesamiento
-processing_sessions: Dict[str, dict] = {}
-
 # CARGAR ARCHIVOS
 current_dir = os.path.dirname(__file__)
 
-# Modelo y scaler
-model_path = os.path.abspath(os.path.join(current_dir, 'ModelosML', 'PrediccionEtapas.joblib'))
-model = load(model_path)
-scaler_path = os.path.abspath(os.path.join(current_dir, 'ModelosML', 'Scaler.joblib'))
-scaler = load(scaler_path)
-scaler.feature_names_in_ = None
+# Módulos compartidos de visión computacional (cinemática, modelo de fases)
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..', '..', '..', '..', 'VisionComputacional')))
 
-# INICIALIZAR MEDIAPIPE
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+from Comun.analisis import (landmarks_frames, landmarks_video, preparar_landmarks, analizar_landmarks, filas_csv,
+                            resumen_analisis,
+                            escribir_csv, renderizar_frames, renderizar_video,
+                            renderizar_imagenes, generar_video_frames, generar_video)
+from Comun.cache_landmarks import CacheLandmarks
+from Comun.flujo import LectorFrames, ProcesadorFlujo, imagenes_flujo
 
-# Colores y parametros
-CL = (130,140,40)
-CP = (205,218,56)
-CCI, CRI, CTOI = (30,180,200), (30,120,200), (30,60,200)
-CCD, CRD, CTOD = (200,180,30), (200,120,30), (200,60,30)
-font = cv2.FONT_HERSHEY_PLAIN
-text_color = (0, 0, 0)
-T1 = 2
-T2 = T1 + 1
-
-# Diccionario de índices
-indices = {
-    'N': 0, 'H_I': 11, 'H_D': 12, 'C_I': 23, 'C_D': 24,
-    'R_I': 25, 'R_D': 26, 'TO_I': 27, 'TO_D': 28,
-    'TA_I': 29, 'TA_D': 30
-}
+app = FastAPI()
 
-# Diccionario para cambiar etiquetas
-mapa_etiquetas = {
-    "CONTACTO INICIAL": "INITIAL CONTACT",
-    "RESPUESTA A LA CARGA": "LOADING RESPONSE",
-    "APOYO MEDIO": "MID-STANCE",
-    "APOYO FINAL": "TERMINAL STANCE",
-    "PRE OSCILACION": "PRE-SWING",
-    "OSCILACION INICIAL": "INITIAL SWING",
-    "OSCILACION MEDIA": "MID-SWING",
-    "OSCILACION FINAL": "TERMINAL SWING",
-}
+# Landmarks de las grabaciones ya procesadas (se descartan los menos usados al pasar de 2 GB)
+cache = CacheLandmarks(os.path.join(tempfile.gettempdir(), "nemi_landmarks"), max_bytes=2 * 1024**3)
 
-# FUNCIÓN PARA CALCULAR ANGULOS
-def angle(a, b, c):
-    ba = a - b
-    bc = c - b
-    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
-    ang = np.degrees(np.arccos(cosine_angle))
-    if ang > 180:
-        ang = ang - 180
-    if ang < 90:
-        ang = 180 - ang
-    ang = abs(round(ang))
-    return ang, b
+# Diccionario para almacenar las sesiones de procesamiento
+processing_sessions: Dict[str, dict] = {}
 
 @app.post("/procesar_grabacion/")
 async def process_recording(request_data: dict):
     # Extraer parámetros del JSON recibido
     frames_dir = request_data.get("frames_dir", "")
     fps = request_data.get("fps", 24)
+    # Con renderizar = false sólo se genera el CSV; el video se dibuja al descargarlo
+    renderizar = request_data.get("renderizar", True)
+    # Con suavizar = true se rellenan los huecos cortos y se filtran landmarks y fases
+    suavizar = request_data.get("suavizar", True)
     
     if not frames_dir:
         raise HTTPException(status_code=400, detail="Se requiere el parámetro 'frames_dir'")
@@ -107,144 +70,139 @@ async def process_recording(request_data: dict):
             detail=f"No se encontraron frames (Frame_*.png) en: {frames_dir}"
         )
     
-    # Obtener dimensiones del primer frame
+    # Verificar que el primer frame se puede leer
     first_frame = cv2.imread(str(frame_files[0]))
     if first_frame is None:
         raise HTTPException(status_code=400, detail="Error al leer los frames")
     
-    H, W = first_frame.shape[:2]
-    
-    # Configurar el video de salida
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_path, fourcc, fps, (W, H))
-    
-    # Procesamiento de los frames
-    with mp_pose.Pose(static_image_mode=False, model_complexity=2, min_detection_confidence=0.5) as pose:
-        with open(csv_path, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['Time [s]','Phase', 'Hip Joint Angle (R)','Knee Joint Angle (R)','Ankle Joint Angle (R)',
-                           'Hip Joint Angle (L)','Knee Joint Angle (L)','Ankle Joint Angle (L)'])
-            
-            for i, frame_file in enumerate(frame_files):
-                image = cv2.imread(str(frame_file))
-                if image is None:
-                    continue
-                
-                ts = i / fps  # Tiempo en segundos
-                
-                CXI, CXD = round(W/55), -round(W/17)
-                top_left = (5,5)
-                BCX, BCY = round(W/4.8), round(W/24)
-                TX, TY = round(W/120), round(W/38)
-                bottom_right = (600, BCY)
-
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                results = pose.process(image_rgb)
-                image = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
-
-                if results.pose_landmarks is None:
-                    cv2.putText(image, "Persona fuera de cuadro", (W//4, H//2), 
-                               font, 2, (0, 0, 255), 3)
-                    writer.writerow([ts, "NO PERSON", 0, 0, 0, 0, 0, 0])
-                else:
-                    try:
-                        landmarks = results.pose_landmarks.landmark
-                        
-                        puntos = {}
-                        for k, i in indices.items():
-                            puntos[k] = np.multiply([landmarks[i].x, landmarks[i].y], [W, H]).astype(int)
-
-                        mp_drawing.draw_landmarks(image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                                                mp_drawing.DrawingSpec(CL, T2, T2),
-                                                mp_drawing.DrawingSpec(CP, T2, T2))
-
-                        DCD_ang, DRD_ang, DTOD_ang = 0, 0, 0
-                        DCI_ang, DRI_ang, DTOI_ang = 0, 0, 0
+    # Landmarks: de la caché si estos frames ya se habían procesado
+    datos = preparar_landmarks(landmarks_frames(frame_files, cache), suavizar, fps)
 
-                        if all(landmarks[i].visibility > 0.5 for i in [24, 26, 28]):
-                            DCD_ang, DCD_pos = angle(puntos['H_D'], puntos['C_D'], puntos['R_D'])
-                            DRD_ang, DRD_pos = angle(puntos['C_D'], puntos['R_D'], puntos['TO_D'])
-                            DTOD_ang, DTOD_pos = angle(puntos['R_D'], puntos['TO_D'], puntos['TA_D'])
-                            DRD_ang = 180 - DRD_ang
-                            DTOD_ang = 180 - (DTOD_ang - 45)
+    # Ángulos, fases y CSV (el tiempo de cada frame depende de los fps)
+    resultado = analizar_landmarks(datos, suavizar)
+    tiempos = datos["indices"] / fps
+    escribir_csv(csv_path, filas_csv(tiempos, datos["detectado"], resultado[0], resultado[2]))
 
-                            for ang, pos, color in zip([DCD_ang, DRD_ang, DTOD_ang], 
-                                                      [DCD_pos, DRD_pos, DTOD_pos], 
-                                                      [CCD, CRD, CTOD]):
-                                cv2.circle(image, pos, T2*2, color, -1)
-                                cv2.putText(image, str(ang), np.array(pos) + [CXI, -1], font, T1, color, T2)
+    # Video anotado
+    if renderizar:
+        renderizar_frames(frame_files, output_path, fps, datos, resultado)
+    
+    # Almacenar información de la sesión
+    processing_sessions[session_id] = {
+        "temp_dir": temp_dir,
+        "processed_video": output_path,
+        "csv_file": csv_path,
+        "generar": partial(generar_video_frames, frame_files, output_path, fps, cache, suavizar),
+        "render": None
+    }
+    
+    return {
+        "session_id": session_id,
+        "message": "Grabación procesada exitosamente",
+        "frames_processed": len(frame_files),
+        "duration_seconds": len(frame_files) / fps,
+        "resumen": resumen_analisis(datos, resultado, fps)
+    }
 
-                        if all(landmarks[i].visibility > 0.5 for i in [23, 25, 27]):
-                            DCI_ang, DCI_pos = angle(puntos['H_I'], puntos['C_I'], puntos['R_I'])
-                            DRI_ang, DRI_pos = angle(puntos['C_I'], puntos['R_I'], puntos['TO_I'])
-                            DTOI_ang, DTOI_pos = angle(puntos['R_I'], puntos['TO_I'], puntos['TA_I'])
-                            DRI_ang = 180 - DRI_ang
-                            DTOI_ang = 180 - (DTOI_ang - 45)
+def _renderizar_flujo(frames_path, output_path, fps, datos, suavizar, resultado=None):
+    # Video anotado a partir del archivo de frames recibido por flujo
+    if resultado is None:
+        resultado = analizar_landmarks(datos, suavizar)
+    imagenes = imagenes_flujo(frames_path, datos["indices"])
+    renderizar_imagenes(imagenes, output_path, fps, datos, resultado)
+    return output_path
 
-                            for ang, pos, color in zip([DCI_ang, DRI_ang, DTOI_ang], 
-                                                      [DCI_pos, DRI_pos, DTOI_pos], 
-                                                      [CCI, CRI, CTOI]):
-                                cv2.circle(image, pos, T2*2, color, -1)
-                                cv2.putText(image, str(ang), np.array(pos) + [CXD, -1], font, T1, color, T2)
+@app.post("/procesar_grabacion/stream/")
+async def process_recording_stream(request: Request, fps: float = 24, renderizar: bool = True,
+                                   suavizar: bool = True):
+    """Recibe la grabación como un flujo y la procesa mientras llega.
 
-                            if puntos['N'][0] > puntos['C_I'][0]:  
-                                dif_ac = DCI_ang - DCD_ang
-                                dif_ar = DRI_ang - DRD_ang
-                                dif_at = DTOI_ang - DTOD_ang
-                                dif_pcy = landmarks[23].y - landmarks[24].y
-                                dif_pry = landmarks[25].y - landmarks[26].y
-                                dif_pty = landmarks[27].y - landmarks[28].y
-                            else:  
-                                dif_ac = DCD_ang - DCI_ang
-                                dif_ar = DRD_ang - DRI_ang
-                                dif_at = DTOD_ang - DTOI_ang
-                                dif_pcy = landmarks[24].y - landmarks[23].y
-                                dif_pry = landmarks[26].y - landmarks[25].y
-                                dif_pty = landmarks[28].y - landmarks[27].y
+    Tipos de contenido aceptados:
+    - application/x-nemi-frames (u octet-stream): frames JPEG o PNG, cada uno
+      precedido por su longitud en 4 bytes big-endian (ver Comun/flujo.py).
+      La estimación de pose empieza con el primer frame, sin esperar a que
+      termine la subida.
+    - video/*: un archivo de video, que se guarda y se procesa al terminar
+      de recibirse (los contenedores no se pueden decodificar incompletos).
+    """
+    content_type = request.headers.get("content-type", "")
 
-                            dif_pcx = landmarks[23].x - landmarks[24].x
-                            dif_prx = landmarks[25].x - landmarks[26].x
-                            dif_ptx = landmarks[27].x - landmarks[28].x
+    # Crear un ID único para esta sesión
+    session_id = str(uuid.uuid4())
+    
+    # Crear directorio temporal para esta sesión
+    temp_dir = tempfile.mkdtemp()
+    output_path = os.path.join(temp_dir, f"processed_{session_id}.mp4")
+    csv_path = os.path.join(temp_dir, f"analysis_{session_id}.csv")
 
-                            X = [[dif_ac, dif_ar, dif_at, dif_pcx, dif_pcy, dif_prx, dif_pry, dif_ptx, dif_pty]]
-                            X = scaler.transform(X)
-                            y_pred = model.predict(X)
-                            text = [mapa_etiquetas.get(label, label) for label in y_pred][0]
+    # Si algo falla (flujo inválido, cliente desconectado, error de mediapipe u
+    # OpenCV) no debe quedar en disco el directorio de la sesión
+    try:
+        try:
+            if content_type.startswith("video/"):
+                input_path = os.path.join(temp_dir, "recording.mp4")
+                with open(input_path, "wb") as f:
+                    async for bloque in request.stream():
+                        await run_in_threadpool(f.write, bloque)
 
-                            (text_width, text_height), baseline = cv2.getTextSize(text, font, T1, T2)
-                            center_x = (top_left[0] + bottom_right[0]) // 2
-                            center_y = (top_left[1] + bottom_right[1]) // 2
-                            text_x = center_x - text_width // 2
-                            text_y = center_y + text_height // 2
+                datos = await run_in_threadpool(landmarks_video, input_path, cache)
+                datos = await run_in_threadpool(preparar_landmarks, datos, suavizar)
+                tiempos = datos["tiempos"]
+                fps = float(datos["fps"])
+                generar = partial(generar_video, input_path, output_path, cache, suavizar=suavizar)
+                renderizar_sesion = partial(renderizar_video, input_path, output_path, datos)
+            else:
+                frames_path = os.path.join(temp_dir, "recording.frames")
+                lector = LectorFrames()
+                procesador = ProcesadorFlujo(frames_path)
+                try:
+                    async for bloque in request.stream():
+                        for frame in lector.agregar(bloque):
+                            # Si la inferencia va atrasada se espera sin bloquear el event loop
+                            if not procesador.enviar_sin_bloquear(frame):
+                                await run_in_threadpool(procesador.enviar, frame)
+                finally:
+                    datos = await run_in_threadpool(procesador.terminar)
+                if lector.incompleto():
+                    print(f"Sesión {session_id}: el flujo terminó con un frame incompleto")
 
-                            cv2.rectangle(image, top_left, bottom_right, (255,255,255), -1)
-                            cv2.rectangle(image, top_left, bottom_right, (0,0,0), T2)
-                            cv2.putText(image, text, (text_x, text_y), font, T1, text_color, T2)
+                datos = await run_in_threadpool(preparar_landmarks, datos, suavizar, fps)
+                tiempos = datos["indices"] / fps
+                generar = renderizar_sesion = partial(_renderizar_flujo, frames_path, output_path, fps, datos, suavizar)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Flujo inválido: {str(e)}")
 
-                            writer.writerow([ts, text, DCD_ang, DRD_ang, DTOD_ang, 
-                                           DCI_ang, DRI_ang, DTOI_ang])
+        if len(datos["indices"]) == 0:
+            raise HTTPException(status_code=400, detail="No se recibieron frames válidos")
 
-                    except Exception as e:
-                        print(f"Error procesando frame {frame_file}: {e}")
+        # Ángulos, fases y CSV
+        resultado = await run_in_threadpool(analizar_landmarks, datos, suavizar)
+        filas = await run_in_threadpool(filas_csv, tiempos, datos["detectado"], resultado[0], resultado[2])
+        await run_in_threadpool(escribir_csv, csv_path, filas)
 
-                out.write(image)
+        # Video anotado
+        if renderizar:
+            await run_in_threadpool(renderizar_sesion, resultado=resultado)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
 
-    # Liberar recursos
-    out.release()
-    cv2.destroyAllWindows()
-    
     # Almacenar información de la sesión
     processing_sessions[session_id] = {
         "temp_dir": temp_dir,
         "processed_video": output_path,
-        "csv_file": csv_path
+        "csv_file": csv_path,
+        "generar": generar,
+        "render": None
     }
-    
+
+    frames = len(datos["indices"])
     return {
         "session_id": session_id,
         "message": "Grabación procesada exitosamente",
-        "frames_processed": len(frame_files),
-        "duration_seconds": len(frame_files) / fps
+        "frames_processed": frames,
+        "duration_seconds": frames / fps if fps else 0,
+        "resumen": resumen_analisis(datos, resultado, fps)
     }
 
 # Los endpoints para descargar y limpiar permanecen igual que en tu versión original
@@ -253,9 +211,19 @@ async def download_video(session_id: str):
     if session_id not in processing_sessions:
         raise HTTPException(status_code=404, detail="Sesión no encontrada")
     
-    video_path = processing_sessions[session_id]["processed_video"]
+    sesion = processing_sessions[session_id]
+    video_path = sesion["processed_video"]
     if not os.path.exists(video_path):
-        raise HTTPException(status_code=404, detail="Video no encontrado")
+        # Grabación procesada sin video: se dibuja ahora a partir de los landmarks en caché
+        if sesion["render"] is None:
+            sesion["render"] = asyncio.ensure_future(run_in_threadpool(sesion["generar"]))
+        try:
+            await sesion["render"]
+        except Exception as e:
+            sesion["render"] = None
+            raise HTTPException(status_code=500, detail=f"Error al generar el video: {str(e)}")
+        if not os.path.exists(video_path):
+            raise HTTPException(status_code=404, detail="Video no encontrado")
     
     return FileResponse(
         video_path,
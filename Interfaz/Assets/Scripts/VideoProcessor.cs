@@ -15,7 +15,7 @@ public class VideoProcessor : MonoBehaviour
     public RawImage videoDisplay; // UI element para mostrar el video
 
     [Header("API Configuration")]
-    public string apiUrl = "http://localhost:8000/procesar_grabacion/";
+    public string apiUrl = "http://localhost:8000/procesar_grabacion/stream/";
     public string downloadVideoUrl = "http://localhost:8000/descargar_video/";
     public string downloadCsvUrl = "http://localhost:8000/descargar_csv/";
     public int targetFPS;
@@ -25,6 +25,7 @@ public class VideoProcessor : MonoBehaviour
     private string videosFolderName = "ProcessedVideos";
 
     private string framesDirectory;
+    private string recordingPath;
     private string videosDirectory;
     private string sessionId;
     private bool isProcessing = false;
@@ -33,6 +34,7 @@ public class VideoProcessor : MonoBehaviour
     {
         framesDirectory = Path.Combine(Application.persistentDataPath, framesFolderName);
         videosDirectory = Path.Combine(Application.persistentDataPath, videosFolderName);
+        recordingPath = Path.Combine(framesDirectory, WebcamRecorder.RecordingFileName);
         
         // Crear directorio para videos si no existe
         if (!Directory.Exists(videosDirectory))
@@ -40,8 +42,8 @@ public class VideoProcessor : MonoBehaviour
             Directory.CreateDirectory(videosDirectory);
         }
 
-        Debug.Log($"Buscando frames en: {framesDirectory}");
-        Debug.Log($"Frames encontrados: {Directory.GetFiles(framesDirectory, "*.png").Length}");
+        Debug.Log($"Buscando grabación en: {recordingPath}");
+        Debug.Log($"Frames encontrados: {GetAvailableFrameCount()}");
         
         sendButton.onClick.AddListener(OnSendButtonClick);
         UpdateButtonState();
@@ -57,8 +59,8 @@ public class VideoProcessor : MonoBehaviour
 
     void UpdateButtonState()
     {
-        sendButton.interactable = !isProcessing && Directory.Exists(framesDirectory) && 
-                                Directory.GetFiles(framesDirectory, "*.png").Length > 0;
+        sendButton.interactable = !isProcessing && File.Exists(recordingPath) && 
+                                new FileInfo(recordingPath).Length > 0;
     }
 
     public void OnSendButtonClick()
@@ -74,31 +76,22 @@ public class VideoProcessor : MonoBehaviour
         isProcessing = true;
         UpdateButtonState();
 
-        // Verificar que existen frames
-        string[] frameFiles = Directory.GetFiles(framesDirectory, "*.png");
-        if (frameFiles.Length == 0)
+        // Verificar que existe la grabación
+        if (!File.Exists(recordingPath) || new FileInfo(recordingPath).Length == 0)
         {
-            Debug.LogError("No frames found in directory: " + framesDirectory);
+            Debug.LogError("No recording found: " + recordingPath);
             isProcessing = false;
             UpdateButtonState();
             yield break;
         }
 
-        // Crear objeto de request
-        var requestData = new ProcessRequestData
+        // La grabación se envía como flujo desde el disco; la API empieza a
+        // procesar los frames mientras se siguen subiendo
+        using (UnityWebRequest request = new UnityWebRequest($"{apiUrl}?fps={targetFPS}", "POST"))
         {
-            frames_dir = framesDirectory,
-            fps = targetFPS
-        };
-
-        string jsonData = JsonUtility.ToJson(requestData);
-        byte[] bodyRaw = Encoding.UTF8.GetBytes(jsonData);
-
-        using (UnityWebRequest request = new UnityWebRequest(apiUrl, "POST"))
-        {
-            request.uploadHandler = new UploadHandlerRaw(bodyRaw);
+            request.uploadHandler = new UploadHandlerFile(recordingPath);
             request.downloadHandler = new DownloadHandlerBuffer();
-            request.SetRequestHeader("Content-Type", "application/json");
+            request.SetRequestHeader("Content-Type", "application/x-nemi-frames");
 
             yield return request.SendWebRequest();
 
@@ -185,13 +178,6 @@ public class VideoProcessor : MonoBehaviour
 }
 
     // Clases para serialización JSON
-    [System.Serializable]
-    private class ProcessRequestData
-    {
-        public string frames_dir;
-        public int fps;
-    }
-
     [System.Serializable]
     private class ApiResponse
     {
@@ -201,25 +187,60 @@ public class VideoProcessor : MonoBehaviour
         public float duration_seconds;
     }
 
+    // Lee la longitud (4 bytes big-endian) del siguiente frame de la grabación
+    private static int ReadFrameLength(BinaryReader reader)
+    {
+        byte[] length = reader.ReadBytes(4);
+        if (length.Length < 4)
+        {
+            return -1;
+        }
+        if (System.BitConverter.IsLittleEndian)
+        {
+            System.Array.Reverse(length);
+        }
+        return System.BitConverter.ToInt32(length, 0);
+    }
+
     // Método para verificar frames disponibles
     public int GetAvailableFrameCount()
     {
-        if (Directory.Exists(framesDirectory))
+        if (!File.Exists(recordingPath))
+        {
+            return 0;
+        }
+
+        int count = 0;
+        using (BinaryReader reader = new BinaryReader(new FileStream(recordingPath, FileMode.Open, FileAccess.Read, FileShare.ReadWrite)))
         {
-            return Directory.GetFiles(framesDirectory, "*.png").Length;
+            int length;
+            while ((length = ReadFrameLength(reader)) >= 0 &&
+                   reader.BaseStream.Position + length <= reader.BaseStream.Length)
+            {
+                reader.BaseStream.Seek(length, SeekOrigin.Current);
+                count++;
+            }
         }
-        return 0;
+        return count;
     }
 
     // Método para mostrar preview del primer frame
     public void ShowFirstFramePreview()
     {
-        string[] frameFiles = Directory.GetFiles(framesDirectory, "*.png");
-        if (frameFiles.Length > 0)
+        if (!File.Exists(recordingPath))
+        {
+            return;
+        }
+
+        using (BinaryReader reader = new BinaryReader(new FileStream(recordingPath, FileMode.Open, FileAccess.Read, FileShare.ReadWrite)))
         {
-            byte[] fileData = File.ReadAllBytes(frameFiles[0]);
-            Texture2D tex = new Texture2D(2, 2);
-            tex.LoadImage(fileData);
+            int length = ReadFrameLength(reader);
+            if (length > 0)
+            {
+                byte[] fileData = reader.ReadBytes(length);
+                Texture2D tex = new Texture2D(2, 2);
+                tex.LoadImage(fileData);
+            }
         }
     }
 }
\ No newline at end of file
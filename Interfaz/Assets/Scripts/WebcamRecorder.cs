@@ -12,6 +12,12 @@ public class WebcamRecorder : MonoBehaviour
     private bool isRecording = false;
     private string tempSaveFolderPath; // Carpeta temporal para guardar durante la ejecución
 
+    // Todos los frames se guardan en un solo archivo: por cada frame, su longitud
+    // (4 bytes big-endian) seguida del JPEG. VideoProcessor lo envía tal cual a la API.
+    public const string RecordingFileName = "recording.frames";
+    public int jpegQuality = 90;
+    private FileStream recordingStream;
+
     void Start()
     {
         // Initialize buttons
@@ -50,6 +56,8 @@ public class WebcamRecorder : MonoBehaviour
             Directory.CreateDirectory(tempSaveFolderPath);
         }
 
+        recordingStream = new FileStream(Path.Combine(tempSaveFolderPath, RecordingFileName), FileMode.Create);
+
         // Start capturing frames
         StartCoroutine(CaptureFrames());
     }
@@ -66,6 +74,7 @@ public class WebcamRecorder : MonoBehaviour
     IEnumerator CaptureFrames()
     {
         int frameCount = 0;
+        FileStream stream = recordingStream;
 
         while (isRecording)
         {
@@ -77,17 +86,46 @@ public class WebcamRecorder : MonoBehaviour
             frame.SetPixels(webcamTexture.GetPixels());
             frame.Apply();
 
-            // Save the frame as an image in the temporary folder
-            byte[] frameData = frame.EncodeToPNG();
-            string filePath = Path.Combine(tempSaveFolderPath, $"Frame_{frameCount.ToString("0000")}.png");
-            File.WriteAllBytes(filePath, frameData);
+            // Append the frame as JPEG to the recording file
+            byte[] frameData = frame.EncodeToJPG(jpegQuality);
+            Destroy(frame);
+            WriteFrame(stream, frameData);
 
             frameCount++;
         }
+
+        CloseRecording(stream);
+        UnityEngine.Debug.Log($"Grabación terminada: {frameCount} frames.");
+    }
+
+    void WriteFrame(FileStream stream, byte[] frameData)
+    {
+        byte[] length = System.BitConverter.GetBytes(frameData.Length);
+        if (System.BitConverter.IsLittleEndian)
+        {
+            System.Array.Reverse(length);
+        }
+        stream.Write(length, 0, length.Length);
+        stream.Write(frameData, 0, frameData.Length);
+    }
+
+    void CloseRecording(FileStream stream)
+    {
+        if (stream != null)
+        {
+            stream.Flush();
+            stream.Close();
+        }
+        if (recordingStream == stream)
+        {
+            recordingStream = null;
+        }
     }
 
     void OnDestroy()
     {
+        CloseRecording(recordingStream);
+
         if (webcamTexture != null && webcamTexture.isPlaying)
         {
             webcamTexture.Stop();
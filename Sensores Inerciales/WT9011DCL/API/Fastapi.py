@@ -1,121 +1,162 @@
 import asyncio
 import csv
+import os
+import sys
 import time
 import threading
-from fastapi import FastAPI
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
-from bleak import BleakClient
+
+current_dir = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..')))
+# Cliente del servicio de fusión (Fusion/cliente_fusion.py)
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..', '..', '..', 'Fusion')))
+
+from Comun.decodificador import Decodificador
+from Comun.conexiones import ConexionSensor, escanear
+from Comun.almacen import AlmacenMuestras
+from Comun.pasos import DetectorPasos
+from Comun.sincronizacion import RelojSensor
+from Comun.orientacion import FiltroOrientacion
+from Comun.registro import GrabadorRegistro
+from Comun.envio_fusion import EmisorFusion
+from cliente_fusion import ClienteFusion
 
 app = FastAPI()
 
-device_instance = None
-capture_task = None
+# Sesiones de captura activas o terminadas, una por sensor (clave: MAC)
+sesiones = {}
 
-class DeviceModel:
-    def __init__(self, device_name, ble_device, position):
-        self.device_name = device_name
-        self.ble_device = ble_device
-        self.position = position
-        self.client = None
-        self.writer_characteristic = None
-        self.is_open = False
-        self.device_data = {}
-        self.temp_bytes = []
-        self.timestamps = []
-
-        self.start_time = None
-        self.step_count = 0
-        self.angz_last = None
-        self.angz_threshold = 20
-        self.step_timestamps = []
+# Sesión usada por los endpoints /start, /stop y /metrics
+sesion_actual = None
 
-    async def open_device(self):
-        try:
-            async with BleakClient(self.ble_device) as client:
-                self.client = client
-                self.is_open = True
-
-                service_uuid = "0000ffe5-0000-1000-8000-00805f9a34fb"
-                read_characteristic_uuid = "0000ffe4-0000-1000-8000-00805f9a34fb"
-                write_characteristic_uuid = "0000ffe9-0000-1000-8000-00805f9a34fb"
+# Tiempo máximo para cerrar la conexión BLE al detener una sesión
+TIMEOUT_CIERRE = 5.0
 
-                services = await client.get_services()
-                notify_characteristic = None
+# Límites de la frecuencia de envío de /ws/metrics (mensajes por segundo)
+FRECUENCIA_METRICAS = 2.0
+MAX_FRECUENCIA_METRICAS = 20.0
 
-                for service in services:
-                    if service.uuid == service_uuid:
-                        for char in service.characteristics:
-                            if char.uuid == read_characteristic_uuid:
-                                notify_characteristic = char
-                            elif char.uuid == write_characteristic_uuid:
-                                self.writer_characteristic = char
-                        break
+# Registros binarios de las sesiones grabadas
+DIRECTORIO_REGISTROS = os.path.join(current_dir, "registros")
 
-                if not notify_characteristic or not self.writer_characteristic:
-                    raise Exception("Características BLE no encontradas")
+# Muestras de cada sensor en memoria (30 s a 200 Hz); las sesiones grabadas
+# vuelcan las más antiguas a disco junto al registro y las demás las descartan
+CAPACIDAD_MUESTRAS = 200 * 30
 
-                await self.calibrate_device()
-                await client.start_notify(notify_characteristic.uuid, self.on_data_received)
+# Segundos de las últimas muestras con que se calcula el rango de los ángulos
+VENTANA_RANGO = 10.0
 
-                while self.is_open:
-                    await asyncio.sleep(0.1)
+# Entrada de los sensores del servicio de fusión (Fusion/API.py) y segundos
+# entre cada mensaje que se le envía
+FUSION_URL = "ws://localhost:8002/ws/imu"
+INTERVALO_FUSION = 0.05
 
-                await client.stop_notify(notify_characteristic.uuid)
+# Envío activo a la fusión: paciente, emisor, cliente y tarea
+fusion = None
 
-        except Exception as e:
-            print(f"Error al abrir dispositivo: {e}")
+class DeviceModel:
+    def __init__(self, device_name, mac, position, ruta_registro=None, ble_device=None, lado=None):
+        self.device_name = device_name
+        self.mac = mac
+        self.ble_device = ble_device  # BLEDevice del escaneo, si se hizo
+        self.position = position
+        self.lado = lado
+        self.conexion = None
+        self.estado = "conectando"
+        self.error = None
+        self.parada = asyncio.Event()
+        self.decodificador = Decodificador()
+        ruta_volcado = os.path.splitext(ruta_registro)[0] + ".muestras" if ruta_registro else None
+        self.muestras = AlmacenMuestras(CAPACIDAD_MUESTRAS, ruta_volcado)
+        # Tiempo de cada muestra según el reloj del sensor, sin el retraso de BLE
+        self.reloj = RelojSensor()
+        self.grabador = GrabadorRegistro(ruta_registro) if ruta_registro else None
+
+        self.detector = DetectorPasos()
+        self.orientacion = FiltroOrientacion()
+        # EmisorFusion del paciente mientras se envía a la fusión
+        self.emisor = None
 
-    async def calibrate_device(self):
-        if not self.writer_characteristic or not self.client:
-            return
+    async def open_device(self):
+        self.conexion = ConexionSensor(self.mac, self.on_data_received, self.ble_device,
+                                       al_cambiar=self.cambiar_estado)
+        try:
+            # Se reconecta sola si se cae el enlace, hasta que se pida parar
+            await self.conexion.ejecutar(self.parada)
+            self.estado = "detenido"
 
-        await self.client.write_gatt_char(self.writer_characteristic, bytearray([0xFF, 0xAA, 0x01, 0x00]))
-        await asyncio.sleep(1)
-        await self.client.write_gatt_char(self.writer_characteristic, bytearray([0xFF, 0xAA, 0x02, 0x00]))
-        await asyncio.sleep(1)
-        await self.client.write_gatt_char(self.writer_characteristic, bytearray([0xFF, 0xAA, 0x03, 0x00]))
-        await asyncio.sleep(1)
+        except Exception as e:
+            self.estado = "error"
+            self.error = str(e)
+            print(f"Error al abrir dispositivo {self.mac}: {e}")
+        finally:
+            if self.grabador is not None:
+                await asyncio.to_thread(self.grabador.cerrar)
+            await asyncio.to_thread(self.muestras.cerrar)
+
+    def cambiar_estado(self, estado):
+        self.estado = estado
+        if estado == "reconectando":
+            # Tras la caída faltan muestras: el desfase del reloj del sensor se
+            # vuelve a estimar, conservando la frecuencia ya medida
+            self.reloj = RelojSensor(frecuencia=1.0 / self.reloj.periodo)
+            self.detector.reanclar()
 
     def stop(self):
-        self.is_open = False
+        self.parada.set()
 
     def on_data_received(self, sender, data):
-        current_time = time.time()
-        delta_time = current_time - self.timestamps[-1] if self.timestamps else 0.0
-        self.timestamps.append(current_time)
-
-        self.temp_bytes.extend(data)
-        if len(self.temp_bytes) >= 20:
-            self.process_data(self.temp_bytes[:20], delta_time)
-            self.temp_bytes = self.temp_bytes[20:]
-
-    def process_data(self, bytes_data, delta_time):
-        if bytes_data[1] == 0x61:
-            ang_z = self.get_signed_int16(bytes_data[19] << 8 | bytes_data[18]) / 32768 * 180
-
-            if self.start_time is None:
-                self.start_time = time.time()
-
-            if self.angz_last is not None and abs(ang_z - self.angz_last) > self.angz_threshold:
-                self.step_count += 1
-                self.step_timestamps.append(time.time())
-
-            self.angz_last = ang_z
+        if self.grabador is not None:
+            self.grabador.agregar(data)
+        self.recibir(data, time.time())
+
+    def recibir(self, data, current_time):
+        """Procesa una notificación recibida en `current_time` (en vivo o reproducida)."""
+        imu, mag = self.decodificador.agregar(data)
+        tiempos = self.reloj.agregar(current_time, len(imu))
+        cuaterniones = self.orientacion.actualizar(imu, mag, tiempos)
+        if len(imu):
+            self.muestras.agregar(tiempos, imu)
+            eventos = self.process_data(tiempos, imu)
+            emisor = self.emisor
+            if emisor is not None:
+                emisor.agregar(self.mac, tiempos, cuaterniones)
+                emisor.agregar_eventos(self.mac, eventos)
+
+    def process_data(self, tiempos, imu):
+        return self.detector.agregar(tiempos, imu)
 
     def get_metrics(self):
-        if not self.step_timestamps or self.start_time is None:
+        metricas = self.detector.metricas()
+        if not metricas["pasos"]:
             return 0, 0.0, 0.0, 0.0
-        
-        total_time = self.step_timestamps[-1] - self.start_time
-        cadencia = (self.step_count / total_time) * 60 if total_time > 0 else 0
+
+        pasos = metricas["pasos"]
+        cadencia = metricas["cadencia"]
         velocidad = 1.2 * cadencia / 120
         longitud_paso = (velocidad * 60) / cadencia if cadencia > 0 else 0
 
-        return round(self.step_count), round(cadencia, 2), round(velocidad, 2), round(longitud_paso, 2)
+        return round(pasos), round(cadencia, 2), round(velocidad, 2), round(longitud_paso, 2)
 
-    @staticmethod
-    def get_signed_int16(value):
-        return value - 0x10000 if value >= 0x8000 else value
+    def get_live_metrics(self):
+        """Métricas con la cadencia de las últimas zancadas (media móvil del detector)."""
+        metricas = self.detector.metricas()
+        cadencia = metricas["cadencia_actual"]
+        velocidad = 1.2 * cadencia / 120
+        longitud_paso = (velocidad * 60) / cadencia if cadencia > 0 else 0.0
+        return {
+            "pasos": metricas["pasos"],
+            "cadencia": round(cadencia, 2),
+            "velocidad": round(velocidad, 2),
+            "longitud_paso": round(longitud_paso, 2),
+            "tiempo_zancada": round(metricas["tiempo_zancada"], 3),
+            "variabilidad_zancada": round(metricas["variabilidad_zancada"], 2),
+            # Rango de movimiento del sensor en los últimos VENTANA_RANGO s
+            "rango_angulos": {nombre: round(rango, 1) for nombre, rango in
+                              self.muestras.rango(('ang_x', 'ang_y', 'ang_z'), VENTANA_RANGO).items()},
+        }
 
 
 class StartRequest(BaseModel):
@@ -123,24 +164,264 @@ class StartRequest(BaseModel):
     name: str
     position: str
 
+
+class SesionRequest(BaseModel):
+    mac: str
+    name: str
+    position: str  # cadera, rodilla, tobillo, ...; para la fusión: pelvis, muslo, tibia o pie
+    paciente: Optional[str] = None
+    lado: Optional[str] = None  # derecho o izquierdo (salvo la pelvis)
+    grabar: bool = False  # guardar las notificaciones crudas en DIRECTORIO_REGISTROS
+
+
+def sesion_activa(sesion):
+    return not sesion["task"].done()
+
+
+def iniciar_sesion(mac, name, position, paciente=None, grabar=False, ble_device=None, lado=None):
+    """Crea el DeviceModel del sensor y lanza su captura en el event loop."""
+    ruta_registro = None
+    if grabar:
+        nombre = f"{mac.replace(':', '')}_{time.strftime('%Y%m%d_%H%M%S')}.imu"
+        ruta_registro = os.path.join(DIRECTORIO_REGISTROS, nombre)
+    device = DeviceModel(name, mac, position, ruta_registro, ble_device, lado)
+    sesiones[mac] = {
+        "device": device,
+        "paciente": paciente,
+        "registro": ruta_registro,
+        "inicio": time.time(),
+        "task": asyncio.create_task(device.open_device()),
+    }
+    return sesiones[mac]
+
+
+async def detener_sesion(sesion):
+    """Detiene la captura y espera a que se cierre la conexión BLE."""
+    sesion["device"].stop()
+    try:
+        await asyncio.wait_for(asyncio.shield(sesion["task"]), TIMEOUT_CIERRE)
+    except asyncio.TimeoutError:
+        sesion["task"].cancel()
+
+
+def metricas_sesion(mac, sesion):
+    device = sesion["device"]
+    pasos, cadencia, velocidad, longitud_paso = device.get_metrics()
+    return {
+        "mac": mac,
+        "name": device.device_name,
+        "position": device.position,
+        "lado": device.lado,
+        "paciente": sesion["paciente"],
+        "registro": sesion["registro"],
+        "volcado": device.muestras.ruta_volcado,
+        "estado": device.estado,
+        "error": device.error,
+        "reconexiones": device.conexion.reconexiones if device.conexion else 0,
+        "muestras": device.muestras.total,
+        "paquetes": device.decodificador.paquetes,
+        "descartados": device.decodificador.descartados,
+        "metrics": {
+            "pasos": pasos,
+            "cadencia": cadencia,
+            "velocidad": velocidad,
+            "longitud_paso": longitud_paso
+        },
+        "marcha": {clave: round(valor, 3) for clave, valor in device.detector.metricas().items()},
+        "orientacion": device.orientacion.estado()
+    }
+
+
+def obtener_sesion(mac):
+    if mac not in sesiones:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+    return sesiones[mac]
+
+
+@app.post("/sessions")
+async def crear_sesion(req: SesionRequest):
+    if req.mac in sesiones and sesion_activa(sesiones[req.mac]):
+        raise HTTPException(status_code=409, detail="El sensor ya está capturando")
+    iniciar_sesion(req.mac, req.name, req.position, req.paciente, req.grabar, lado=req.lado)
+    return {"status": "ok", "message": "Captura iniciada", "mac": req.mac}
+
+
+@app.post("/sessions/batch")
+async def crear_sesiones(reqs: List[SesionRequest]):
+    """Inicia varios sensores con un solo escaneo; se conectan y calibran en paralelo."""
+    ocupados = [req.mac for req in reqs if req.mac in sesiones and sesion_activa(sesiones[req.mac])]
+    if ocupados:
+        raise HTTPException(status_code=409, detail=f"Sensores ya capturando: {', '.join(ocupados)}")
+    dispositivos = await escanear([req.mac for req in reqs])
+    for req in reqs:
+        ble_device = dispositivos[req.mac] if dispositivos[req.mac] != req.mac else None
+        iniciar_sesion(req.mac, req.name, req.position, req.paciente, req.grabar, ble_device, req.lado)
+    return {"status": "ok", "message": "Captura iniciada", "macs": [req.mac for req in reqs]}
+
+
+@app.get("/sessions")
+async def listar_sesiones(paciente: Optional[str] = None):
+    """Vista agregada: métricas de cada sensor agrupadas por paciente."""
+    resultado = [metricas_sesion(mac, sesion) for mac, sesion in sesiones.items()
+                 if paciente is None or sesion["paciente"] == paciente]
+    pacientes = {}
+    for sesion in resultado:
+        pacientes.setdefault(sesion["paciente"] or "", []).append(sesion["mac"])
+    return {
+        "activas": sum(sesion["estado"] in ("conectando", "calibrando", "capturando", "reconectando") for sesion in resultado),
+        "sesiones": resultado,
+        "pacientes": pacientes,
+    }
+
+
+@app.get("/sessions/{mac}")
+async def metricas(mac: str):
+    return metricas_sesion(mac, obtener_sesion(mac))
+
+
+@app.post("/sessions/{mac}/stop")
+async def detener(mac: str):
+    sesion = obtener_sesion(mac)
+    await detener_sesion(sesion)
+    return {"status": "ok", "message": "Captura detenida", **metricas_sesion(mac, sesion)}
+
+
+@app.delete("/sessions/{mac}")
+async def eliminar(mac: str):
+    global sesion_actual
+    sesion = obtener_sesion(mac)
+    if sesion_activa(sesion):
+        await detener_sesion(sesion)
+    del sesiones[mac]
+    if sesion_actual == mac:
+        sesion_actual = None
+    return {"status": "ok", "message": "Sesión eliminada"}
+
+
+def metricas_en_vivo(mac, sesion, previas, ahora):
+    """Métricas actuales de una sesión y su frecuencia de muestreo desde el envío anterior."""
+    device = sesion["device"]
+    total = device.muestras.total
+    anterior = previas.get(mac)
+    frecuencia = 0.0
+    if anterior is not None and ahora > anterior[1]:
+        frecuencia = (total - anterior[0]) / (ahora - anterior[1])
+    previas[mac] = (total, ahora)
+    return {
+        "mac": mac,
+        "position": device.position,
+        "paciente": sesion["paciente"],
+        "estado": device.estado,
+        "frecuencia_muestreo": round(frecuencia, 1),
+        **device.get_live_metrics(),
+        "orientacion": device.orientacion.estado(),
+    }
+
+
+@app.websocket("/ws/metrics")
+async def metricas_ws(websocket: WebSocket, frecuencia: float = FRECUENCIA_METRICAS,
+                      mac: Optional[str] = None, paciente: Optional[str] = None):
+    """Envía las métricas de las sesiones `frecuencia` veces por segundo.
+
+    Cada mensaje es un JSON con "t" (epoch) y "sesiones": una entrada por
+    sensor con pasos, cadencia, velocidad y longitud de paso de las últimas
+    zancadas y la frecuencia de muestreo medida. `?mac=` o `?paciente=`
+    limitan las sesiones enviadas.
+    """
+    await websocket.accept()
+    periodo = 1.0 / min(max(frecuencia, 0.1), MAX_FRECUENCIA_METRICAS)
+    previas = {}
+    try:
+        while True:
+            ahora = time.monotonic()
+            datos = [metricas_en_vivo(clave, sesion, previas, ahora)
+                     for clave, sesion in list(sesiones.items())
+                     if (mac is None or clave == mac)
+                     and (paciente is None or sesion["paciente"] == paciente)]
+            await websocket.send_json({"t": time.time(), "sesiones": datos})
+            await asyncio.sleep(periodo)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+
+async def enviar_fusion(emisor, cliente):
+    """Manda a la fusión, cada INTERVALO_FUSION s, los ángulos y talones nuevos."""
+    while True:
+        await asyncio.sleep(INTERVALO_FUSION)
+        mensaje = emisor.extraer(time.time())
+        if mensaje is not None:
+            cliente.enviar(mensaje)
+
+
+async def detener_fusion():
+    global fusion
+    if fusion is None:
+        return
+    for sesion in sesiones.values():
+        if sesion["device"].emisor is fusion["emisor"]:
+            sesion["device"].emisor = None
+    fusion["task"].cancel()
+    await asyncio.gather(fusion["task"], return_exceptions=True)
+    await fusion["cliente"].cerrar()
+    fusion = None
+
+
+@app.post("/fusion")
+async def iniciar_fusion(paciente: Optional[str] = None):
+    """Envía al servicio de fusión los ángulos y talones de las sesiones del paciente.
+
+    Se usan las sesiones ya creadas cuya `position` es pelvis, muslo, tibia
+    o pie y, salvo la pelvis, que tienen `lado`. Los talones salen del
+    sensor de la tibia de cada lado.
+    """
+    global fusion
+    elegidas = {mac: sesion for mac, sesion in sesiones.items()
+                if sesion_activa(sesion) and (paciente is None or sesion["paciente"] == paciente)}
+    emisor = EmisorFusion({mac: (sesion["device"].position, sesion["device"].lado)
+                           for mac, sesion in elegidas.items()})
+    if not emisor.sensores:
+        raise HTTPException(status_code=400, detail="No hay sesiones activas con segmento y lado para la fusión")
+    await detener_fusion()
+    cliente = ClienteFusion(FUSION_URL)
+    for mac in emisor.sensores:
+        elegidas[mac]["device"].emisor = emisor
+    fusion = {"paciente": paciente, "emisor": emisor, "cliente": cliente,
+              "task": asyncio.create_task(enviar_fusion(emisor, cliente))}
+    return {"status": "ok", "message": "Envío a la fusión iniciado", **emisor.estado()}
+
+
+@app.get("/fusion")
+async def estado_fusion():
+    if fusion is None:
+        return {"activo": False}
+    return {"activo": True, "paciente": fusion["paciente"], **fusion["emisor"].estado(),
+            "cliente": fusion["cliente"].estado()}
+
+
+@app.delete("/fusion")
+async def eliminar_fusion():
+    await detener_fusion()
+    return {"status": "ok", "message": "Envío a la fusión detenido"}
+
+
 @app.post("/start")
 async def start_capture(req: StartRequest):
-    global device_instance, capture_task
+    global sesion_actual
 
-    if capture_task and not capture_task.done():
+    if sesion_actual in sesiones and sesion_activa(sesiones[sesion_actual]):
+        return {"status": "error", "message": "Ya se está capturando"}
+    if req.mac in sesiones and sesion_activa(sesiones[req.mac]):
         return {"status": "error", "message": "Ya se está capturando"}
 
-    device_instance = DeviceModel(req.name, req.mac, req.position)
-    capture_task = asyncio.create_task(device_instance.open_device())
+    iniciar_sesion(req.mac, req.name, req.position)
+    sesion_actual = req.mac
     return {"status": "ok", "message": "Captura iniciada"}
 
 @app.post("/stop")
 async def stop_capture():
-    global device_instance, capture_task
-
-    if device_instance:
-        device_instance.stop()
-        await asyncio.sleep(2)  # dar tiempo a cerrar el notify
+    if sesion_actual in sesiones:
+        device_instance = sesiones[sesion_actual]["device"]
+        await detener_sesion(sesiones[sesion_actual])
 
         pasos, cadencia, velocidad, longitud_paso = device_instance.get_metrics()
         with open("parametros_marcha.csv", mode="w", newline="") as f:
@@ -163,10 +444,8 @@ async def stop_capture():
 
 @app.get("/metrics")
 async def get_metrics():
-    global device_instance
-
-    if device_instance:
-        pasos, cadencia, velocidad, longitud_paso = device_instance.get_metrics()
+    if sesion_actual in sesiones:
+        pasos, cadencia, velocidad, longitud_paso = sesiones[sesion_actual]["device"].get_metrics()
         return {
             "steps": pasos,
             "cadence": cadencia,
@@ -175,4 +454,3 @@ async def get_metrics():
         }
 
     return {"status": "error", "message": "No hay captura activa"}
-
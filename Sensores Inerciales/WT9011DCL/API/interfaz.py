@@ -1,7 +1,9 @@
 import customtkinter as ctk
+import json
 import requests
 import threading
 from PIL import Image, ImageTk
+from websockets.sync.client import connect
 
 ctk.set_appearance_mode("light")
 ctk.set_default_color_theme("green")
@@ -13,6 +15,13 @@ COLOR_VERDE_MENTA = "#98ff98"
 
 # API URL
 API_URL = "http://localhost:8000"
+WS_URL = "ws://localhost:8000/ws/metrics"
+
+# Actualizaciones por segundo de las métricas en vivo
+FRECUENCIA_METRICAS = 2
+
+# Sensor a capturar
+SENSOR = {"mac": "d2:3a:3d:8a:20:19", "name": "sensor 1", "position": "cadera"}
 
 class App(ctk.CTk):
     def __init__(self):
@@ -52,9 +61,12 @@ class App(ctk.CTk):
             "pasos": self._crear_fila("Pasos"),
             "cadencia": self._crear_fila("Cadencia (pasos/min)"),
             "velocidad": self._crear_fila("Velocidad (m/s)"),
-            "longitud_paso": self._crear_fila("Longitud de paso (m)")
+            "longitud_paso": self._crear_fila("Longitud de paso (m)"),
+            "frecuencia_muestreo": self._crear_fila("Muestreo (Hz)")
         }
 
+        self.websocket = None
+
     def _crear_fila(self, etiqueta):
         fila = ctk.CTkFrame(self.metric_frame, fg_color="white")
         fila.pack(fill="x", pady=3, padx=5)
@@ -73,18 +85,40 @@ class App(ctk.CTk):
 
     def _iniciar_backend(self):
         try:
-            res = requests.post(f"{API_URL}/start", json={
-                "mac": "d2:3a:3d:8a:20:19",
-                "name": "sensor 1",
-                "position": "cadera"
-            })
+            res = requests.post(f"{API_URL}/start", json=SENSOR)
             if res.status_code == 200 and res.json()["status"] == "ok":
                 self.status_label.configure(text="Captura en progreso...")
+                self._suscribir()
             else:
                 self.status_label.configure(text="Error al iniciar")
         except Exception as e:
             self.status_label.configure(text=f"Error: {e}")
 
+    def _suscribir(self):
+        """Recibe las métricas que envía la API mientras dura la captura."""
+        url = f"{WS_URL}?frecuencia={FRECUENCIA_METRICAS}&mac={SENSOR['mac']}"
+        try:
+            with connect(url) as websocket:
+                self.websocket = websocket
+                for mensaje in websocket:
+                    sesiones = json.loads(mensaje)["sesiones"]
+                    if sesiones:
+                        self.after(0, self._mostrar_metricas, sesiones[0])
+        except Exception as e:
+            if self.websocket is not None:
+                texto = f"Métricas en vivo no disponibles: {e}"
+                self.after(0, lambda: self.status_label.configure(text=texto))
+        finally:
+            self.websocket = None
+
+    def _mostrar_metricas(self, data):
+        self.metric_labels["pasos"].configure(text=str(data["pasos"]))
+        self.metric_labels["cadencia"].configure(text=f"{data['cadencia']} pasos/min")
+        self.metric_labels["velocidad"].configure(text=f"{data['velocidad']} m/s")
+        self.metric_labels["longitud_paso"].configure(text=f"{data['longitud_paso']} m")
+        if "frecuencia_muestreo" in data:
+            self.metric_labels["frecuencia_muestreo"].configure(text=f"{data['frecuencia_muestreo']} Hz")
+
     def detener_captura(self):
         self.status_label.configure(text="Deteniendo...")
         threading.Thread(target=self._detener_backend, daemon=True).start()
@@ -92,13 +126,13 @@ class App(ctk.CTk):
     def _detener_backend(self):
         try:
             res = requests.post(f"{API_URL}/stop")
+            websocket, self.websocket = self.websocket, None
+            if websocket is not None:
+                websocket.close()
             if res.status_code == 200:
                 data = res.json()["metrics"]
                 self.status_label.configure(text="Captura detenida")
-                self.metric_labels["pasos"].configure(text=str(data["pasos"]))
-                self.metric_labels["cadencia"].configure(text=f"{data['cadencia']} pasos/min")
-                self.metric_labels["velocidad"].configure(text=f"{data['velocidad']} m/s")
-                self.metric_labels["longitud_paso"].configure(text=f"{data['longitud_paso']} m")
+                self.after(0, self._mostrar_metricas, data)
             else:
                 self.status_label.configure(text="Error al detener")
         except Exception as e:
@@ -1,10 +1,21 @@
 import asyncio
 import csv
+import os
+import sys
 import time
-from bleak import BleakClient
+import numpy as np
+
+current_dir = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..')))
+
+from Comun.decodificador import Decodificador
+from Comun.transporte import crear_cliente
+from Comun.conexiones import buscar_caracteristicas
+from Comun.almacen import AlmacenMuestras, COLUMNAS
+from Comun.sincronizacion import RelojSensor
 
 class DeviceModel:
-    def __init__(self, device_name, ble_device, callback_method, position):
+    def __init__(self, device_name, ble_device, callback_method, position, ruta_volcado=None):
         print("Inicializando modelo del dispositivo...")
         self.device_name = device_name
         self.ble_device = ble_device
@@ -14,9 +25,12 @@ class DeviceModel:
         self.writer_characteristic = None
         self.is_open = False
         self.device_data = {}
-        self.temp_bytes = []
-        self.timestamps = []
-        self.data_list = []
+        self.decodificador = Decodificador()
+        self.ultimo_tiempo = None
+        # Tiempo de cada muestra según el reloj del sensor, sin el retraso de BLE
+        self.reloj = RelojSensor()
+        # Muestras para el CSV; con ruta_volcado las más antiguas se pasan a disco
+        self.muestras = AlmacenMuestras(ruta_volcado=ruta_volcado)
 
         # Comandos de calibración
         self.CALIB_ACCEL = bytearray([0xFF, 0xAA, 0x01, 0x01, 0x00])
@@ -26,34 +40,20 @@ class DeviceModel:
     async def open_device(self):
         print(f"Abriendo dispositivo {self.device_name} en posición {self.position}...")
         try:
-            async with BleakClient(self.ble_device) as client:
+            async with crear_cliente(self.ble_device) as client:
                 self.client = client
                 self.is_open = True
 
-                service_uuid = "0000ffe5-0000-1000-8000-00805f9a34fb"
-                read_characteristic_uuid = "0000ffe4-0000-1000-8000-00805f9a34fb"
-                write_characteristic_uuid = "0000ffe9-0000-1000-8000-00805f9a34fb"
-
                 print("Obteniendo servicios del dispositivo...")
-                services = await client.get_services()
-                notify_characteristic = None
-
-                for service in services:
-                    if service.uuid == service_uuid:
-                        print(f"Servicio encontrado: {service}")
-                        for char in service.characteristics:
-                            if char.uuid == read_characteristic_uuid:
-                                notify_characteristic = char
-                            elif char.uuid == write_characteristic_uuid:
-                                self.writer_characteristic = char
-                        break
-
-                if not notify_characteristic or not self.writer_characteristic:
+                try:
+                    notify_characteristic, self.writer_characteristic = \
+                        await buscar_caracteristicas(client, self.ble_device)
+                except Exception:
                     print("No se encontraron características necesarias.")
                     return
 
-                print(f"Notificando característica: {notify_characteristic.uuid}")
-                await client.start_notify(notify_characteristic.uuid, self.on_data_received)
+                print(f"Notificando característica: {notify_characteristic}")
+                await client.start_notify(notify_characteristic, self.on_data_received)
 
                 # Calibrar magnetómetro
                 print("Iniciando calibración del magnetómetro...")
@@ -70,14 +70,14 @@ class DeviceModel:
                 while self.is_open:
                     await asyncio.sleep(1)
 
-                await client.stop_notify(notify_characteristic.uuid)
+                await client.stop_notify(notify_characteristic)
 
         except Exception as e:
             print(f"Error al abrir el dispositivo {self.device_name}: {e}")
 
     async def send_command(self, command):
         """Envía un comando al sensor WT901BLE"""
-        await self.client.write_gatt_char(self.writer_characteristic.uuid, command)
+        await self.client.write_gatt_char(self.writer_characteristic, command)
         await asyncio.sleep(0.1)  # Pequeña pausa para permitir ejecución
 
     def close_device(self):
@@ -86,28 +86,18 @@ class DeviceModel:
 
     def on_data_received(self, sender, data):
         current_time = time.time()
-        delta_time = current_time - self.timestamps[-1] if self.timestamps else 0.0
-        self.timestamps.append(current_time)
+        delta_time = current_time - self.ultimo_tiempo if self.ultimo_tiempo is not None else 0.0
+        self.ultimo_tiempo = current_time
         print(f"Datos recibidos de {sender} ({self.position}) con Δt={delta_time:.3f}s: {data}")
 
-        self.temp_bytes.extend(data)
-        if len(self.temp_bytes) >= 20:
-            self.process_data(self.temp_bytes[:20], delta_time)
-            self.temp_bytes = self.temp_bytes[20:]
+        imu, _ = self.decodificador.agregar(data)
+        if len(imu):
+            self.muestras.agregar(self.reloj.agregar(current_time, len(imu)), imu)
+            self.process_data(imu, delta_time)
 
-    def process_data(self, bytes_data, delta_time):
+    def process_data(self, imu, delta_time):
         print(f"Procesando datos del sensor en {self.position}...")
-        if bytes_data[1] == 0x61:
-            ax = self.get_signed_int16(bytes_data[3] << 8 | bytes_data[2]) / 32768 * 16
-            ay = self.get_signed_int16(bytes_data[5] << 8 | bytes_data[4]) / 32768 * 16
-            az = self.get_signed_int16(bytes_data[7] << 8 | bytes_data[6]) / 32768 * 16
-            gx = self.get_signed_int16(bytes_data[9] << 8 | bytes_data[8]) / 32768 * 2000
-            gy = self.get_signed_int16(bytes_data[11] << 8 | bytes_data[10]) / 32768 * 2000
-            gz = self.get_signed_int16(bytes_data[13] << 8 | bytes_data[12]) / 32768 * 2000
-            ang_x = self.get_signed_int16(bytes_data[15] << 8 | bytes_data[14]) / 32768 * 180
-            ang_y = self.get_signed_int16(bytes_data[17] << 8 | bytes_data[16]) / 32768 * 180
-            ang_z = self.get_signed_int16(bytes_data[19] << 8 | bytes_data[18]) / 32768 * 180
-
+        for ax, ay, az, gx, gy, gz, ang_x, ang_y, ang_z in imu.tolist():
             self.device_data.update({
                 "Position": self.position,
                 "DeltaTime": round(delta_time, 3),
@@ -123,24 +113,24 @@ class DeviceModel:
             })
             self.callback_method(self.device_data)
 
-            # Almacenar datos para CSV
-            self.data_list.append([time.time(), self.device_data])
-
-    @staticmethod
-    def get_signed_int16(value):
-        if value >= 0x8000:
-            value -= 0x10000
-        return value
-
     async def save_to_csv(self, filename):
         """Guarda los datos recopilados en un archivo CSV"""
+        self.muestras.cerrar()
         with open(filename, mode="w", newline="") as file:
             writer = csv.writer(file)
-            writer.writerow(["Timestamp", "Data"])  # Escribe encabezado
-            for entry in self.data_list:
-                writer.writerow(entry)
+            writer.writerow(["Timestamp", "Ax", "Ay", "Az", "Gx", "Gy", "Gz", "AngX", "AngY", "AngZ"])
+            for bloque in self.muestras.bloques():
+                filas = np.column_stack([bloque[nombre] for nombre in COLUMNAS])
+                filas[:, 1:] = filas[:, 1:].round(3)
+                writer.writerows(filas.tolist())
         print(f"Datos guardados en el CSV.")
 
+# Aquí debes editar la dirección MAC de los sensores que quieres conectar
+# (con varios sensores, un archivo distinto para cada uno)
+DEVICES = [
+    {"mac": "dd:70:a7:9c:c7:0f", "nombre": "sensor 1", "position": "posición 1", "archivo": "datos_sensor"},
+]
+
 async def main():
     csv_filename = "datos_sensor.csv"
     with open(csv_filename, mode="w", newline="") as csv_file:
@@ -158,11 +148,14 @@ async def main():
             ])
             print(f"Datos escritos en el CSV: {data}")
 
-        # Aquí debes editar la dirección MAC del sensor que quieres conectar
-        device = {"mac": "dd:70:a7:9c:c7:0f", "nombre": "sensor 1", "position": "posición 1"}
-        device_object = DeviceModel(device["nombre"], device["mac"], write_to_csv, device["position"])
-        await device_object.open_device()
-        await device_object.save_to_csv(csv_filename)
+        # Todos los sensores se calibran a la vez: la ventana de calibración
+        # dura lo mismo con uno que con varios
+        device_objects = [DeviceModel(device["nombre"], device["mac"], write_to_csv, device["position"],
+                                      ruta_volcado=f"{device['archivo']}.bin")
+                          for device in DEVICES]
+        await asyncio.gather(*(device_object.open_device() for device_object in device_objects))
+        for device, device_object in zip(DEVICES, device_objects):
+            await device_object.save_to_csv(f"{device['archivo']}.csv")
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -0,0 +1,155 @@
+# Almacén de muestras de un sensor en columnas de NumPy con memoria fija.
+# Las muestras se escriben en un arreglo preasignado de 2 * capacidad filas.
+# Cuando se llena, la mitad más antigua se vuelca a disco (si hay archivo de
+# volcado) y la mitad más reciente se mueve al inicio; así agregar es O(1)
+# amortizado y las últimas `capacidad` muestras siempre están contiguas en
+# memoria, por lo que las ventanas son vistas sin copia.
+
+import os
+
+import numpy as np
+
+from Comun.decodificador import DTYPE_IMU
+
+COLUMNAS = ('t', 'ax', 'ay', 'az', 'gx', 'gy', 'gz', 'ang_x', 'ang_y', 'ang_z')
+INDICE_COLUMNA = {nombre: i for i, nombre in enumerate(COLUMNAS)}
+
+# Formato de una fila en el archivo de volcado
+DTYPE_MUESTRA = np.dtype([(nombre, 'f8') for nombre in COLUMNAS])
+
+# 5 minutos a 200 Hz
+CAPACIDAD = 200 * 60 * 5
+
+
+class AlmacenMuestras:
+    """Columnas t, ax..az, gx..gz, ang_x..ang_z de un sensor.
+
+    Uso:
+        muestras = AlmacenMuestras(ruta_volcado="sensor1.bin")
+        muestras.agregar(t, imu)          # imu: arreglo DTYPE_IMU del decodificador
+        ang_z = muestras.columna('ang_z', 400)
+        muestras.rango(['ang_z'], 10.0)   # rango de los últimos 10 s
+    """
+
+    __slots__ = ('capacidad', 'datos', 'inicio', 'fin', 'total', 'volcadas',
+                 'descartadas', 'ruta_volcado', '_archivo')
+
+    def __init__(self, capacidad=CAPACIDAD, ruta_volcado=None):
+        self.capacidad = capacidad
+        # Una fila por columna: cada columna es contigua
+        self.datos = np.empty((len(COLUMNAS), 2 * capacidad), dtype=np.float64)
+        self.inicio = 0
+        self.fin = 0
+        self.total = 0
+        self.volcadas = 0
+        self.descartadas = 0
+        self.ruta_volcado = ruta_volcado
+        self._archivo = None
+        if ruta_volcado:
+            os.makedirs(os.path.dirname(os.path.abspath(ruta_volcado)), exist_ok=True)
+            self._archivo = open(ruta_volcado, "wb")
+
+    def __len__(self):
+        """Muestras disponibles en memoria."""
+        return self.fin - self.inicio
+
+    def agregar(self, t, imu):
+        """Agrega las muestras de `imu` (arreglo estructurado DTYPE_IMU).
+
+        `t` es un tiempo por muestra o uno solo para todas (el de la notificación).
+        """
+        n = len(imu)
+        if n == 0:
+            return
+        if n > self.capacidad:
+            # Un bloque mayor a la capacidad se agrega por partes
+            t = np.broadcast_to(t, (n,))
+            for i in range(0, n, self.capacidad):
+                self.agregar(t[i:i + self.capacidad], imu[i:i + self.capacidad])
+            return
+        if self.fin + n > self.datos.shape[1]:
+            self._compactar()
+
+        a, b = self.fin, self.fin + n
+        self.datos[0, a:b] = t
+        if imu.dtype == DTYPE_IMU and imu.flags.c_contiguous:
+            # Las 9 columnas en una sola asignación
+            self.datos[1:, a:b] = imu.view(np.float64).reshape(n, 9).T
+        else:
+            for i, nombre in enumerate(COLUMNAS[1:], start=1):
+                self.datos[i, a:b] = imu[nombre]
+        self.fin = b
+        self.total += n
+
+    def _compactar(self):
+        """Deja en memoria sólo las últimas `capacidad` muestras."""
+        corte = max(self.fin - self.capacidad, self.inicio)
+        if corte > self.inicio:
+            if self._archivo is not None:
+                self._volcar(self.inicio, corte)
+            else:
+                self.descartadas += corte - self.inicio
+        n = self.fin - corte
+        self.datos[:, :n] = self.datos[:, corte:self.fin]
+        self.inicio = 0
+        self.fin = n
+
+    def _volcar(self, a, b):
+        filas = np.empty(b - a, dtype=DTYPE_MUESTRA)
+        for i, nombre in enumerate(COLUMNAS):
+            filas[nombre] = self.datos[i, a:b]
+        filas.tofile(self._archivo)
+        self.volcadas += b - a
+
+    def ultimas(self, n=None):
+        """Vista (columnas, n) de las últimas `n` muestras en memoria."""
+        a = self.inicio if n is None else max(self.fin - n, self.inicio)
+        return self.datos[:, a:self.fin]
+
+    def columna(self, nombre, n=None):
+        """Vista de una columna con las últimas `n` muestras en memoria."""
+        return self.ultimas(n)[INDICE_COLUMNA[nombre]]
+
+    def desde(self, t0):
+        """Vista de las muestras en memoria con t >= t0."""
+        t = self.datos[0, self.inicio:self.fin]
+        a = self.inicio + int(np.searchsorted(t, t0, side='left'))
+        return self.datos[:, a:self.fin]
+
+    def rango(self, nombres, segundos):
+        """Máximo - mínimo de cada columna en los últimos `segundos` en memoria."""
+        if self.fin == self.inicio:
+            return {}
+        ventana = self.desde(self.datos[0, self.fin - 1] - segundos)
+        return {nombre: float(np.ptp(ventana[INDICE_COLUMNA[nombre]])) for nombre in nombres}
+
+    def cerrar(self):
+        """Vuelca a disco lo que queda en memoria y cierra el archivo."""
+        if self._archivo is None:
+            return
+        if self.fin > self.inicio:
+            self._volcar(self.inicio, self.fin)
+            self.inicio = self.fin
+        self._archivo.close()
+        self._archivo = None
+
+    def bloques(self, tamano=CAPACIDAD):
+        """Itera sobre todas las muestras (volcadas y en memoria) como arreglos DTYPE_MUESTRA."""
+        if self.ruta_volcado and self.volcadas:
+            if self._archivo is not None:
+                self._archivo.flush()
+            volcado = np.memmap(self.ruta_volcado, dtype=DTYPE_MUESTRA, mode='r',
+                                shape=(self.volcadas,))
+            for i in range(0, self.volcadas, tamano):
+                yield np.asarray(volcado[i:i + tamano])
+            del volcado
+        if self.fin > self.inicio:
+            filas = np.empty(self.fin - self.inicio, dtype=DTYPE_MUESTRA)
+            for i, nombre in enumerate(COLUMNAS):
+                filas[nombre] = self.datos[i, self.inicio:self.fin]
+            yield filas
+
+
+def leer_volcado(ruta):
+    """Abre un archivo de volcado como arreglo DTYPE_MUESTRA (memmap, sin cargarlo)."""
+    return np.memmap(ruta, dtype=DTYPE_MUESTRA, mode='r')
@@ -0,0 +1,221 @@
+# Conexión de varios sensores a la vez.
+# Un solo escaneo BLE para todos los sensores, conexión y calibración en
+# paralelo (el arranque de N sensores dura una ventana de calibración, no
+# N), las características de lectura y escritura guardadas por MAC para no
+# recorrer los servicios en cada reconexión, y reconexión automática con
+# espera exponencial cuando se cae el enlace.
+
+import asyncio
+import random
+
+from bleak import BleakScanner
+
+from Comun.simulador import UUID_SERVICIO, UUID_LECTURA, UUID_ESCRITURA
+from Comun.transporte import crear_cliente, es_simulado
+
+# Comandos de calibración (registro, valor) y espera después de cada uno (s)
+COMANDOS_CALIBRACION = (
+    (bytearray([0xFF, 0xAA, 0x01, 0x00]), 1.0),
+    (bytearray([0xFF, 0xAA, 0x02, 0x00]), 1.0),
+    (bytearray([0xFF, 0xAA, 0x03, 0x00]), 1.0),
+)
+
+CONFIG_CONEXION = dict(
+    tiempo_escaneo=5.0,       # s del escaneo inicial
+    reintento_inicial=0.5,    # s de espera tras la primera caída
+    reintento_maximo=30.0,    # s de espera máxima entre reintentos
+    max_reintentos=None,      # None = reintentar siempre
+    tiempo_inicio=30.0,       # s máximos que GestorConexiones.iniciar espera a los sensores
+    tiempo_cierre=5.0,        # s máximos que GestorConexiones.detener espera a cada conexión
+)
+
+# MAC -> (característica de lectura, característica de escritura)
+_caracteristicas = {}
+
+
+async def escanear(direcciones, tiempo=CONFIG_CONEXION['tiempo_escaneo']):
+    """Busca todos los sensores en un solo escaneo.
+
+    Devuelve {dirección: BLEDevice} para los sensores encontrados; los
+    simulados y los no encontrados quedan con su dirección, y bleak los
+    buscará al conectar.
+    """
+    encontrados = {}
+    reales = [d for d in direcciones if not es_simulado(d)]
+    if reales:
+        dispositivos = await BleakScanner.discover(timeout=tiempo)
+        por_mac = {d.address.lower(): d for d in dispositivos}
+        encontrados = {d: por_mac[d.lower()] for d in reales if d.lower() in por_mac}
+    return {d: encontrados.get(d, d) for d in direcciones}
+
+
+def _referencia(caracteristica):
+    # El handle identifica la característica entre conexiones; el simulador sólo tiene UUID
+    return getattr(caracteristica, 'handle', caracteristica.uuid)
+
+
+async def buscar_caracteristicas(client, direccion):
+    """Características de lectura y escritura del sensor (guardadas por MAC)."""
+    if direccion in _caracteristicas:
+        return _caracteristicas[direccion]
+
+    lectura = escritura = None
+    for service in await client.get_services():
+        if service.uuid == UUID_SERVICIO:
+            for char in service.characteristics:
+                if char.uuid == UUID_LECTURA:
+                    lectura = _referencia(char)
+                elif char.uuid == UUID_ESCRITURA:
+                    escritura = _referencia(char)
+            break
+
+    if lectura is None or escritura is None:
+        raise Exception("Características BLE no encontradas")
+    _caracteristicas[direccion] = lectura, escritura
+    return lectura, escritura
+
+
+async def calibrar(client, escritura, comandos=COMANDOS_CALIBRACION):
+    for comando, espera in comandos:
+        await client.write_gatt_char(escritura, comando)
+        await asyncio.sleep(espera)
+
+
+class ConexionSensor:
+    """Mantiene la conexión con un sensor y le entrega sus notificaciones a `callback`.
+
+    Uso:
+        conexion = ConexionSensor(mac, callback)
+        await conexion.ejecutar(parada)    # hasta que se active el asyncio.Event
+
+    La calibración se hace sólo en la primera conexión. Si el enlace se
+    cae, se reconecta esperando reintento_inicial, el doble, ... hasta
+    reintento_maximo segundos. `al_cambiar(estado)` recibe cada cambio de
+    estado: conectando, calibrando, capturando, reconectando, detenido.
+    """
+
+    def __init__(self, direccion, callback, dispositivo=None, calibracion=COMANDOS_CALIBRACION,
+                 al_cambiar=None, **config):
+        self.direccion = direccion
+        self.dispositivo = dispositivo if dispositivo is not None else direccion
+        self.callback = callback
+        self.calibracion = calibracion
+        self.al_cambiar = al_cambiar
+        self.config = {**CONFIG_CONEXION, **config}
+        self.estado = None
+        self.calibrado = False
+        self.reconexiones = 0
+        self.error = None
+        self.lista = asyncio.Event()   # notificaciones activas por primera vez
+
+    def _cambiar(self, estado):
+        self.estado = estado
+        if self.al_cambiar is not None:
+            self.al_cambiar(estado)
+
+    async def ejecutar(self, parada):
+        intentos = 0
+        self._cambiar("conectando")
+        while not parada.is_set():
+            caida = asyncio.Event()
+            try:
+                async with crear_cliente(self.dispositivo,
+                                         disconnected_callback=lambda _: caida.set()) as client:
+                    lectura, escritura = await buscar_caracteristicas(client, self.direccion)
+                    if self.calibracion and not self.calibrado:
+                        self._cambiar("calibrando")
+                        await calibrar(client, escritura, self.calibracion)
+                        self.calibrado = True
+                    await client.start_notify(lectura, self.callback)
+                    self._cambiar("capturando")
+                    self.lista.set()
+                    intentos = 0
+
+                    # Esperar a que se pida parar o se caiga la conexión
+                    espera_parada = asyncio.create_task(parada.wait())
+                    espera_caida = asyncio.create_task(caida.wait())
+                    await asyncio.wait((espera_parada, espera_caida), return_when=asyncio.FIRST_COMPLETED)
+                    espera_parada.cancel()
+                    espera_caida.cancel()
+                    if not caida.is_set():
+                        await client.stop_notify(lectura)
+                        break
+            except Exception as e:
+                self.error = str(e)
+                # Las características guardadas pueden ser de otro firmware
+                _caracteristicas.pop(self.direccion, None)
+
+            intentos += 1
+            maximo = self.config['max_reintentos']
+            if maximo is not None and intentos > maximo:
+                raise ConnectionError(f"No se pudo reconectar con {self.direccion}: {self.error}")
+            self.reconexiones += 1
+            self._cambiar("reconectando")
+            espera = min(self.config['reintento_inicial'] * 2 ** (intentos - 1), self.config['reintento_maximo'])
+            # Un poco de azar para que los sensores no reintenten todos a la vez
+            espera *= random.uniform(0.8, 1.2)
+            try:
+                await asyncio.wait_for(parada.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
+        self._cambiar("detenido")
+
+
+class GestorConexiones:
+    """Conecta y calibra varios sensores en paralelo.
+
+    Uso:
+        gestor = GestorConexiones({mac: callback, ...})
+        fallidos = await gestor.iniciar()   # escanea una vez y espera a que todos capturen
+        ...
+        await gestor.detener()
+
+    `iniciar` espera a lo más `tiempo_inicio` segundos y devuelve las
+    direcciones que no llegaron a capturar; esas conexiones se siguen
+    reintentando en segundo plano (salvo que agotaran `max_reintentos`).
+    """
+
+    def __init__(self, callbacks, **config):
+        self.callbacks = dict(callbacks)
+        self.config = {**CONFIG_CONEXION, **config}
+        self.parada = asyncio.Event()
+        self.conexiones = {}
+        self.tareas = {}
+
+    async def iniciar(self):
+        dispositivos = await escanear(list(self.callbacks), self.config['tiempo_escaneo'])
+        for direccion, callback in self.callbacks.items():
+            conexion = ConexionSensor(direccion, callback, dispositivos[direccion], **self.config)
+            self.conexiones[direccion] = conexion
+            self.tareas[direccion] = asyncio.create_task(conexion.ejecutar(self.parada))
+
+        # Listo cuando todos capturan o al vencer tiempo_inicio; una conexión
+        # que falla o no termina de conectar no bloquea al resto
+        esperas = [asyncio.create_task(self._esperar_lista(direccion)) for direccion in self.conexiones]
+        _, pendientes = await asyncio.wait(esperas, timeout=self.config['tiempo_inicio'])
+        for espera in pendientes:
+            espera.cancel()
+        return self.fallidos()
+
+    async def _esperar_lista(self, direccion):
+        espera = asyncio.create_task(self.conexiones[direccion].lista.wait())
+        await asyncio.wait((espera, self.tareas[direccion]), return_when=asyncio.FIRST_COMPLETED)
+        espera.cancel()
+
+    def fallidos(self):
+        """Direcciones de los sensores que todavía no capturan por primera vez."""
+        return [direccion for direccion, c in self.conexiones.items() if not c.lista.is_set()]
+
+    async def detener(self):
+        self.parada.set()
+        if not self.tareas:
+            return
+        # Un intento de conexión en curso no se entera de la parada: se cancela
+        _, pendientes = await asyncio.wait(self.tareas.values(), timeout=self.config['tiempo_cierre'])
+        for tarea in pendientes:
+            tarea.cancel()
+        await asyncio.gather(*self.tareas.values(), return_exceptions=True)
+
+    def estados(self):
+        return {direccion: {"estado": c.estado, "reconexiones": c.reconexiones, "error": c.error}
+                for direccion, c in self.conexiones.items()}
@@ -0,0 +1,138 @@
+# Decodificador de los paquetes BLE del WT9011DCL / WT901BLE.
+# Cada paquete mide 20 bytes y empieza con la cabecera 0x55 seguida del tipo:
+#   0x61: aceleración, velocidad angular y ángulo (9 enteros int16 little-endian)
+#   0x71: respuesta de registros; los bytes 2-7 se leen como magnetómetro (x, y, z)
+# Una notificación puede traer varios paquetes, uno incompleto o bytes sueltos;
+# el decodificador acumula los bytes, se resincroniza con la cabecera y
+# decodifica todos los paquetes completos de una vez con NumPy.
+
+import numpy as np
+
+CABECERA = 0x55
+TIPO_IMU = 0x61
+TIPO_MAG = 0x71
+TIPOS = (TIPO_IMU, TIPO_MAG)
+TAMANO_PAQUETE = 20
+
+# Escalas de los 9 valores del paquete 0x61 (valor / 32768 * escala)
+ESCALAS_IMU = np.array([16, 16, 16, 2000, 2000, 2000, 180, 180, 180], dtype=np.float64)
+
+# Vista del paquete crudo: cabecera, tipo y 9 enteros de 16 bits
+DTYPE_PAQUETE = np.dtype([('cabecera', 'u1'), ('tipo', 'u1'), ('valores', '<i2', (9,))])
+
+# Datos de salida
+DTYPE_IMU = np.dtype([('ax', 'f8'), ('ay', 'f8'), ('az', 'f8'),
+                      ('gx', 'f8'), ('gy', 'f8'), ('gz', 'f8'),
+                      ('ang_x', 'f8'), ('ang_y', 'f8'), ('ang_z', 'f8')])
+DTYPE_MAG = np.dtype([('mx', 'i2'), ('my', 'i2'), ('mz', 'i2')])
+
+# Resultados vacíos compartidos (sólo lectura) para no crear arreglos en cada notificación
+IMU_VACIO = np.empty(0, dtype=DTYPE_IMU)
+MAG_VACIO = np.empty(0, dtype=DTYPE_MAG)
+IMU_VACIO.flags.writeable = False
+MAG_VACIO.flags.writeable = False
+
+
+def decodificar_imu(valores):
+    """Convierte un arreglo (n, 9) de int16 de paquetes 0x61 a unidades físicas.
+
+    Devuelve un arreglo estructurado DTYPE_IMU: aceleración en g, velocidad
+    angular en °/s y ángulos en grados.
+    """
+    salida = np.empty(len(valores), dtype=DTYPE_IMU)
+    plano = salida.view(np.float64).reshape(len(valores), 9)
+    np.divide(valores, 32768, out=plano)
+    np.multiply(plano, ESCALAS_IMU, out=plano)
+    return salida
+
+
+class Decodificador:
+    """Buffer de bytes de un sensor que entrega paquetes decodificados.
+
+    Uso:
+        decodificador = Decodificador()
+        imu, mag = decodificador.agregar(data)   # en cada notificación
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.descartados = 0
+        self.paquetes = 0
+
+    def agregar(self, data):
+        """Agrega los bytes de una notificación y decodifica los paquetes completos.
+
+        Devuelve (imu, mag): arreglos estructurados DTYPE_IMU y DTYPE_MAG con
+        todos los paquetes 0x61 y 0x71 completos, en orden de llegada.
+        """
+        self.buffer += data
+        buffer = self.buffer
+
+        # Caso común: la notificación trae exactamente un paquete alineado
+        if len(buffer) == TAMANO_PAQUETE and buffer[0] == CABECERA and buffer[1] in TIPOS:
+            paquete = np.frombuffer(buffer, dtype=DTYPE_PAQUETE)
+            tipo = buffer[1]
+            if tipo == TIPO_IMU:
+                resultado = decodificar_imu(paquete['valores']), MAG_VACIO
+            else:
+                resultado = IMU_VACIO, paquete['valores'][:, :3].copy().view(DTYPE_MAG).reshape(-1)
+            del paquete
+            buffer.clear()
+            self.paquetes += 1
+            return resultado
+
+        imu, mag = [], []
+        pos = 0
+
+        while True:
+            inicio = buffer.find(CABECERA, pos)
+            if inicio < 0:
+                # No hay cabecera: nada de lo acumulado es aprovechable
+                self.descartados += len(buffer) - pos
+                pos = len(buffer)
+                break
+            self.descartados += inicio - pos
+            n = (len(buffer) - inicio) // TAMANO_PAQUETE
+            if n == 0:
+                pos = inicio
+                break
+
+            # Paquetes alineados a partir de `inicio` (vista sin copia)
+            paquetes = np.frombuffer(buffer, dtype=DTYPE_PAQUETE, count=n, offset=inicio)
+            validos = (paquetes['cabecera'] == CABECERA) & \
+                      ((paquetes['tipo'] == TIPO_IMU) | (paquetes['tipo'] == TIPO_MAG))
+            k = n if validos.all() else int(np.argmin(validos))
+            if k == 0:
+                # Falsa cabecera (un 0x55 dentro de los datos): resincronizar
+                del paquetes, validos
+                pos = inicio + 1
+                self.descartados += 1
+                continue
+
+            # Decodificar directamente desde el buffer; la única copia es la salida
+            imu_bloque, mag_bloque = self._decodificar(paquetes[:k])
+            imu.append(imu_bloque)
+            mag.append(mag_bloque)
+            self.paquetes += k
+            del paquetes, validos
+            pos = inicio + k * TAMANO_PAQUETE
+
+        if pos:
+            del buffer[:pos]
+
+        return _unir(imu, DTYPE_IMU), _unir(mag, DTYPE_MAG)
+
+    @staticmethod
+    def _decodificar(paquetes):
+        es_imu = paquetes['tipo'] == TIPO_IMU
+        if es_imu.all():
+            return decodificar_imu(paquetes['valores']), MAG_VACIO
+        imu = decodificar_imu(paquetes['valores'][es_imu])
+        mag = np.ascontiguousarray(paquetes['valores'][~es_imu][:, :3]).view(DTYPE_MAG).reshape(-1)
+        return imu, mag
+
+
+def _unir(partes, dtype):
+    if not partes:
+        return IMU_VACIO if dtype is DTYPE_IMU else MAG_VACIO
+    return partes[0] if len(partes) == 1 else np.concatenate(partes)
@@ -0,0 +1,99 @@
+# Mensajes para el servicio de fusión (Fusion/API.py) con los sensores de
+# un paciente. Cada sensor va en un segmento ("pelvis", "muslo", "tibia" o
+# "pie") y, salvo la pelvis, en un lado ("derecho" o "izquierdo"). Las
+# orientaciones se reúnen en la rejilla común del Sincronizador, los ángulos
+# de cada lado se calculan con AngulosArticulares y se pasan a la convención
+# de la visión (nombres y sentido de las columnas de ángulos del análisis
+# de video). Los talones que detecta el sensor de la tibia se envían con su
+# lado, que es lo que usa la fusión para alinear los relojes.
+
+import numpy as np
+
+from Comun.sincronizacion import ARTICULACIONES, AngulosArticulares, Sincronizador
+
+# Lado del sensor y terminación del nombre de la articulación en la visión
+LADOS = {"derecho": "derecha", "izquierdo": "izquierda"}
+
+# Segmentos con sensor; la pelvis es común a los dos lados
+SEGMENTOS = {segmento for par in ARTICULACIONES.values() for segmento in par}
+
+CONFIG_ENVIO = dict(
+    frecuencia=100.0,   # muestras por segundo de los ángulos enviados
+    latencia=0.1,       # s máximos que se espera a un sensor retrasado
+    # Sentido de la flexión del IMU respecto al ángulo de la visión, que
+    # mide la cadera y el tobillo como 180° menos la flexión (el desfase
+    # constante lo corrige la fusión)
+    signos={"cadera": -1.0, "rodilla": 1.0, "tobillo": -1.0},
+)
+
+
+class EmisorFusion:
+    """Arma los mensajes de /ws/imu del servicio de fusión.
+
+    Uso:
+        emisor = EmisorFusion({"mac1": ("pelvis", None), "mac2": ("muslo", "derecho"),
+                               "mac3": ("tibia", "derecho")})
+        emisor.agregar("mac2", tiempos, cuaterniones)   # tiempos de RelojSensor
+        emisor.agregar_eventos("mac3", eventos)         # eventos de DetectorPasos
+        mensaje = emisor.extraer(ahora)                 # None si no hay nada nuevo
+
+    Los sensores en otros segmentos o sin lado se ignoran. Los ángulos sólo
+    salen cuando llegan datos de todos los sensores, y los primeros
+    `muestras_referencia` se toman como postura neutra (el paciente de pie).
+    """
+
+    def __init__(self, sensores, **config):
+        self.config = {**CONFIG_ENVIO, **config}
+        self.sensores = {clave: (segmento, lado) for clave, (segmento, lado) in sensores.items()
+                         if segmento in SEGMENTOS and (segmento == "pelvis" or lado in LADOS)}
+        # Por lado: {segmento: clave del sensor} y sus ángulos articulares
+        self.lados = {}
+        for lado in LADOS:
+            segmentos = {segmento: clave for clave, (segmento, l) in self.sensores.items()
+                         if segmento == "pelvis" or l == lado}
+            angulos = AngulosArticulares(list(segmentos))
+            if angulos.articulaciones:
+                self.lados[lado] = (segmentos, angulos)
+        # Sólo se sincronizan los sensores que forman alguna articulación
+        self.sincronizados = sorted({clave for segmentos, _ in self.lados.values()
+                                     for clave in segmentos.values()})
+        self.sincronizador = Sincronizador(self.sincronizados, frecuencia=self.config['frecuencia'],
+                                           latencia=self.config['latencia'])
+        self.eventos = []
+
+    def agregar(self, clave, tiempos, cuaterniones):
+        if clave in self.sincronizados:
+            self.sincronizador.agregar(clave, tiempos, cuaterniones)
+
+    def agregar_eventos(self, clave, eventos):
+        segmento, lado = self.sensores.get(clave, (None, None))
+        if segmento != "tibia":
+            return
+        self.eventos.extend({"tipo": "talon", "t": round(evento["t"], 4), "lado": lado}
+                            for evento in eventos if evento["tipo"] == "talon")
+
+    def extraer(self, ahora):
+        """Mensaje con los ángulos y talones nuevos hasta `ahora - latencia`, o None."""
+        angulos = {}
+        tiempos, cuaterniones = self.sincronizador.extraer(ahora) if self.lados else ([], {})
+        if len(tiempos):
+            for lado, (segmentos, articulares) in self.lados.items():
+                actuales = articulares.agregar({segmento: cuaterniones[clave]
+                                                for segmento, clave in segmentos.items()})
+                for nombre, valores in actuales.items():
+                    signo = self.config['signos'][nombre]
+                    angulos[f"{nombre}_{LADOS[lado]}"] = np.round(signo * valores, 2).tolist()
+        if not angulos and not self.eventos:
+            return None
+        mensaje = {"t": np.round(tiempos, 4).tolist() if angulos else [],
+                   "angulos": angulos, "eventos": self.eventos}
+        self.eventos = []
+        return mensaje
+
+    def estado(self):
+        return {
+            "sensores": {clave: {"segmento": segmento, "lado": lado}
+                         for clave, (segmento, lado) in self.sensores.items()},
+            "articulaciones": sorted(f"{nombre}_{LADOS[lado]}" for lado, (_, articulares) in self.lados.items()
+                                     for nombre in articulares.articulaciones),
+        }
@@ -0,0 +1,241 @@
+# Estimación de la orientación de cada sensor con el filtro de Madgwick.
+# Fusiona giroscopio, acelerómetro y, si hay, magnetómetro (0x71) en un
+# cuaternión (w, x, y, z) por muestra, en lugar de usar los ángulos de
+# Euler que calcula el sensor. Con cuaterniones no hay bloqueo de cardán y
+# la orientación relativa entre dos segmentos es un producto.
+#
+# El filtro es recursivo en el tiempo, así que cada bloque del decodificador
+# se prepara de una vez con NumPy (grados a radianes, columnas a listas) y
+# la actualización recorre las muestras con aritmética de flotantes: unos
+# 5 µs por muestra, frente a más de 100 µs por paso con operaciones de
+# NumPy sobre arreglos tan pequeños. El paso de integración de cada muestra
+# sale de sus tiempos (RelojSensor), porque el sensor no siempre muestrea a
+# la frecuencia nominal.
+
+import math
+
+import numpy as np
+
+GRADOS = math.pi / 180.0
+
+CONFIG_ORIENTACION = dict(
+    frecuencia=200.0,           # muestras por segundo si no se pasan los tiempos
+    dt_maximo=0.1,              # s; un hueco mayor (reconexión) se integra con el último periodo
+    beta=0.1,                   # ganancia de la corrección (mayor = confía más en acel/mag)
+    usar_magnetometro=True,     # False en interiores con campo magnético perturbado
+)
+
+
+def _paso_imu(q0, q1, q2, q3, gx, gy, gz, ax, ay, az, beta, dt):
+    """Una actualización de Madgwick con giroscopio (rad/s) y acelerómetro."""
+    # Derivada del cuaternión por la velocidad angular
+    d0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+    d1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+    d2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+    d3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+    # Corrección por descenso de gradiente hacia la gravedad medida
+    n = 1.0 / ((ax * ax + ay * ay + az * az) ** 0.5 + 1e-12)
+    ax, ay, az = ax * n, ay * n, az * n
+    q0q0, q1q1, q2q2, q3q3 = q0 * q0, q1 * q1, q2 * q2, q3 * q3
+    s0 = 4 * q0 * q2q2 + 2 * q2 * ax + 4 * q0 * q1q1 - 2 * q1 * ay
+    s1 = (4 * q1 * q3q3 - 2 * q3 * ax + 4 * q0q0 * q1 - 2 * q0 * ay - 4 * q1
+          + 8 * q1 * q1q1 + 8 * q1 * q2q2 + 4 * q1 * az)
+    s2 = (4 * q0q0 * q2 + 2 * q0 * ax + 4 * q2 * q3q3 - 2 * q3 * ay - 4 * q2
+          + 8 * q2 * q1q1 + 8 * q2 * q2q2 + 4 * q2 * az)
+    s3 = 4 * q1q1 * q3 - 2 * q1 * ax + 4 * q2q2 * q3 - 2 * q2 * ay
+    return _integrar(q0, q1, q2, q3, d0, d1, d2, d3, s0, s1, s2, s3, beta, dt)
+
+
+def _paso_marg(q0, q1, q2, q3, gx, gy, gz, ax, ay, az, mx, my, mz, beta, dt):
+    """Una actualización de Madgwick con giroscopio, acelerómetro y magnetómetro."""
+    d0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+    d1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+    d2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+    d3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+    n = 1.0 / ((ax * ax + ay * ay + az * az) ** 0.5 + 1e-12)
+    ax, ay, az = ax * n, ay * n, az * n
+    n = 1.0 / ((mx * mx + my * my + mz * mz) ** 0.5 + 1e-12)
+    mx, my, mz = mx * n, my * n, mz * n
+
+    q0q0, q0q1, q0q2, q0q3 = q0 * q0, q0 * q1, q0 * q2, q0 * q3
+    q1q1, q1q2, q1q3 = q1 * q1, q1 * q2, q1 * q3
+    q2q2, q2q3, q3q3 = q2 * q2, q2 * q3, q3 * q3
+
+    # Dirección del campo magnético de referencia (en el plano horizontal y vertical)
+    hx = (mx * q0q0 - 2 * q0 * my * q3 + 2 * q0 * mz * q2 + mx * q1q1 + 2 * q1 * my * q2
+          + 2 * q1 * mz * q3 - mx * q2q2 - mx * q3q3)
+    hy = (2 * q0 * mx * q3 + my * q0q0 - 2 * q0 * mz * q1 + 2 * q1 * mx * q2 - my * q1q1
+          + my * q2q2 + 2 * q2 * mz * q3 - my * q3q3)
+    _2bx = (hx * hx + hy * hy) ** 0.5
+    _2bz = (-2 * q0 * mx * q2 + 2 * q0 * my * q1 + mz * q0q0 + 2 * q1 * mx * q3 - mz * q1q1
+            + 2 * q2 * my * q3 - mz * q2q2 + mz * q3q3)
+    _4bx, _4bz = 2 * _2bx, 2 * _2bz
+
+    # Errores de gravedad (fa) y campo magnético (fm)
+    fa1 = 2 * q1q3 - 2 * q0q2 - ax
+    fa2 = 2 * q0q1 + 2 * q2q3 - ay
+    fa3 = 1 - 2 * q1q1 - 2 * q2q2 - az
+    fm1 = _2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx
+    fm2 = _2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my
+    fm3 = _2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz
+
+    s0 = (-2 * q2 * fa1 + 2 * q1 * fa2 - _2bz * q2 * fm1
+          + (-_2bx * q3 + _2bz * q1) * fm2 + _2bx * q2 * fm3)
+    s1 = (2 * q3 * fa1 + 2 * q0 * fa2 - 4 * q1 * fa3 + _2bz * q3 * fm1
+          + (_2bx * q2 + _2bz * q0) * fm2 + (_2bx * q3 - _4bz * q1) * fm3)
+    s2 = (-2 * q0 * fa1 + 2 * q3 * fa2 - 4 * q2 * fa3 + (-_4bx * q2 - _2bz * q0) * fm1
+          + (_2bx * q1 + _2bz * q3) * fm2 + (_2bx * q0 - _4bz * q2) * fm3)
+    s3 = (2 * q1 * fa1 + 2 * q2 * fa2 + (-_4bx * q3 + _2bz * q1) * fm1
+          + (-_2bx * q0 + _2bz * q2) * fm2 + _2bx * q1 * fm3)
+    return _integrar(q0, q1, q2, q3, d0, d1, d2, d3, s0, s1, s2, s3, beta, dt)
+
+
+def _integrar(q0, q1, q2, q3, d0, d1, d2, d3, s0, s1, s2, s3, beta, dt):
+    n = beta / ((s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3) ** 0.5 + 1e-12)
+    q0 = q0 + (d0 - n * s0) * dt
+    q1 = q1 + (d1 - n * s1) * dt
+    q2 = q2 + (d2 - n * s2) * dt
+    q3 = q3 + (d3 - n * s3) * dt
+    n = 1.0 / (q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3) ** 0.5
+    return q0 * n, q1 * n, q2 * n, q3 * n
+
+
+def cuaternion_gravedad(ax, ay, az):
+    """Cuaternión inicial con roll y pitch a partir de la gravedad (yaw = 0)."""
+    roll = math.atan2(ay, az)
+    pitch = math.atan2(-ax, math.hypot(ay, az))
+    cr, sr = math.cos(roll / 2), math.sin(roll / 2)
+    cp, sp = math.cos(pitch / 2), math.sin(pitch / 2)
+    return np.array([cr * cp, sr * cp, cr * sp, -sr * sp])
+
+
+class FiltroOrientacion:
+    """Orientación de un sensor, actualizada con los bloques del decodificador.
+
+    Uso:
+        filtro = FiltroOrientacion(frecuencia=200)
+        cuaterniones = filtro.actualizar(imu, mag, tiempos)   # (n, 4), uno por muestra
+        filtro.q                                               # orientación actual
+    """
+
+    def __init__(self, **config):
+        self.config = {**CONFIG_ORIENTACION, **config}
+        self.dt = 1.0 / self.config['frecuencia']
+        self.beta = self.config['beta']
+        self.q = None
+        self.mag = None
+        self.ultimo_t = None
+
+    def actualizar(self, imu, mag=None, tiempos=None):
+        """Procesa las muestras de `imu` (DTYPE_IMU) y devuelve sus cuaterniones (n, 4).
+
+        `tiempos` (n,) son los tiempos de cada muestra (RelojSensor); sin
+        ellos se integra con 1 / `frecuencia`. El magnetómetro llega con
+        menos frecuencia que las muestras 0x61; se usa la última lectura
+        recibida hasta que llegue otra.
+        """
+        salida = np.empty((len(imu), 4))
+        if len(imu):
+            self._recorrer(imu, salida, self._pasos(tiempos, len(imu)))
+        if mag is not None and len(mag) and self.config['usar_magnetometro']:
+            ultima = mag[-1]
+            self.mag = (float(ultima['mx']), float(ultima['my']), float(ultima['mz']))
+        return salida
+
+    def _pasos(self, tiempos, n):
+        """Paso de integración (s) de cada una de las n muestras."""
+        if tiempos is None or len(tiempos) != n:
+            return [self.dt] * n
+        tiempos = np.asarray(tiempos, dtype=np.float64)
+        anterior = tiempos[0] - self.dt if self.ultimo_t is None else self.ultimo_t
+        pasos = np.diff(tiempos, prepend=anterior)
+        validos = (pasos > 0) & (pasos <= self.config['dt_maximo'])
+        if n > 1 and validos[1:].all():
+            # Periodo medido, para los huecos y los bloques sin tiempos
+            self.dt = float(tiempos[-1] - tiempos[0]) / (n - 1)
+        self.ultimo_t = float(tiempos[-1])
+        return np.where(validos, pasos, self.dt).tolist()
+
+    def _recorrer(self, imu, salida, pasos):
+        if self.q is None:
+            self.q = cuaternion_gravedad(float(imu['ax'][0]), float(imu['ay'][0]), float(imu['az'][0]))
+
+        q0, q1, q2, q3 = self.q.tolist()
+        beta = self.beta
+        giro = np.stack([imu['gx'], imu['gy'], imu['gz']], axis=1) * GRADOS
+        acel = np.stack([imu['ax'], imu['ay'], imu['az']], axis=1)
+        if self.mag is not None:
+            mx, my, mz = self.mag
+            for i, ((gx, gy, gz), (ax, ay, az), dt) in enumerate(zip(giro.tolist(), acel.tolist(), pasos)):
+                q0, q1, q2, q3 = _paso_marg(q0, q1, q2, q3, gx, gy, gz, ax, ay, az, mx, my, mz, beta, dt)
+                salida[i] = (q0, q1, q2, q3)
+        else:
+            for i, ((gx, gy, gz), (ax, ay, az), dt) in enumerate(zip(giro.tolist(), acel.tolist(), pasos)):
+                q0, q1, q2, q3 = _paso_imu(q0, q1, q2, q3, gx, gy, gz, ax, ay, az, beta, dt)
+                salida[i] = (q0, q1, q2, q3)
+        self.q = salida[-1].copy()
+
+    def euler(self):
+        """Roll, pitch y yaw actuales en grados (sólo para mostrar)."""
+        return a_euler(self.q) if self.q is not None else np.zeros(3)
+
+    def estado(self):
+        """Orientación actual para las respuestas de la API."""
+        q = self.q if self.q is not None else np.array([1.0, 0.0, 0.0, 0.0])
+        return {
+            "cuaternion": [round(x, 5) for x in q.tolist()],
+            "euler": [round(x, 2) for x in a_euler(q).tolist()],
+            "magnetometro": self.mag is not None,
+        }
+
+
+def producto(p, q):
+    """Producto de cuaterniones (..., 4)."""
+    p0, p1, p2, p3 = np.moveaxis(np.asarray(p), -1, 0)
+    q0, q1, q2, q3 = np.moveaxis(np.asarray(q), -1, 0)
+    return np.stack([p0 * q0 - p1 * q1 - p2 * q2 - p3 * q3,
+                     p0 * q1 + p1 * q0 + p2 * q3 - p3 * q2,
+                     p0 * q2 - p1 * q3 + p2 * q0 + p3 * q1,
+                     p0 * q3 + p1 * q2 - p2 * q1 + p3 * q0], axis=-1)
+
+
+def conjugado(q):
+    return np.asarray(q) * np.array([1.0, -1.0, -1.0, -1.0])
+
+
+def relativo(q_padre, q_hijo):
+    """Orientación del segmento hijo en el marco del segmento padre."""
+    return producto(conjugado(q_padre), q_hijo)
+
+
+def rotar(q, v):
+    """Rota los vectores v (..., 3) con los cuaterniones q (..., 4)."""
+    v = np.asarray(v, dtype=np.float64)
+    qv = np.concatenate([np.zeros(v.shape[:-1] + (1,)), v], axis=-1)
+    return producto(producto(q, qv), conjugado(q))[..., 1:]
+
+
+def angulo_eje(q, eje):
+    """Ángulo (°) de la rotación q alrededor de `eje` (descomposición swing-twist).
+
+    Es el ángulo de flexión cuando `eje` es el eje de la articulación; no
+    depende del orden de rotaciones, así que no tiene bloqueo de cardán.
+    """
+    q = np.asarray(q, dtype=np.float64)
+    eje = np.asarray(eje, dtype=np.float64)
+    eje = eje / np.linalg.norm(eje)
+    proyeccion = q[..., 1:] @ eje
+    angulo = 2 * np.arctan2(proyeccion, q[..., 0])
+    # Llevar a (-180, 180]
+    return np.degrees((angulo + np.pi) % (2 * np.pi) - np.pi)
+
+
+def a_euler(q):
+    """Roll, pitch y yaw (°, convención ZYX) de los cuaterniones (..., 4)."""
+    q0, q1, q2, q3 = np.moveaxis(np.asarray(q, dtype=np.float64), -1, 0)
+    roll = np.arctan2(2 * (q0 * q1 + q2 * q3), 1 - 2 * (q1 * q1 + q2 * q2))
+    pitch = np.arcsin(np.clip(2 * (q0 * q2 - q3 * q1), -1.0, 1.0))
+    yaw = np.arctan2(2 * (q0 * q3 + q1 * q2), 1 - 2 * (q2 * q2 + q3 * q3))
+    return np.degrees(np.stack([roll, pitch, yaw], axis=-1))
@@ -0,0 +1,236 @@
+# Detección de pasos y eventos de la marcha en línea, muestra a muestra.
+# Usa la velocidad angular de la tibia en el plano sagital (por defecto gz):
+# durante el balanceo medio hay un pico positivo grande; el mínimo que le
+# sigue es el apoyo del talón y el mínimo anterior, el despegue del pie.
+# Cada muestra se procesa en O(1) con memoria constante: un filtro pasa
+# bajas de segundo orden, una máquina de estados con periodo refractario y
+# estadísticas acumuladas (media y varianza de Welford) de los intervalos.
+# Los tiempos son los de cada muestra según el reloj del sensor
+# (Comun/sincronizacion.py), no la hora a la que se procesan; la frecuencia
+# del filtro se ajusta a la que se mide con esos tiempos.
+
+import math
+
+import numpy as np
+
+# Estados de la máquina
+ESPERANDO_BALANCEO = 0
+EN_BALANCEO = 1
+BUSCANDO_TALON = 2
+
+CONFIG_DETECTOR = dict(
+    frecuencia=200.0,        # muestras por segundo esperadas (se corrige con los tiempos medidos)
+    medicion_frecuencia=1.0, # s de muestras tras los que se mide la frecuencia
+    cambio_frecuencia=0.1,   # cambio relativo de la frecuencia medida que recalcula el filtro
+    eje='gz',                # velocidad angular sagital de la tibia
+    signo=1.0,               # -1 si el sensor está montado al revés
+    corte=6.0,               # frecuencia de corte del pasa bajas (Hz)
+    umbral_balanceo=50.0,    # °/s para reconocer el balanceo medio
+    histeresis=15.0,         # °/s de subida tras el mínimo para confirmar el talón
+    ventana_talon=0.4,       # s máximos para buscar el talón tras el balanceo
+    refractario=0.5,         # s mínimos entre dos balanceos
+    pausa=2.5,               # s sin zancadas que interrumpen la marcha
+    umbral_impacto=0.3,      # g sobre 1 g para considerar el impacto del talón
+    suavizado=0.2,           # peso del último intervalo en la cadencia actual
+)
+
+
+def coeficientes_butterworth(corte, frecuencia):
+    """Coeficientes (b0, b1, b2, a1, a2) de un Butterworth pasa bajas de orden 2."""
+    k = math.tan(math.pi * corte / frecuencia)
+    norma = 1 / (1 + math.sqrt(2) * k + k * k)
+    b0 = k * k * norma
+    return b0, 2 * b0, b0, 2 * (k * k - 1) * norma, (1 - math.sqrt(2) * k + k * k) * norma
+
+
+class Acumulado:
+    """Media y varianza en línea (Welford)."""
+
+    __slots__ = ('n', 'media', 'm2')
+
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+
+    def agregar(self, x):
+        self.n += 1
+        d = x - self.media
+        self.media += d / self.n
+        self.m2 += d * (x - self.media)
+
+    @property
+    def desviacion(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    @property
+    def cv(self):
+        """Coeficiente de variación en %."""
+        return 100 * self.desviacion / self.media if self.media else 0.0
+
+
+class DetectorPasos:
+    """Detector de apoyo del talón y despegue para un sensor en la tibia.
+
+    Uso:
+        detector = DetectorPasos(frecuencia=200)
+        eventos = detector.agregar(tiempos, imu)    # tiempos (k,) de RelojSensor, imu DTYPE_IMU
+        detector.metricas()
+
+    `agregar` devuelve los eventos detectados en el bloque, cada uno un dict
+    con "tipo" ("talon" o "despegue"), "t" (s, reloj del sensor). Un sensor ve
+    sólo su pierna: una zancada es de talón a talón y cada apoyo del talón
+    cuenta como dos pasos (el de esta pierna y el de la otra). Después de
+    una reconexión se llama a `reanclar()`, para que el hueco no se mida
+    como una zancada.
+    """
+
+    def __init__(self, **config):
+        self.config = {**CONFIG_DETECTOR, **config}
+        c = self.config
+        self._ajustar_filtro(c['frecuencia'])
+        # Retraso de grupo del filtro, que se descuenta del tiempo de los eventos
+        self.retardo = math.sqrt(2) / (2 * math.pi * c['corte'])
+        self.eje = c['eje']
+        self.signo = c['signo']
+        self.reanclar()
+        # Estadísticas
+        self.talones = 0
+        self.zancadas = 0
+        self.cadencia_actual = 0.0
+        self.zancada = Acumulado()
+        self.apoyo = Acumulado()
+        self.balanceo = Acumulado()
+
+    def reanclar(self):
+        """Olvida el filtro y la zancada en curso (tras perder muestras)."""
+        # Estado del filtro (dos entradas y dos salidas anteriores)
+        self.x1 = self.x2 = self.y1 = self.y2 = None
+        # Máquina de estados; los instantes son tiempos del reloj del sensor
+        self.estado = ESPERANDO_BALANCEO
+        self.min_despegue = math.inf
+        self.t_despegue = None
+        self.max_balanceo = -math.inf
+        self.t_balanceo = None
+        self.ultimo_balanceo = None
+        self.min_talon = math.inf
+        self.t_talon = None
+        self.max_impacto = 0.0
+        self.ultimo_talon = None
+        self.ultimo_despegue = None
+        # Primera muestra y muestras desde entonces, para medir la frecuencia
+        self.t_inicio = None
+        self.muestras = 0
+
+    def _ajustar_filtro(self, frecuencia):
+        self.frecuencia = frecuencia
+        self.coef = coeficientes_butterworth(self.config['corte'], frecuencia)
+
+    def agregar(self, tiempos, imu):
+        """Procesa un bloque de muestras; `tiempos` (k,) es el tiempo de cada una."""
+        eventos = []
+        tiempos = np.asarray(tiempos, dtype=np.float64)
+        if len(tiempos):
+            if self.t_inicio is None:
+                self.t_inicio = float(tiempos[0])
+            self.muestras += len(tiempos)
+            duracion = tiempos[-1] - self.t_inicio
+            if duracion >= self.config['medicion_frecuencia']:
+                frecuencia = (self.muestras - 1) / duracion
+                if abs(frecuencia - self.frecuencia) > self.config['cambio_frecuencia'] * self.frecuencia:
+                    self._ajustar_filtro(frecuencia)
+        giro = (imu[self.eje] * self.signo).tolist()
+        aceleracion = ((imu['ax'] ** 2 + imu['ay'] ** 2 + imu['az'] ** 2) ** 0.5).tolist()
+        for t, g, a in zip(tiempos.tolist(), giro, aceleracion):
+            self._muestra(t, g, a, eventos)
+        return eventos
+
+    def _filtrar(self, x):
+        if self.x1 is None:
+            self.x1 = self.x2 = self.y1 = self.y2 = x
+        b0, b1, b2, a1, a2 = self.coef
+        y = b0 * x + b1 * self.x1 + b2 * self.x2 - a1 * self.y1 - a2 * self.y2
+        self.x2, self.x1 = self.x1, x
+        self.y2, self.y1 = self.y1, y
+        return y
+
+    def _muestra(self, t, g, a, eventos):
+        c = self.config
+        g = self._filtrar(g)
+
+        if self.estado == ESPERANDO_BALANCEO:
+            # El mínimo antes del balanceo es el despegue
+            if g < self.min_despegue:
+                self.min_despegue = g
+                self.t_despegue = t
+            refractario = (self.ultimo_balanceo is not None and
+                           t - self.ultimo_balanceo < c['refractario'])
+            if g > c['umbral_balanceo'] and not refractario:
+                self.estado = EN_BALANCEO
+                self.max_balanceo = g
+                self.t_balanceo = t
+
+        elif self.estado == EN_BALANCEO:
+            if g > self.max_balanceo:
+                self.max_balanceo = g
+                self.t_balanceo = t
+            elif g < c['umbral_balanceo']:
+                self.ultimo_balanceo = self.t_balanceo
+                if self.t_despegue is not None and self.min_despegue < 0:
+                    self._despegue(self.t_despegue, eventos)
+                self.estado = BUSCANDO_TALON
+                self.min_talon = g
+                self.t_talon = t
+                self.max_impacto = 0.0
+
+        else:  # BUSCANDO_TALON
+            self.max_impacto = max(self.max_impacto, a - 1.0)
+            if g < self.min_talon:
+                self.min_talon = g
+                self.t_talon = t
+            confirmado = self.min_talon < 0 and g > self.min_talon + c['histeresis']
+            vencido = t - self.ultimo_balanceo > c['ventana_talon']
+            if confirmado or vencido:
+                if self.min_talon < 0:
+                    self._talon(self.t_talon, eventos)
+                self.estado = ESPERANDO_BALANCEO
+                self.min_despegue = math.inf
+                self.t_despegue = None
+
+    def _talon(self, t, eventos):
+        c = self.config
+        if self.ultimo_talon is not None:
+            duracion = t - self.ultimo_talon
+            # Tras una pausa no se cuenta el intervalo como zancada
+            if duracion <= c['pausa']:
+                self.zancadas += 1
+                self.zancada.agregar(duracion)
+                cadencia = 120.0 / duracion
+                if self.cadencia_actual:
+                    self.cadencia_actual += c['suavizado'] * (cadencia - self.cadencia_actual)
+                else:
+                    self.cadencia_actual = cadencia
+                if self.ultimo_despegue is not None and self.ultimo_despegue > self.ultimo_talon:
+                    self.apoyo.agregar(self.ultimo_despegue - self.ultimo_talon)
+                    self.balanceo.agregar(t - self.ultimo_despegue)
+        self.ultimo_talon = t
+        self.talones += 1
+        eventos.append({"tipo": "talon", "t": t - self.retardo,
+                        "impacto": self.max_impacto > c['umbral_impacto']})
+
+    def _despegue(self, t, eventos):
+        self.ultimo_despegue = t
+        eventos.append({"tipo": "despegue", "t": t - self.retardo})
+
+    def metricas(self):
+        """Métricas acumuladas; los tiempos en segundos y la cadencia en pasos/min."""
+        return {
+            "zancadas": self.zancadas,
+            "pasos": 2 * self.talones,
+            "cadencia": 120.0 / self.zancada.media if self.zancada.n else 0.0,
+            "cadencia_actual": self.cadencia_actual,
+            "tiempo_zancada": self.zancada.media,
+            "variabilidad_zancada": self.zancada.cv,
+            "tiempo_apoyo": self.apoyo.media,
+            "tiempo_balanceo": self.balanceo.media,
+        }
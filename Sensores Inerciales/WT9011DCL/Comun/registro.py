@@ -0,0 +1,116 @@
+# Registro binario de las notificaciones BLE crudas de un sensor.
+# Formato del archivo:
+#   cabecera: MAGIA (8 bytes) + tiempo epoch y tiempo monotónico al abrir (2 x float64)
+#   registros: tiempo monotónico de recepción (float64) + longitud (uint16) + bytes
+# Todos los enteros y flotantes son little-endian. Se guardan las notificaciones
+# tal como llegaron, así la reproducción pasa por el mismo decodificador.
+
+import os
+import queue
+import struct
+import threading
+import time
+
+MAGIA = b"NEMIIMU\x01"
+CABECERA = struct.Struct("<dd")
+REGISTRO = struct.Struct("<dH")
+
+# Bytes acumulados antes de escribir al archivo
+TAMANO_BLOQUE = 64 * 1024
+
+
+class GrabadorRegistro:
+    """Escribe las notificaciones de un sensor en un hilo aparte.
+
+    `agregar` sólo encola los bytes, por lo que se puede llamar desde el
+    callback de BLE sin esperar al disco.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        self.archivo = open(ruta, "wb")
+        self.archivo.write(MAGIA + CABECERA.pack(time.time(), time.monotonic()))
+        self.cola = queue.SimpleQueue()
+        self.registros = 0
+        self.error = None
+        self.hilo = threading.Thread(target=self._escribir, daemon=True)
+        self.hilo.start()
+
+    def agregar(self, data, t=None):
+        """Encola una notificación con su tiempo de recepción (monotónico)."""
+        self.cola.put((time.monotonic() if t is None else t, bytes(data)))
+
+    def cerrar(self):
+        """Escribe lo pendiente y cierra el archivo."""
+        if self.hilo.is_alive():
+            self.cola.put(None)
+            self.hilo.join()
+        if self.error is not None:
+            raise self.error
+
+    def _escribir(self):
+        bloque = bytearray()
+        try:
+            while True:
+                elemento = self.cola.get()
+                # Tomar todo lo que ya esté en la cola antes de escribir
+                while elemento is not None:
+                    t, data = elemento
+                    bloque += REGISTRO.pack(t, len(data))
+                    bloque += data
+                    self.registros += 1
+                    if len(bloque) >= TAMANO_BLOQUE:
+                        self.archivo.write(bloque)
+                        bloque.clear()
+                    try:
+                        elemento = self.cola.get_nowait()
+                    except queue.Empty:
+                        break
+                if bloque:
+                    self.archivo.write(bloque)
+                    bloque.clear()
+                if elemento is None:
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            self.archivo.close()
+
+
+def leer_registro(ruta):
+    """Itera sobre (tiempo epoch, bytes) de cada notificación del registro."""
+    with open(ruta, "rb") as f:
+        if f.read(len(MAGIA)) != MAGIA:
+            raise ValueError(f"{ruta} no es un registro de sensor")
+        epoch, monotonico = CABECERA.unpack(f.read(CABECERA.size))
+        while True:
+            cabecera = f.read(REGISTRO.size)
+            if len(cabecera) < REGISTRO.size:
+                return
+            t, longitud = REGISTRO.unpack(cabecera)
+            data = f.read(longitud)
+            if len(data) < longitud:
+                return
+            yield epoch + (t - monotonico), data
+
+
+def reproducir(ruta, callback, velocidad=None):
+    """Entrega las notificaciones del registro a `callback(data, t)`.
+
+    Con `velocidad` (1.0 = tiempo real, 2.0 = el doble de rápido, ...) se
+    respetan los intervalos originales; con None se entregan lo más rápido
+    posible. Devuelve el número de notificaciones reproducidas.
+    """
+    n = 0
+    inicio = None
+    for t, data in leer_registro(ruta):
+        if velocidad:
+            if inicio is None:
+                inicio = (t, time.monotonic())
+            espera = (t - inicio[0]) / velocidad - (time.monotonic() - inicio[1])
+            if espera > 0:
+                time.sleep(espera)
+        callback(data, t)
+        n += 1
+    return n
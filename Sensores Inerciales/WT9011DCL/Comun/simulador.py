@@ -0,0 +1,227 @@
+# Sensor WT9011DCL simulado para probar la captura sin hardware.
+# `ClienteSimulado` implementa la parte de la interfaz de `BleakClient` que
+# usan los scripts (conexión, servicios, notificaciones y escritura de
+# comandos) y entrega paquetes 0x61/0x71 con una marcha sintética, con el
+# retraso variable de los intervalos de conexión BLE y notificaciones
+# fragmentadas de vez en cuando.
+
+import asyncio
+import time
+
+import numpy as np
+
+from Comun.decodificador import (CABECERA, TIPO_IMU, TIPO_MAG, TAMANO_PAQUETE,
+                                 ESCALAS_IMU, DTYPE_PAQUETE)
+
+UUID_SERVICIO = "0000ffe5-0000-1000-8000-00805f9a34fb"
+UUID_LECTURA = "0000ffe4-0000-1000-8000-00805f9a34fb"
+UUID_ESCRITURA = "0000ffe9-0000-1000-8000-00805f9a34fb"
+
+# Prefijo de los comandos del fabricante (0xFF 0xAA registro valor...)
+PREFIJO_COMANDO = b"\xff\xaa"
+REGISTRO_CALIBRACION = 0x01
+CALIBRAR_ACELEROMETRO = 0x01
+
+CONFIG_SIMULADOR = dict(
+    frecuencia=200.0,        # muestras 0x61 por segundo
+    frecuencia_mag=10.0,     # paquetes 0x71 por segundo
+    cadencia=110.0,          # pasos por minuto de la marcha sintética
+    intervalo=0.0075,        # intervalo de conexión BLE (s)
+    jitter=0.005,            # retraso extra aleatorio por intervalo (s)
+    fragmentacion=0.02,      # probabilidad de partir un paquete en dos notificaciones
+    retardo_conexion=0.05,   # tiempo de conexión simulado (s)
+    desconexion=0.0,         # s medios entre caídas del enlace (0 = nunca se cae)
+    semilla=None,
+)
+
+# Fases del ciclo de marcha sintético (rad): apoyo del talón, despegue y balanceo medio
+FASE_TALON = 0.2
+FASE_DESPEGUE = 0.6 * 2 * np.pi
+FASE_BALANCEO = 0.8 * 2 * np.pi
+
+
+def _campana(fase, centro, ancho):
+    """Campana gaussiana periódica en la fase del ciclo."""
+    d = np.mod(fase - centro + np.pi, 2 * np.pi) - np.pi
+    return np.exp(-0.5 * (d / ancho) ** 2)
+
+
+class SensorSimulado:
+    """Genera los paquetes de un sensor colocado en la pierna durante la marcha."""
+
+    def __init__(self, frecuencia=200.0, frecuencia_mag=10.0, cadencia=110.0,
+                 fragmentacion=0.02, semilla=None, **_):
+        self.frecuencia = frecuencia
+        self.cada_mag = max(1, int(round(frecuencia / frecuencia_mag))) if frecuencia_mag else 0
+        # Un ciclo de marcha (zancada) son dos pasos
+        self.frecuencia_zancada = cadencia / 120.0
+        self.fragmentacion = fragmentacion
+        self.rng = np.random.default_rng(semilla)
+        self.n = 0
+        self.sesgo = self.rng.normal(0, 0.05, 3)   # sesgo del acelerómetro (g)
+        self.campo = self.rng.integers(-3000, 3000, 3)
+        self.comandos = []
+
+    def comando(self, data):
+        """Recibe un comando 0xFF 0xAA; la calibración del acelerómetro quita el sesgo."""
+        data = bytes(data)
+        if len(data) < 4 or not data.startswith(PREFIJO_COMANDO):
+            raise ValueError(f"Comando no válido: {data.hex()}")
+        registro, valor = data[2], data[3]
+        self.comandos.append((registro, valor))
+        if registro == REGISTRO_CALIBRACION and valor == CALIBRAR_ACELEROMETRO:
+            self.sesgo[:] = 0
+
+    def valores(self, k):
+        """Valores físicos (k, 9) de las siguientes k muestras."""
+        t = (self.n + np.arange(k)) / self.frecuencia
+        w = 2 * np.pi * self.frecuencia_zancada
+        fase = w * t
+        ruido = self.rng.normal(0, 1, (k, 9))
+
+        salida = np.empty((k, 9))
+        # Aceleración (g): gravedad, oscilación de la marcha e impacto del talón
+        impacto = _campana(fase, FASE_TALON, 0.07)
+        salida[:, 0] = 0.3 * np.sin(fase) + self.sesgo[0] + 0.02 * ruido[:, 0]
+        salida[:, 1] = 0.1 * np.sin(2 * fase) + self.sesgo[1] + 0.02 * ruido[:, 1]
+        salida[:, 2] = 1.0 + 0.2 * np.cos(2 * fase) + 1.5 * impacto + self.sesgo[2] + 0.02 * ruido[:, 2]
+        # Velocidad angular (°/s)
+        salida[:, 3] = 5 * w * np.cos(fase) + ruido[:, 3]
+        salida[:, 4] = 3 * w * np.cos(2 * fase) + ruido[:, 4]
+        # Sobre z, patrón de la tibia: pico en el balanceo medio y dos mínimos,
+        # en el despegue (60 % del ciclo) y en el apoyo del talón (inicio del ciclo)
+        salida[:, 5] = (250 * _campana(fase, FASE_BALANCEO, 0.35)
+                        - 100 * _campana(fase, FASE_DESPEGUE, 0.15)
+                        - 80 * _campana(fase, FASE_TALON, 0.12)
+                        + 2 * ruido[:, 5])
+        # Ángulos (°): balanceo de la pierna sobre z, pequeño sobre x e y
+        salida[:, 6] = 5 * np.sin(fase) + 0.1 * ruido[:, 6]
+        salida[:, 7] = 1.5 * np.sin(2 * fase) + 0.1 * ruido[:, 7]
+        salida[:, 8] = 30 * np.sin(fase) + 0.2 * ruido[:, 8]
+        return salida
+
+    def paquetes(self, k):
+        """Bytes de los paquetes de las siguientes k muestras (con los 0x71 intercalados)."""
+        crudos = np.round(self.valores(k) / ESCALAS_IMU * 32768)
+        crudos = np.clip(crudos, -32768, 32767).astype('<i2')
+
+        indices = self.n + np.arange(k)
+        mag = indices[indices % self.cada_mag == 0] if self.cada_mag else indices[:0]
+        paquetes = np.zeros(k + len(mag), dtype=DTYPE_PAQUETE)
+        paquetes['cabecera'] = CABECERA
+        # Cada 0x71 va justo después del 0x61 de la misma muestra
+        posiciones_mag = np.searchsorted(indices, mag) + np.arange(1, len(mag) + 1)
+        es_mag = np.zeros(len(paquetes), dtype=bool)
+        es_mag[posiciones_mag] = True
+        paquetes['tipo'] = np.where(es_mag, TIPO_MAG, TIPO_IMU)
+        paquetes['valores'][~es_mag] = crudos
+        campo = self.campo + self.rng.integers(-20, 21, (len(mag), 3))
+        paquetes['valores'][es_mag, :3] = campo
+
+        self.n += k
+        return paquetes.tobytes()
+
+    def notificaciones(self, k):
+        """Divide los paquetes de k muestras en notificaciones, como las entrega BLE."""
+        datos = self.paquetes(k)
+        cortes = list(range(TAMANO_PAQUETE, len(datos), TAMANO_PAQUETE))
+        # Algunos paquetes llegan partidos en dos notificaciones
+        partidos = self.rng.random(len(datos) // TAMANO_PAQUETE) < self.fragmentacion
+        for i in np.flatnonzero(partidos):
+            cortes.append(int(i) * TAMANO_PAQUETE + int(self.rng.integers(1, TAMANO_PAQUETE)))
+        cortes.sort()
+        inicio = 0
+        for corte in cortes + [len(datos)]:
+            yield bytearray(datos[inicio:corte])
+            inicio = corte
+
+
+class CaracteristicaSimulada:
+    def __init__(self, uuid):
+        self.uuid = uuid
+
+
+class ServicioSimulado:
+    def __init__(self):
+        self.uuid = UUID_SERVICIO
+        self.characteristics = [CaracteristicaSimulada(UUID_LECTURA),
+                                CaracteristicaSimulada(UUID_ESCRITURA)]
+
+
+class ClienteSimulado:
+    """Sustituto de `BleakClient` conectado a un `SensorSimulado`."""
+
+    def __init__(self, address, disconnected_callback=None, **config):
+        self.address = address
+        self.disconnected_callback = disconnected_callback
+        self.config = {**CONFIG_SIMULADOR, **config}
+        self.sensor = SensorSimulado(**self.config)
+        self.services = [ServicioSimulado()]
+        self.is_connected = False
+        # Momento (time.monotonic) en que debía generarse la última muestra entregada
+        self.programado = None
+        self._tarea = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.disconnect()
+
+    async def connect(self):
+        await asyncio.sleep(self.config["retardo_conexion"])
+        self.is_connected = True
+        return True
+
+    async def disconnect(self):
+        await self._detener()
+        self.is_connected = False
+        return True
+
+    async def get_services(self):
+        return self.services
+
+    async def write_gatt_char(self, caracteristica, data, response=None):
+        if not self.is_connected:
+            raise ConnectionError(f"{self.address} no está conectado")
+        self.sensor.comando(data)
+
+    async def start_notify(self, caracteristica, callback):
+        await self._detener()
+        self._tarea = asyncio.create_task(self._emitir(caracteristica, callback))
+
+    async def stop_notify(self, caracteristica):
+        await self._detener()
+
+    async def _detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+    async def _emitir(self, caracteristica, callback):
+        intervalo = self.config["intervalo"]
+        jitter = self.config["jitter"]
+        desconexion = self.config["desconexion"]
+        frecuencia = self.sensor.frecuencia
+        rng = self.sensor.rng
+        inicio = time.monotonic() - self.sensor.n / frecuencia
+        while True:
+            await asyncio.sleep(intervalo + rng.uniform(0, jitter))
+            if desconexion and rng.random() < intervalo / desconexion:
+                # Caída del enlace, como la avisa bleak
+                self.is_connected = False
+                if self.disconnected_callback is not None:
+                    self.disconnected_callback(self)
+                return
+            # Muestras que el sensor ya habría generado hasta ahora
+            debidas = int((time.monotonic() - inicio) * frecuencia) - self.sensor.n
+            if debidas <= 0:
+                continue
+            self.programado = inicio + (self.sensor.n + debidas - 1) / frecuencia
+            for data in self.sensor.notificaciones(debidas):
+                callback(caracteristica, data)
@@ -0,0 +1,212 @@
+# Base de tiempo común para varios sensores y ángulos articulares.
+# Cada sensor muestrea con su propio reloj y las notificaciones BLE llegan
+# en lotes con retraso variable, así que la hora de llegada no sirve como
+# tiempo de cada muestra. `RelojSensor` estima, a partir del número de
+# muestra y la hora de llegada de cada notificación, el desfase y la deriva
+# del reloj del sensor; `Sincronizador` reúne los flujos de varios sensores
+# en una rejilla uniforme con una latencia acotada y `AngulosArticulares`
+# calcula la flexión de cadera, rodilla y tobillo a partir de las
+# orientaciones (Comun/orientacion.py) de segmentos consecutivos.
+
+import numpy as np
+
+from Comun.orientacion import angulo_eje, relativo
+
+CONFIG_RELOJ = dict(
+    frecuencia=200.0,     # frecuencia nominal del sensor (muestras/s)
+    ventana=256,          # notificaciones usadas para la envolvente inferior del retraso
+    olvido=0.999,         # factor de olvido de la regresión de la deriva (por notificación)
+    muestras_deriva=100,  # muestras tras las que se estima la deriva aunque la ventana no esté llena
+)
+
+CONFIG_SINCRONIZADOR = dict(
+    frecuencia=200.0,     # frecuencia de la rejilla común
+    latencia=0.1,         # s máximos que se espera a un sensor retrasado
+)
+
+# Articulación: (segmento proximal, segmento distal)
+ARTICULACIONES = {
+    "cadera": ("pelvis", "muslo"),
+    "rodilla": ("muslo", "tibia"),
+    "tobillo": ("tibia", "pie"),
+}
+
+CONFIG_ANGULOS = dict(
+    eje=(0.0, 0.0, 1.0),       # eje de flexión en el marco del sensor proximal
+    muestras_referencia=200,   # muestras de postura neutra (de pie) al empezar
+)
+
+
+class RelojSensor:
+    """Convierte números de muestra en tiempos del reloj del equipo.
+
+    El tiempo de llegada de la última muestra de cada notificación es
+    t = t_ref + n · periodo + desfase + retraso, con retraso ≥ 0. La deriva
+    (diferencia entre el periodo real y el nominal) se estima por mínimos
+    cuadrados con olvido exponencial y el desfase con la envolvente
+    inferior de los residuos de las últimas notificaciones, que corresponde
+    a las que llegaron con menos retraso.
+    """
+
+    def __init__(self, **config):
+        self.config = {**CONFIG_RELOJ, **config}
+        self.periodo_nominal = 1.0 / self.config['frecuencia']
+        self.n = 0
+        self.t_ref = None
+        self.ultimo = None
+        # Sumas ponderadas de la regresión y = deriva · x + b
+        self.sw = self.sx = self.sy = self.sxx = self.sxy = 0.0
+        self.deriva = 0.0
+        self.desfase = 0.0
+        ventana = self.config['ventana']
+        self.xs = np.zeros(ventana)
+        self.ys = np.zeros(ventana)
+        self.usadas = 0
+
+    @property
+    def periodo(self):
+        return self.periodo_nominal + self.deriva
+
+    def agregar(self, t_llegada, k):
+        """Registra una notificación con k muestras y devuelve sus tiempos (k,)."""
+        if k == 0:
+            return np.empty(0)
+        if self.t_ref is None:
+            self.t_ref = t_llegada - (k - 1) * self.periodo_nominal
+        x = float(self.n + k - 1)
+        y = t_llegada - self.t_ref - x * self.periodo_nominal
+
+        olvido = self.config['olvido']
+        self.sw = olvido * self.sw + 1.0
+        self.sx = olvido * self.sx + x
+        self.sy = olvido * self.sy + y
+        self.sxx = olvido * self.sxx + x * x
+        self.sxy = olvido * self.sxy + x * y
+        varianza = self.sw * self.sxx - self.sx * self.sx
+        # Con pocas muestras la deriva sólo se estima si la frecuencia real es
+        # otra (el sensor no siempre está configurado a la nominal)
+        if varianza > 0 and (self.usadas >= len(self.xs) or x >= self.config['muestras_deriva']):
+            self.deriva = (self.sw * self.sxy - self.sx * self.sy) / varianza
+
+        i = self.usadas % len(self.xs)
+        self.xs[i], self.ys[i] = x, y
+        self.usadas += 1
+        m = min(self.usadas, len(self.xs))
+        self.desfase = float(np.min(self.ys[:m] - self.deriva * self.xs[:m]))
+
+        n = self.n + np.arange(k)
+        tiempos = self.t_ref + n * self.periodo + self.desfase
+        # Un cambio de desfase no puede hacer retroceder el tiempo
+        if self.ultimo is not None and tiempos[0] <= self.ultimo:
+            tiempos += self.ultimo + 0.5 * self.periodo - tiempos[0]
+        self.ultimo = float(tiempos[-1])
+        self.n += k
+        return tiempos
+
+
+class Sincronizador:
+    """Reúne las muestras de varios sensores en una rejilla de tiempo común.
+
+    Uso:
+        sincronizador = Sincronizador(["muslo", "tibia"], frecuencia=100)
+        sincronizador.agregar("muslo", tiempos, valores)   # valores (k, c)
+        tiempos, valores = sincronizador.extraer(ahora)     # valores[nombre] (m, c)
+
+    `extraer` interpola linealmente cada sensor en los puntos de la rejilla
+    para los que ya llegaron datos de todos. Si un sensor se retrasa más de
+    `latencia` segundos, la rejilla avanza igual y se repite su último valor,
+    para que la latencia de la salida quede acotada.
+    """
+
+    def __init__(self, nombres, **config):
+        self.config = {**CONFIG_SINCRONIZADOR, **config}
+        self.periodo = 1.0 / self.config['frecuencia']
+        self.nombres = list(nombres)
+        self.tiempos = {nombre: np.empty(0) for nombre in self.nombres}
+        self.valores = {nombre: None for nombre in self.nombres}
+        self.siguiente = None
+        self.retrasados = {nombre: 0 for nombre in self.nombres}
+
+    def agregar(self, nombre, tiempos, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        if len(tiempos) == 0:
+            return
+        if valores.ndim == 1:
+            valores = valores[:, None]
+        self.tiempos[nombre] = np.concatenate([self.tiempos[nombre], tiempos])
+        anteriores = self.valores[nombre]
+        self.valores[nombre] = valores if anteriores is None else np.concatenate([anteriores, valores])
+
+    def extraer(self, ahora):
+        """Devuelve (tiempos (m,), {nombre: valores (m, c)}) hasta `ahora - latencia`."""
+        vacio = np.empty(0), {}
+        if any(len(t) == 0 for t in self.tiempos.values()):
+            return vacio
+        primeros = [t[0] for t in self.tiempos.values()]
+        ultimos = [t[-1] for t in self.tiempos.values()]
+        if self.siguiente is None:
+            self.siguiente = np.ceil(max(primeros) / self.periodo) * self.periodo
+        limite = min(max(ultimos), max(min(ultimos), ahora - self.config['latencia']))
+        m = int(np.floor((limite - self.siguiente) / self.periodo)) + 1
+        if m <= 0:
+            return vacio
+
+        rejilla = self.siguiente + np.arange(m) * self.periodo
+        salida = {}
+        for nombre in self.nombres:
+            t, v = self.tiempos[nombre], self.valores[nombre]
+            if t[-1] < rejilla[-1]:
+                self.retrasados[nombre] += int(np.count_nonzero(rejilla > t[-1]))
+            salida[nombre] = np.stack([np.interp(rejilla, t, v[:, c]) for c in range(v.shape[1])], axis=1)
+            # Se conserva la última muestra anterior a la rejilla para interpolar la siguiente
+            corte = max(int(np.searchsorted(t, rejilla[-1], side='right')) - 1, 0)
+            self.tiempos[nombre], self.valores[nombre] = t[corte:], v[corte:]
+        self.siguiente = rejilla[-1] + self.periodo
+        return rejilla, salida
+
+
+class AngulosArticulares:
+    """Flexión de las articulaciones entre los segmentos disponibles.
+
+    Recibe las orientaciones sincronizadas de cada segmento y devuelve el
+    ángulo de cada articulación alrededor de `eje`, medido desde la postura
+    de las primeras `muestras_referencia` muestras (el paciente de pie), lo
+    que descuenta cómo quedó montado cada sensor.
+    """
+
+    def __init__(self, segmentos, **config):
+        self.config = {**CONFIG_ANGULOS, **config}
+        self.articulaciones = {nombre: par for nombre, par in ARTICULACIONES.items()
+                               if par[0] in segmentos and par[1] in segmentos}
+        self.suma_referencia = {nombre: np.zeros(4) for nombre in self.articulaciones}
+        self.muestras_referencia = 0
+        self.minimo = {nombre: np.inf for nombre in self.articulaciones}
+        self.maximo = {nombre: -np.inf for nombre in self.articulaciones}
+
+    def agregar(self, cuaterniones):
+        """`cuaterniones[segmento]` (m, 4) → {articulación: ángulos (m,) en grados}."""
+        angulos = {}
+        faltan = self.config['muestras_referencia'] - self.muestras_referencia
+        for nombre, (proximal, distal) in self.articulaciones.items():
+            q = relativo(cuaterniones[proximal], cuaterniones[distal])
+            q /= np.linalg.norm(q, axis=1, keepdims=True)
+            if faltan > 0:
+                # Media de los cuaterniones de la postura neutra (mismo hemisferio)
+                inicial = q[:faltan]
+                signo = np.where(inicial @ (self.suma_referencia[nombre] + inicial[0]) < 0, -1.0, 1.0)
+                self.suma_referencia[nombre] += (inicial * signo[:, None]).sum(axis=0)
+            referencia = self.suma_referencia[nombre] / np.linalg.norm(self.suma_referencia[nombre])
+            angulos[nombre] = angulo_eje(relativo(referencia, q), self.config['eje'])
+            if len(q):
+                self.minimo[nombre] = min(self.minimo[nombre], float(angulos[nombre].min()))
+                self.maximo[nombre] = max(self.maximo[nombre], float(angulos[nombre].max()))
+        if self.articulaciones and faltan > 0:
+            self.muestras_referencia += min(faltan, len(next(iter(cuaterniones.values()))))
+        return angulos
+
+    def rango(self):
+        """Rango de movimiento (°) de cada articulación desde el inicio."""
+        return {nombre: {"minimo": round(self.minimo[nombre], 2),
+                         "maximo": round(self.maximo[nombre], 2),
+                         "rango": round(self.maximo[nombre] - self.minimo[nombre], 2)}
+                for nombre in self.articulaciones if np.isfinite(self.minimo[nombre])}
@@ -0,0 +1,36 @@
+# Selección del transporte BLE de un sensor.
+# Las direcciones que empiezan con "sim:" se conectan a un sensor simulado
+# (Comun/simulador.py); el resto a un sensor real con bleak. La dirección
+# simulada acepta parámetros del simulador, por ejemplo:
+#   sim:cadera
+#   sim:rodilla?frecuencia=100&jitter=0.01&semilla=3
+
+from urllib.parse import parse_qsl
+
+from bleak import BleakClient
+
+from Comun.simulador import ClienteSimulado, CONFIG_SIMULADOR
+
+PREFIJO_SIMULADO = "sim:"
+
+
+def es_simulado(direccion):
+    return isinstance(direccion, str) and direccion.startswith(PREFIJO_SIMULADO)
+
+
+def config_simulada(direccion):
+    """Parámetros del simulador incluidos en la dirección."""
+    _, _, consulta = direccion.partition("?")
+    config = {}
+    for clave, valor in parse_qsl(consulta):
+        if clave not in CONFIG_SIMULADOR:
+            raise ValueError(f"Parámetro de simulador desconocido: {clave}")
+        config[clave] = int(valor) if clave == "semilla" else float(valor)
+    return config
+
+
+def crear_cliente(direccion, **kwargs):
+    """Cliente BLE para la dirección: `BleakClient` o `ClienteSimulado`."""
+    if es_simulado(direccion):
+        return ClienteSimulado(direccion, **kwargs, **config_simulada(direccion))
+    return BleakClient(direccion, **kwargs)
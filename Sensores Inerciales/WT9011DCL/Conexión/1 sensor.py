@@ -1,8 +1,16 @@
 import asyncio
+import os
+import sys
 import time
-from bleak import BleakClient
+
+current_dir = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..')))
+
+from Comun.decodificador import Decodificador
+from Comun.transporte import crear_cliente
 
 # Dirección MAC del sensor (edítala por la de tu dispositivo)
+# Una dirección "sim:nombre" usa un sensor simulado (Comun/simulador.py)
 SENSOR_MAC = "dd:70:a7:9c:c7:0f"
 
 # UUIDs de comunicación
@@ -10,42 +18,24 @@ SERVICE_UUID = "0000ffe5-0000-1000-8000-00805f9a34fb"
 READ_CHARACTERISTIC_UUID = "0000ffe4-0000-1000-8000-00805f9a34fb"
 
 
-def get_signed_int16(value):
-    """Convierte un entero de 16 bits en número con signo"""
-    if value >= 0x8000:
-        value -= 0x10000
-    return value
+decodificador = Decodificador()
 
 
 def on_data_received(sender, data: bytearray):
     """Callback cuando llegan datos del sensor"""
-    if len(data) < 20:
-        return
-
-    # Tipo de paquete (0x61: acel/gyro/ángulo, 0x71: magnetómetro)
-    packet_type = data[1]
-
-    if packet_type == 0x61:  # Acelerómetro + Giroscopio
-        ax = get_signed_int16(data[3] << 8 | data[2]) / 32768 * 16
-        ay = get_signed_int16(data[5] << 8 | data[4]) / 32768 * 16
-        az = get_signed_int16(data[7] << 8 | data[6]) / 32768 * 16
-        gx = get_signed_int16(data[9] << 8 | data[8]) / 32768 * 2000
-        gy = get_signed_int16(data[11] << 8 | data[10]) / 32768 * 2000
-        gz = get_signed_int16(data[13] << 8 | data[12]) / 32768 * 2000
+    # Paquetes 0x61 (acel/gyro/ángulo) y 0x71 (magnetómetro) completos
+    imu, mag = decodificador.agregar(data)
 
+    for ax, ay, az, gx, gy, gz, *_ in imu.tolist():  # Acelerómetro + Giroscopio
         print(f"[ACEL/GYRO] Ax={ax:.3f}, Ay={ay:.3f}, Az={az:.3f}, "
               f"Gx={gx:.3f}, Gy={gy:.3f}, Gz={gz:.3f}")
 
-    elif packet_type == 0x71:  # Magnetómetro
-        mx = get_signed_int16(data[3] << 8 | data[2])
-        my = get_signed_int16(data[5] << 8 | data[4])
-        mz = get_signed_int16(data[7] << 8 | data[6])
-
+    for mx, my, mz in mag.tolist():  # Magnetómetro
         print(f"[MAG] Mx={mx}, My={my}, Mz={mz}")
 
 
 async def main():
-    async with BleakClient(SENSOR_MAC) as client:
+    async with crear_cliente(SENSOR_MAC) as client:
         print("Conectado al sensor WT901BLE")
 
         # Iniciar notificaciones
@@ -1,61 +1,94 @@
 import asyncio
-from bleak import BleakClient
+import os
+import sys
+import time
 
-# Lista con las MAC de tus 3 sensores
+current_dir = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..')))
+
+from Comun.decodificador import Decodificador
+from Comun.orientacion import FiltroOrientacion, a_euler
+from Comun.sincronizacion import RelojSensor, Sincronizador, AngulosArticulares
+from Comun.conexiones import GestorConexiones
+
+# Lista con las MAC de tus 3 sensores y el segmento en que va cada uno
+# Una dirección "sim:nombre" usa un sensor simulado (Comun/simulador.py)
+# Con un cuarto sensor en el "pie" se calcula también el tobillo
 SENSORS = [
-    {"mac": "dd:70:a7:9c:c7:0f", "name": "Sensor 1"},
-    {"mac": "dd:70:a7:9c:c7:10", "name": "Sensor 2"},
-    {"mac": "dd:70:a7:9c:c7:11", "name": "Sensor 3"},
+    {"mac": "dd:70:a7:9c:c7:0f", "name": "Sensor 1", "segmento": "pelvis"},
+    {"mac": "dd:70:a7:9c:c7:10", "name": "Sensor 2", "segmento": "muslo"},
+    {"mac": "dd:70:a7:9c:c7:11", "name": "Sensor 3", "segmento": "tibia"},
 ]
 
-# UUID de característica de lectura
-READ_CHARACTERISTIC_UUID = "0000ffe4-0000-1000-8000-00805f9a34fb"
-
+# Imprimir cada muestra (False para ver sólo los ángulos articulares)
+MOSTRAR_MUESTRAS = True
 
-def get_signed_int16(value):
-    if value >= 0x8000:
-        value -= 0x10000
-    return value
+# Segundos entre cada impresión de los ángulos articulares
+INTERVALO_ANGULOS = 0.5
 
+def make_callback(sensor_name, segmento, sincronizador):
+    # Un decodificador por sensor: cada uno tiene su propio flujo de bytes
+    decodificador = Decodificador()
+    # Y un filtro de orientación (acelerómetro + giroscopio + magnetómetro)
+    orientacion = FiltroOrientacion()
+    # Y un reloj para poner todas las muestras en la misma base de tiempo
+    reloj = RelojSensor()
 
-def make_callback(sensor_name):
     def on_data_received(sender, data: bytearray):
-        if len(data) < 20:
+        llegada = time.monotonic()
+        imu, mag = decodificador.agregar(data)
+        tiempos = reloj.agregar(llegada, len(imu))
+        cuaterniones = orientacion.actualizar(imu, mag, tiempos)
+        sincronizador.agregar(segmento, tiempos, cuaterniones)
+
+        if not MOSTRAR_MUESTRAS:
             return
-        packet_type = data[1]
-
-        if packet_type == 0x61:  # Acelerómetro + Giroscopio
-            ax = get_signed_int16(data[3] << 8 | data[2]) / 32768 * 16
-            ay = get_signed_int16(data[5] << 8 | data[4]) / 32768 * 16
-            az = get_signed_int16(data[7] << 8 | data[6]) / 32768 * 16
-            gx = get_signed_int16(data[9] << 8 | data[8]) / 32768 * 2000
-            gy = get_signed_int16(data[11] << 8 | data[10]) / 32768 * 2000
-            gz = get_signed_int16(data[13] << 8 | data[12]) / 32768 * 2000
+
+        for (ax, ay, az, gx, gy, gz, *_), (roll, pitch, yaw) in zip(imu.tolist(), a_euler(cuaterniones).tolist()):
             print(f"[{sensor_name}] ACEL/GYRO -> "
                 f"Ax={ax:.3f}, Ay={ay:.3f}, Az={az:.3f}, "
-                f"Gx={gx:.3f}, Gy={gy:.3f}, Gz={gz:.3f}")
+                f"Gx={gx:.3f}, Gy={gy:.3f}, Gz={gz:.3f} | "
+                f"Roll={roll:.1f}, Pitch={pitch:.1f}, Yaw={yaw:.1f}")
 
-        elif packet_type == 0x71:  # Magnetómetro
-            mx = get_signed_int16(data[3] << 8 | data[2])
-            my = get_signed_int16(data[5] << 8 | data[4])
-            mz = get_signed_int16(data[7] << 8 | data[6])
+        for mx, my, mz in mag.tolist():  # Magnetómetro
             print(f"[{sensor_name}] MAG -> Mx={mx}, My={my}, Mz={mz}")
     return on_data_received
 
 
-async def connect_sensor(sensor):
-    async with BleakClient(sensor["mac"]) as client:
-        print(f"✅ Conectado a {sensor['name']} ({sensor['mac']})")
-        await client.start_notify(
-            READ_CHARACTERISTIC_UUID,
-            make_callback(sensor["name"])
-        )
-        while True:  # Mantener conexión activa
-            await asyncio.sleep(1)
+async def mostrar_angulos(sincronizador, angulos):
+    # Los primeros segundos se toman como postura neutra: quedarse de pie y quieto
+    while True:
+        await asyncio.sleep(INTERVALO_ANGULOS)
+        tiempos, cuaterniones = sincronizador.extraer(time.monotonic())
+        if not len(tiempos):
+            continue
+        actuales = angulos.agregar(cuaterniones)
+        texto = ", ".join(f"{nombre}={valores[-1]:.1f}°" for nombre, valores in actuales.items())
+        print(f"[Ángulos] {texto} | Rango: {angulos.rango()}")
 
 
 async def main():
-    await asyncio.gather(*(connect_sensor(s) for s in SENSORS))
+    segmentos = [s["segmento"] for s in SENSORS]
+    sincronizador = Sincronizador(segmentos)
+    angulos = AngulosArticulares(segmentos)
+
+    # Un solo escaneo y los tres sensores conectados a la vez; si uno se
+    # desconecta, el gestor lo reconecta solo
+    gestor = GestorConexiones({
+        s["mac"]: make_callback(s["name"], s["segmento"], sincronizador) for s in SENSORS
+    }, calibracion=None)
+    # Los sensores que no conectan a tiempo se siguen reintentando en segundo plano
+    fallidos = await gestor.iniciar()
+    for sensor in SENSORS:
+        conexion = gestor.conexiones[sensor['mac']]
+        if sensor['mac'] in fallidos:
+            print(f"❌ {sensor['name']} ({sensor['mac']}): {conexion.estado} ({conexion.error})")
+        else:
+            print(f"✅ {sensor['name']} ({sensor['mac']}): {conexion.estado}")
+    try:
+        await mostrar_angulos(sincronizador, angulos)
+    finally:
+        await gestor.detener()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import sys
+import time
+import numpy as np
+
+current_dir = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..')))
+
+from Comun.simulador import SensorSimulado, UUID_LECTURA
+from Comun.transporte import crear_cliente
+from Procesamiento import DeviceModel
+
+# Prueba en vivo: sensores simulados capturando a la vez en un solo event loop
+SENSORES = 24
+DURACION = 10.0
+# Parámetros del simulador para cada sensor (ver Comun/transporte.py)
+PARAMETROS = "frecuencia=200&jitter=0.005"
+
+# Prueba sin event loop: muestras procesadas lo más rápido posible
+MUESTRAS_OFFLINE = 200_000
+
+
+def percentiles_ms(valores):
+    p50, p95, p99 = np.percentile(valores, [50, 95, 99]) * 1000
+    return f"p50={p50:.2f} ms, p95={p95:.2f} ms, p99={p99:.2f} ms, máx={np.max(valores) * 1000:.2f} ms"
+
+
+def rendimiento_offline():
+    """Paquetes por segundo de CPU del decodificador y las métricas, en un núcleo."""
+    sensor = SensorSimulado(semilla=0)
+    notificaciones = list(sensor.notificaciones(MUESTRAS_OFFLINE))
+    device_object = DeviceModel("offline", None, None, "offline", verbose=False)
+
+    inicio = time.process_time()
+    for i, data in enumerate(notificaciones):
+        device_object.recibir(data, i / sensor.frecuencia)
+    cpu = time.process_time() - inicio
+
+    paquetes = device_object.decodificador.paquetes
+    print("--- Procesamiento sin event loop ---")
+    print(f"Notificaciones: {len(notificaciones)}, paquetes: {paquetes}")
+    print(f"{paquetes / cpu:.0f} paquetes/s por núcleo ({cpu / paquetes * 1e6:.1f} µs por paquete)")
+
+
+async def capturar(indice, latencias):
+    """Captura un sensor simulado y mide la latencia de cada notificación."""
+    cliente = crear_cliente(f"sim:{indice}?semilla={indice}&{PARAMETROS}")
+    device_object = DeviceModel(f"sim {indice}", None, None, f"sensor {indice}", verbose=False)
+
+    def on_data_received(sender, data):
+        device_object.recibir(data, time.time())
+        # Desde que el sensor generó la muestra hasta tener la métrica actualizada
+        latencias.append(time.monotonic() - cliente.programado)
+
+    async with cliente:
+        await cliente.start_notify(UUID_LECTURA, on_data_received)
+        await asyncio.sleep(DURACION)
+        await cliente.stop_notify(UUID_LECTURA)
+    return device_object
+
+
+async def rendimiento_en_vivo():
+    latencias = []
+    inicio = time.process_time()
+    dispositivos = await asyncio.gather(*(capturar(i, latencias) for i in range(SENSORES)))
+    cpu = time.process_time() - inicio
+
+    paquetes = sum(d.decodificador.paquetes for d in dispositivos)
+    print(f"\n--- {SENSORES} sensores simulados durante {DURACION:.0f} s ---")
+    print(f"Paquetes: {paquetes} ({paquetes / DURACION:.0f} paquetes/s)")
+    print(f"{paquetes / cpu:.0f} paquetes/s por núcleo, incluyendo la simulación ({100 * cpu / DURACION:.0f}% de CPU)")
+    print(f"Latencia muestra -> métrica: {percentiles_ms(np.array(latencias))}")
+
+
+if __name__ == "__main__":
+    rendimiento_offline()
+    asyncio.run(rendimiento_en_vivo())
@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..')))
+
+from Comun.registro import reproducir
+from Procesamiento import DeviceModel
+
+# Registro grabado con Procesamiento.py o con la API (grabar=true)
+RUTA_REGISTRO = "registro_marcha.imu"
+
+# Velocidad de reproducción: 1.0 = tiempo real, 10.0 = diez veces más rápido,
+# None = lo más rápido posible (útil para medir el rendimiento del procesamiento)
+VELOCIDAD = None
+
+
+def main():
+    device_object = DeviceModel("registro", None, None, "reproducción", verbose=False)
+
+    inicio = time.perf_counter()
+    notificaciones = reproducir(RUTA_REGISTRO, device_object.recibir, VELOCIDAD)
+    duracion = time.perf_counter() - inicio
+
+    pasos, cadencia, velocidad, longitud_paso = device_object.get_metrics()
+    muestras = device_object.muestras.total
+
+    print("--- Métricas de Marcha (reproducción) ---")
+    print(f"Pasos totales: {pasos}")
+    print(f"Cadencia: {cadencia} pasos/min")
+    print(f"Velocidad: {velocidad} m/s")
+    print(f"Longitud de paso promedio: {longitud_paso} m")
+
+    print("\n--- Rendimiento ---")
+    print(f"Notificaciones: {notificaciones}, muestras: {muestras}, "
+          f"descartados: {device_object.decodificador.descartados} bytes")
+    if duracion > 0:
+        print(f"Tiempo: {duracion:.3f} s ({muestras / duracion:.0f} muestras/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# Estimación de pose con recorte de la región del sujeto y complejidad
+# adaptativa. En lugar de pasar el frame completo a mediapipe, se recorta
+# el rectángulo donde estaba la persona en el frame anterior (con margen) y
+# se reduce a `lado_maximo` pixeles; los landmarks se devuelven en
+# coordenadas del frame completo. Si la visibilidad de los landmarks que
+# usa el análisis (INDICES) baja del umbral, se vuelve a buscar en el frame
+# completo. La complejidad del modelo (0, 1 o 2) baja cuando la latencia
+# medida no alcanza `objetivo_fps` y sube cuando sobra tiempo.
+# El recorte y el frame completo usan modelos distintos: en modo video cada
+# modelo sigue al sujeto en las coordenadas de la imagen que recibe, así que
+# un modelo se reinicia si no se usó en el frame anterior o si la región
+# del recorte se movió.
+
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import mediapipe as mp
+
+from Comun.analisis import CONFIG_POSE
+from Comun.cinematica import INDICES, UMBRAL_VISIBILIDAD
+from Comun.render import a_landmark_list
+
+mp_pose = mp.solutions.pose
+
+# Landmarks que usa el análisis de la marcha
+INDICES_ANALISIS = sorted(INDICES.values())
+
+# Peso de la última medición en la latencia promedio de cada complejidad
+SUAVIZADO = 0.1
+
+CONFIG_ADAPTATIVO = dict(
+    objetivo_fps=30.0,            # frames por segundo que se quieren sostener
+    complejidades=(0, 1, 2),      # complejidades permitidas, de menor a mayor
+    complejidad_inicial=CONFIG_POSE['model_complexity'],
+    margen_roi=0.25,              # margen alrededor del sujeto (fracción de su tamaño)
+    lado_maximo=640,              # px del lado mayor de la región que entra al modelo
+    umbral_visibilidad=UMBRAL_VISIBILIDAD,
+    frames_cambio=15,             # frames mínimos entre cambios de complejidad
+    holgura=0.7,                  # sube de complejidad si la latencia esperada < holgura · presupuesto
+)
+
+
+class EstimadorAdaptativo:
+    """Sustituto de `mp_pose.Pose` con recorte de región y complejidad adaptativa.
+
+    Uso (igual que mp_pose.Pose):
+        with EstimadorAdaptativo(objetivo_fps=30) as pose:
+            results = pose.process(image_rgb)    # results.pose_landmarks
+
+    `estimar(image_rgb)` devuelve directamente el arreglo (33, 4) o None.
+    """
+
+    def __init__(self, **config):
+        self.config = {**CONFIG_ADAPTATIVO, **config}
+        self.config_pose = {clave: valor for clave, valor in CONFIG_POSE.items() if clave != 'model_complexity'}
+        self.disponibles = sorted(self.config['complejidades'])
+        inicial = self.config['complejidad_inicial']
+        self.complejidad = inicial if inicial in self.disponibles else self.disponibles[-1]
+        # Modelos por (complejidad, frame completo) y los usados en el frame anterior y en el actual
+        self.modelos = {}
+        self.anteriores = set()
+        self.usados = set()
+        self.roi = None
+        self.latencias = {}
+        self.desde_cambio = 0
+        self.recien_creado = False
+        # Estadísticas
+        self.frames = 0
+        self.busquedas_completas = 0
+        self.reinicios = 0
+        self.frames_por_complejidad = Counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for modelo in self.modelos.values():
+            modelo.close()
+        self.modelos.clear()
+
+    def _modelo(self, completo):
+        while (self.complejidad, completo) not in self.modelos:
+            try:
+                self.modelos[(self.complejidad, completo)] = mp_pose.Pose(model_complexity=self.complejidad,
+                                                                          **self.config_pose)
+                self.recien_creado = True
+                self.anteriores.add((self.complejidad, completo))
+            except Exception as e:
+                # Modelo no disponible (por ejemplo sin conexión para descargarlo)
+                print(f"Complejidad {self.complejidad} no disponible: {e}")
+                i = self.disponibles.index(self.complejidad)
+                self.disponibles.remove(self.complejidad)
+                if not self.disponibles:
+                    raise
+                self.complejidad = self.disponibles[min(i, len(self.disponibles) - 1)]
+        clave = (self.complejidad, completo)
+        if clave not in self.anteriores:
+            # Su seguimiento es de otra imagen (otra región o un frame ya lejano)
+            self.modelos[clave].reset()
+            self.reinicios += 1
+        self.usados.add(clave)
+        return self.modelos[clave]
+
+    def process(self, image_rgb):
+        landmarks = self.estimar(image_rgb)
+        return SimpleNamespace(pose_landmarks=None if landmarks is None else a_landmark_list(landmarks))
+
+    def estimar(self, image_rgb):
+        inicio = time.perf_counter()
+        H, W = image_rgb.shape[:2]
+        self.anteriores, self.usados = self.usados, set()
+        landmarks = None
+        if self.roi is not None:
+            landmarks = self._estimar_region(image_rgb, self.roi, completo=False)
+            if landmarks is None or not self._confiable(landmarks):
+                # Se perdió al sujeto: buscar en el frame completo y reiniciar
+                # el seguimiento del recorte
+                landmarks = None
+                self.busquedas_completas += 1
+                self.usados.discard((self.complejidad, False))
+        if landmarks is None:
+            landmarks = self._estimar_region(image_rgb, (0, 0, W, H), completo=True)
+
+        if landmarks is not None and self._confiable(landmarks):
+            self._actualizar_roi(landmarks, W, H)
+        else:
+            self.roi = None
+
+        self.frames += 1
+        self.frames_por_complejidad[self.complejidad] += 1
+        self._ajustar_complejidad(time.perf_counter() - inicio)
+        return landmarks
+
+    def _estimar_region(self, image_rgb, roi, completo):
+        H, W = image_rgb.shape[:2]
+        x0, y0, x1, y1 = roi
+        region = image_rgb[y0:y1, x0:x1]
+        ancho, alto = x1 - x0, y1 - y0
+        escala = self.config['lado_maximo'] / max(ancho, alto)
+        if escala < 1:
+            region = cv2.resize(region, None, fx=escala, fy=escala, interpolation=cv2.INTER_LINEAR)
+
+        results = self._modelo(completo).process(np.ascontiguousarray(region))
+        if results.pose_landmarks is None:
+            return None
+        landmarks = np.array([[l.x, l.y, l.z, l.visibility] for l in results.pose_landmarks.landmark],
+                             dtype=np.float32)
+        # De coordenadas normalizadas de la región a las del frame completo
+        landmarks[:, 0] = (landmarks[:, 0] * ancho + x0) / W
+        landmarks[:, 1] = (landmarks[:, 1] * alto + y0) / H
+        landmarks[:, 2] *= ancho / W
+        return landmarks
+
+    def _confiable(self, landmarks):
+        return landmarks[INDICES_ANALISIS, 3].mean() >= self.config['umbral_visibilidad']
+
+    def _actualizar_roi(self, landmarks, W, H):
+        visibles = landmarks[landmarks[:, 3] >= self.config['umbral_visibilidad'], :2] * [W, H]
+        if len(visibles) < 2:
+            self.roi = None
+            return
+        (bx0, by0), (bx1, by1) = visibles.min(axis=0), visibles.max(axis=0)
+        margen = self.config['margen_roi'] * max(bx1 - bx0, by1 - by0)
+        nuevo = (max(int(bx0 - margen), 0), max(int(by0 - margen), 0),
+                 min(int(bx1 + margen), W), min(int(by1 + margen), H))
+
+        # La región sólo se mueve cuando el sujeto se acerca al borde o se aleja
+        # mucho: mientras tanto el seguimiento interno de mediapipe sigue valiendo
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            borde = 0.5 * margen
+            # Un lado pegado al borde de la imagen no puede crecer más
+            dentro = ((x0 == 0 or bx0 - x0 >= borde) and (y0 == 0 or by0 - y0 >= borde) and
+                      (x1 == W or x1 - bx1 >= borde) and (y1 == H or y1 - by1 >= borde))
+            area = (x1 - x0) * (y1 - y0)
+            area_nueva = (nuevo[2] - nuevo[0]) * (nuevo[3] - nuevo[1])
+            if dentro and area_nueva >= 0.5 * area:
+                return
+        self.roi = nuevo
+        # El modelo del recorte empieza de nuevo en la región nueva
+        self.usados = {clave for clave in self.usados if clave[1]}
+
+    def _ajustar_complejidad(self, latencia):
+        c = self.complejidad
+        if self.recien_creado:
+            # La primera inferencia incluye la carga del modelo
+            self.recien_creado = False
+            return
+        anterior = self.latencias.get(c)
+        self.latencias[c] = latencia if anterior is None else anterior + SUAVIZADO * (latencia - anterior)
+        self.desde_cambio += 1
+        if self.desde_cambio < self.config['frames_cambio']:
+            return
+
+        presupuesto = 1.0 / self.config['objetivo_fps']
+        i = self.disponibles.index(c)
+        if self.latencias[c] > presupuesto and i > 0:
+            self._cambiar(self.disponibles[i - 1])
+        elif i + 1 < len(self.disponibles):
+            siguiente = self.disponibles[i + 1]
+            # Si nunca se midió, se supone el doble de la actual
+            esperada = self.latencias.get(siguiente, 2 * self.latencias[c])
+            if esperada < self.config['holgura'] * presupuesto:
+                self._cambiar(siguiente)
+
+    def _cambiar(self, complejidad):
+        self.complejidad = complejidad
+        self.desde_cambio = 0
+
+    def estadisticas(self):
+        return {
+            "frames": self.frames,
+            "complejidad": self.complejidad,
+            "frames_por_complejidad": dict(self.frames_por_complejidad),
+            "busquedas_completas": self.busquedas_completas,
+            "reinicios": self.reinicios,
+            "latencia_ms": {c: round(1000 * l, 1) for c, l in self.latencias.items()},
+        }
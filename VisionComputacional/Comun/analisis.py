@@ -0,0 +1,425 @@
+# Análisis de video completo (arcos de movilidad + predicción de fases).
+# Este módulo se ejecuta dentro de los procesos de trabajo de la API, por lo
+# que el modelo y el scaler se cargan una sola vez por proceso al importarlo.
+#
+# El análisis se divide en tres etapas independientes:
+#   1. extracción: mediapipe produce los landmarks crudos de cada frame
+#      (el paso costoso; su resultado se puede guardar en Comun/cache_landmarks.py)
+#   2. análisis: ángulos y fases de todos los frames con NumPy y una sola
+#      llamada al modelo (Comun/cinematica.py y Comun/clasificacion.py)
+#   3. dibujo: el video anotado se genera a partir de los arreglos (Comun/render.py)
+# Entre la extracción y el análisis, los landmarks pueden pasar por la etapa
+# de suavizado (Comun/suavizado.py), que rellena huecos cortos y quita el
+# temblor; la caché guarda siempre los landmarks crudos.
+
+import cv2
+import hashlib
+import os
+import mediapipe as mp
+import numpy as np
+import csv
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from Comun.clasificacion import clasificar_fases
+from Comun.ciclos import resumen_ciclos
+from Comun.cinematica import COLUMNAS_ANGULOS, landmarks_a_array, angulos_articulares, caracteristicas
+from Comun.cache_landmarks import hash_archivos
+from Comun.render import dibujar_frame
+from Comun.suavizado import suavizar_datos, suavizar_fases
+
+# INICIALIZAR MEDIAPIPE
+mp_pose = mp.solutions.pose
+
+# Configuración de mediapipe; forma parte de la clave de la caché porque
+# cambia los landmarks que se obtienen del mismo video
+CONFIG_POSE = dict(static_image_mode=False, model_complexity=2, min_detection_confidence=0.5)
+
+# Cada cuántos frames se reporta el avance al proceso principal
+INTERVALO_PROGRESO = 10
+
+def clave_cache(rutas):
+    """Clave de la caché de landmarks para un video o una lista de frames."""
+    return hash_archivos(rutas, sorted(CONFIG_POSE.items()))
+
+def clave_segmentada(llave, segmentos, calentamiento_s):
+    """Clave de los landmarks extraídos por tramos, que no son los de la extracción secuencial."""
+    return hashlib.sha256(f"{llave}:{segmentos}:{calentamiento_s}".encode()).hexdigest()
+
+def estimar_pose(pose, image):
+    """Landmarks (33, 4) de un frame BGR, o None si no hay persona."""
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    results = pose.process(image_rgb)
+    if results.pose_landmarks is None:
+        return None
+    return landmarks_a_array(results.pose_landmarks)
+
+def empaquetar_landmarks(landmarks, indices, tiempos, W, H, fps):
+    """Arreglos de la caché a partir de los landmarks de cada frame.
+
+    `landmarks` es una lista de arreglos (33, 4) o None; los frames sin
+    persona quedan con landmarks NaN y detectado = False.
+    """
+    n = len(indices)
+    arreglo = np.full((n, 33, 4), np.nan, dtype=np.float32)
+    detectado = np.zeros(n, dtype=bool)
+    for i, lm in enumerate(landmarks):
+        if lm is not None:
+            arreglo[i] = lm
+            detectado[i] = True
+    return {
+        "landmarks": arreglo,
+        "detectado": detectado,
+        "indices": np.asarray(indices, dtype=np.int64),
+        "tiempos": np.asarray(tiempos, dtype=np.float64),
+        "dimensiones": np.array([W, H], dtype=np.int64),
+        "fps": np.array(fps, dtype=np.float64),
+    }
+
+def _concatenar(partes):
+    datos = {k: np.concatenate([p[k] for p in partes])
+             for k in ("landmarks", "detectado", "indices", "tiempos")}
+    datos["dimensiones"] = partes[0]["dimensiones"]
+    datos["fps"] = partes[0]["fps"]
+    return datos
+
+def extraer_landmarks(input_path, inicio=0, fin=None, calentamiento=0,
+                      progreso=None, clave=None):
+    """Estima la pose de los frames [inicio, fin) del video.
+
+    Antes de `inicio` se procesan `calentamiento` frames sin guardarlos para
+    que el tracker de mediapipe (static_image_mode=False) llegue estabilizado.
+    Devuelve el diccionario de arreglos que se guarda en la caché.
+    """
+    cap = cv2.VideoCapture(input_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    W = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    H = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    if fin is None:
+        fin = total_frames
+    primero = max(0, inicio - calentamiento)
+    if primero > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, primero)
+
+    # El último segmento (fin = total) se lee hasta el final del archivo, ya
+    # que CAP_PROP_FRAME_COUNT es sólo una estimación en algunos contenedores
+    hasta_el_final = fin >= total_frames
+    por_procesar = max(1, fin - inicio)
+    paso_log = max(1, int(por_procesar*0.05))
+    landmarks, indices, tiempos = [], [], []
+    frames = 0
+
+    if progreso is not None:
+        progreso[clave] = (0, por_procesar)
+
+    with mp_pose.Pose(**CONFIG_POSE) as pose:
+        indice = primero
+        while cap.isOpened() and (hasta_el_final or indice < fin):
+            ret, image = cap.read()
+            if not ret:
+                break
+            indice += 1
+
+            ts = cap.get(cv2.CAP_PROP_POS_MSEC)
+            ts = round(ts/1000, 2)
+
+            if indice <= inicio:
+                # Frame de calentamiento del tracker: no se guarda
+                estimar_pose(pose, image)
+                continue
+
+            frames += 1
+            if frames % paso_log == 0:
+                print(f"Progreso: {frames}/{por_procesar} frames ({100*frames/por_procesar:.0f}%)")
+            if progreso is not None and frames % INTERVALO_PROGRESO == 0:
+                progreso[clave] = (frames, por_procesar)
+
+            landmarks.append(estimar_pose(pose, image))
+            indices.append(indice - 1)
+            tiempos.append(ts)
+
+    cap.release()
+
+    if progreso is not None:
+        progreso[clave] = (frames, frames)
+
+    return empaquetar_landmarks(landmarks, indices, tiempos, W, H, fps)
+
+def extraer_landmarks_frames(rutas):
+    """Estima la pose de una secuencia de imágenes (un frame por archivo).
+
+    Los archivos que no se pueden leer se omiten; `indices` guarda la
+    posición de cada frame procesado dentro de `rutas`.
+    """
+    landmarks, indices = [], []
+    W = H = 0
+    with mp_pose.Pose(**CONFIG_POSE) as pose:
+        for i, ruta in enumerate(rutas):
+            image = cv2.imread(str(ruta))
+            if image is None:
+                continue
+            if W == 0:
+                H, W = image.shape[:2]
+            try:
+                lm = estimar_pose(pose, image)
+            except Exception as e:
+                print(f"Error procesando frame {ruta}: {e}")
+                continue
+            landmarks.append(lm)
+            indices.append(i)
+
+    return empaquetar_landmarks(landmarks, indices, np.zeros(len(indices)), W, H, 0)
+
+def analizar_landmarks(datos, suavizar=False):
+    """Ángulos y fases de todos los frames a partir de los landmarks.
+
+    Devuelve (angulos (F, 6), validos (F, 2), fases (F,)); la fase es None
+    en los frames que no se clasifican (sin persona o lado izquierdo no
+    visible). Con `suavizar=True` las fases se pasan por SuavizadorFases,
+    que impone el orden del ciclo de la marcha.
+    """
+    W, H = (int(v) for v in datos["dimensiones"])
+    detectado = datos["detectado"]
+    n = len(detectado)
+    angulos = np.zeros((n, 6), dtype=int)
+    validos = np.zeros((n, 2), dtype=bool)
+    fases = np.full(n, None, dtype=object)
+
+    lm = datos["landmarks"][detectado]
+    if len(lm):
+        angulos[detectado], validos[detectado] = angulos_articulares(lm, W, H)
+
+    # Una sola llamada al modelo para todos los frames clasificables
+    clasificables = detectado & validos[:, 1]
+    if clasificables.any():
+        X = caracteristicas(datos["landmarks"][clasificables], angulos[clasificables], W, H)
+        fases[clasificables] = clasificar_fases(X)
+    if suavizar:
+        fases = suavizar_fases(fases)
+
+    return angulos, validos, fases
+
+def resumen_analisis(datos, resultado, fps=None):
+    """Resumen por ciclo de la marcha (Comun/ciclos.py) del resultado del análisis.
+
+    El tiempo de cada frame sale de su índice y los fps del video (o `fps`
+    para secuencias de imágenes), más preciso que los tiempos redondeados
+    del CSV.
+    """
+    angulos, validos, fases = resultado
+    fps = fps or float(datos["fps"])
+    tiempos = datos["indices"] / fps if fps else datos["tiempos"]
+    return resumen_ciclos(tiempos, angulos, validos, fases)
+
+def filas_csv(tiempos, detectado, angulos, fases):
+    """Filas del CSV de análisis: una por frame sin persona o clasificado."""
+    filas = []
+    for ts, det, ang, fase in zip(tiempos.tolist(), detectado, angulos.tolist(), fases):
+        if not det:
+            filas.append([ts, "NO PERSON", 0, 0, 0, 0, 0, 0])
+        elif fase is not None:
+            filas.append([ts, fase, *ang])
+    return filas
+
+def escribir_csv(csv_path, filas):
+    with open(csv_path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Time [s]','Phase', *COLUMNAS_ANGULOS])
+        writer.writerows(filas)
+
+def renderizar_video(input_path, output_path, datos, resultado):
+    """Genera el video anotado leyendo otra vez los frames del video original."""
+    angulos, validos, fases = resultado
+    W, H = (int(v) for v in datos["dimensiones"])
+    indices = datos["indices"]
+
+    cap = cv2.VideoCapture(input_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (W, H))
+
+    indice = int(indices[0]) if len(indices) else 0
+    if indice > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, indice)
+
+    j = 0
+    while j < len(indices):
+        ret, image = cap.read()
+        if not ret:
+            break
+        if indice == indices[j]:
+            dibujar_frame(image, datos["landmarks"][j], datos["detectado"][j],
+                          angulos[j], validos[j], fases[j], W, H)
+            out.write(image)
+            j += 1
+        indice += 1
+
+    cap.release()
+    out.release()
+
+def renderizar_imagenes(imagenes, output_path, fps, datos, resultado):
+    """Genera el video anotado a partir de las imágenes de los frames de `datos`.
+
+    `imagenes` produce, en orden, la imagen BGR de cada frame de
+    datos["indices"] (None si ya no se puede leer).
+    """
+    angulos, validos, fases = resultado
+    W, H = (int(v) for v in datos["dimensiones"])
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (W, H))
+
+    for j, image in enumerate(imagenes):
+        if image is None:
+            continue
+        dibujar_frame(image, datos["landmarks"][j], datos["detectado"][j],
+                      angulos[j], validos[j], fases[j], W, H)
+        out.write(image)
+
+    out.release()
+
+def renderizar_frames(rutas, output_path, fps, datos, resultado):
+    """Genera el video anotado a partir de una secuencia de imágenes."""
+    imagenes = (cv2.imread(str(rutas[i])) for i in datos["indices"])
+    renderizar_imagenes(imagenes, output_path, fps, datos, resultado)
+
+def _segmentos_efectivos(segmentos, total_frames, fps):
+    """Tramos que se usan: a lo más uno por núcleo y por segundo de video."""
+    return max(1, min(segmentos, os.cpu_count() or 1, total_frames // max(1, round(fps)) or 1))
+
+def _extraer_video(input_path, total_frames, fps, segmentos, calentamiento_s, progreso, clave):
+    if segmentos == 1:
+        return extraer_landmarks(input_path, progreso=progreso, clave=clave)
+
+    limites = np.linspace(0, total_frames, segmentos + 1).astype(int)
+    calentamiento = int(round(calentamiento_s * fps))
+    claves = [f"{clave}:{i}" for i in range(segmentos)]
+
+    # "spawn" evita heredar por fork el estado interno de mediapipe
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=segmentos, mp_context=contexto) as executor:
+        futures = [executor.submit(extraer_landmarks, input_path,
+                                   limites[i], limites[i + 1], calentamiento,
+                                   progreso, claves[i])
+                   for i in range(segmentos)]
+
+        # Reportar el avance combinado de todos los segmentos
+        pendientes = set(futures)
+        while pendientes:
+            _, pendientes = wait(pendientes, timeout=0.5)
+            if progreso is not None:
+                hechos = sum(progreso.get(c, (0, 0))[0] for c in claves)
+                progreso[clave] = (hechos, max(hechos, total_frames))
+
+        partes = [future.result() for future in futures]
+
+    if progreso is not None:
+        for c in claves:
+            progreso.pop(c, None)
+        progreso[clave] = (total_frames, total_frames)
+
+    return _concatenar(partes)
+
+def landmarks_video(input_path, cache=None, segmentos=1, calentamiento_s=1.0,
+                    progreso=None, clave=None):
+    """Landmarks del video: de la caché si ya se habían extraído, o de mediapipe.
+
+    Con `segmentos` > 1 la extracción se divide en tramos de tiempo que se
+    procesan en paralelo, un proceso (y un `mp_pose.Pose`) por tramo; cada
+    tramo procesa además `calentamiento_s` segundos previos para estabilizar
+    el tracker. El resultado segmentado es aproximado: el calentamiento no
+    reproduce exactamente el estado del tracker de la extracción secuencial,
+    así que los landmarks de cada tramo después del primero difieren un poco
+    (del orden de 0.002 en coordenadas normalizadas) y algunos frames cercanos
+    al umbral de visibilidad o a un cambio de fase pueden clasificarse
+    distinto o no clasificarse (filas de menos en el CSV). Sólo `segmentos=1`
+    reproduce el análisis secuencial.
+
+    En la caché, la extracción secuencial sirve para cualquier `segmentos`;
+    una extracción por tramos se guarda con su propia clave y sólo se usa
+    con la misma segmentación.
+    """
+    datos = None
+    if cache is not None:
+        llave = clave_cache(input_path)
+        datos = cache.cargar(llave)
+
+    if datos is None:
+        cap = cv2.VideoCapture(input_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        segmentos = _segmentos_efectivos(segmentos, total_frames, fps)
+        if cache is not None and segmentos > 1:
+            llave = clave_segmentada(llave, segmentos, calentamiento_s)
+            datos = cache.cargar(llave)
+
+    if datos is None:
+        datos = _extraer_video(input_path, total_frames, fps, segmentos, calentamiento_s,
+                               progreso, clave)
+        if cache is not None:
+            cache.guardar(llave, **datos)
+    elif progreso is not None:
+        n = len(datos["indices"])
+        progreso[clave] = (n, n)
+
+    return datos
+
+def landmarks_frames(rutas, cache=None):
+    """Landmarks de una secuencia de imágenes, de la caché si es posible."""
+    llave = clave_cache(rutas) if cache is not None else None
+    datos = cache.cargar(llave) if cache is not None else None
+    if datos is None:
+        datos = extraer_landmarks_frames(rutas)
+        if cache is not None:
+            cache.guardar(llave, **datos)
+    return datos
+
+def preparar_landmarks(datos, suavizar=True, fps=None):
+    """Landmarks listos para el análisis: suavizados o tal como se extrajeron."""
+    return suavizar_datos(datos, fps) if suavizar else datos
+
+def analizar_video(input_path, output_path, csv_path, segmentos=1, calentamiento_s=1.0,
+                   renderizar=True, cache=None, progreso=None, clave=None, suavizar=True):
+    """Procesa un video y escribe el CSV de análisis y el video anotado.
+
+    Con `renderizar=False` sólo se escribe el CSV; el video anotado puede
+    generarse después con generar_video a partir de los landmarks guardados
+    en `cache` (un CacheLandmarks). Si el video ya se había analizado, se
+    omite mediapipe y se usan los landmarks de la caché.
+
+    Si se recibe `progreso` (un diccionario compartido entre procesos), se
+    actualiza `progreso[clave]` con la tupla (frames procesados, total).
+    Con `suavizar=True` los huecos cortos sin persona se rellenan, los
+    landmarks se filtran y las fases siguen el orden del ciclo.
+
+    Devuelve {"filas": filas del CSV, "resumen": resumen por ciclo de la marcha}.
+    """
+    datos = landmarks_video(input_path, cache, segmentos, calentamiento_s, progreso, clave)
+    datos = preparar_landmarks(datos, suavizar)
+
+    resultado = analizar_landmarks(datos, suavizar)
+    filas = filas_csv(datos["tiempos"], datos["detectado"], resultado[0], resultado[2])
+    escribir_csv(csv_path, filas)
+    if renderizar:
+        renderizar_video(input_path, output_path, datos, resultado)
+    return {"filas": len(filas), "resumen": resumen_analisis(datos, resultado)}
+
+def generar_video(input_path, output_path, cache=None, progreso=None, clave=None, suavizar=True,
+                  segmentos=1, calentamiento_s=1.0):
+    """Etapa de dibujo por separado: genera sólo el video anotado.
+
+    Usa los landmarks de la caché (los de la misma segmentación con que se
+    analizó el video); si ya no están (por ejemplo, porque se desalojaron)
+    se vuelven a extraer.
+    """
+    datos = landmarks_video(input_path, cache, segmentos, calentamiento_s, progreso, clave)
+    datos = preparar_landmarks(datos, suavizar)
+    renderizar_video(input_path, output_path, datos, analizar_landmarks(datos, suavizar))
+    return output_path
+
+def generar_video_frames(rutas, output_path, fps, cache=None, suavizar=True):
+    """Como generar_video, para una secuencia de imágenes."""
+    datos = preparar_landmarks(landmarks_frames(rutas, cache), suavizar, fps)
+    renderizar_frames(rutas, output_path, fps, datos, analizar_landmarks(datos, suavizar))
+    return output_path
@@ -0,0 +1,134 @@
+# Caché en disco de los landmarks de mediapipe.
+# La estimación de pose es el paso más costoso del análisis; aquí se guardan
+# los arreglos crudos de cada video (33 landmarks con x, y, z y visibility
+# por frame) en archivos .npz, identificados por un hash del contenido de la
+# entrada. Así, al cambiar el modelo de fases, las correcciones de ángulos o
+# el dibujo, el video no tiene que pasar otra vez por mediapipe.
+
+import os
+import hashlib
+import tempfile
+import threading
+import numpy as np
+
+# Tamaño de bloque para calcular el hash de los archivos
+BLOQUE_HASH = 1024 * 1024
+
+# Límite por defecto del tamaño total de la caché (bytes)
+MAX_BYTES = 2 * 1024**3
+
+
+def hash_archivos(rutas, extra=""):
+    """SHA-256 del contenido de uno o varios archivos (en el orden dado).
+
+    `extra` se agrega al final del hash para distinguir configuraciones que
+    producen landmarks distintos para la misma entrada.
+    """
+    if isinstance(rutas, (str, os.PathLike)):
+        rutas = [rutas]
+    h = hashlib.sha256()
+    for ruta in rutas:
+        with open(ruta, "rb") as f:
+            while True:
+                bloque = f.read(BLOQUE_HASH)
+                if not bloque:
+                    break
+                h.update(bloque)
+    h.update(str(extra).encode())
+    return h.hexdigest()
+
+
+class CacheLandmarks:
+    """Almacén de arreglos .npz con límite de tamaño y desalojo LRU.
+
+    Cada entrada es un archivo `<clave>.npz`; su fecha de modificación se
+    actualiza al leerlo, de modo que al superar `max_bytes` se eliminan
+    primero las entradas usadas hace más tiempo. Las escrituras son atómicas
+    (archivo temporal + os.replace), por lo que varios procesos pueden
+    compartir el mismo directorio.
+    """
+
+    def __init__(self, directorio, max_bytes=MAX_BYTES):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directorio, exist_ok=True)
+
+    def __getstate__(self):
+        # El lock no se puede enviar a los procesos de trabajo
+        estado = self.__dict__.copy()
+        del estado["_lock"]
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.npz")
+
+    def cargar(self, clave):
+        """Devuelve un diccionario con los arreglos guardados o None."""
+        ruta = self._ruta(clave)
+        try:
+            with np.load(ruta, allow_pickle=False) as datos:
+                arreglos = {k: datos[k] for k in datos.files}
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        try:
+            os.utime(ruta)
+        except OSError:
+            pass
+        return arreglos
+
+    def guardar(self, clave, **arreglos):
+        """Guarda los arreglos bajo `clave` y aplica el límite de tamaño."""
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **arreglos)
+            os.replace(temporal, self._ruta(clave))
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        self._desalojar()
+
+    def eliminar(self, clave):
+        try:
+            os.remove(self._ruta(clave))
+        except FileNotFoundError:
+            pass
+
+    def tamano(self):
+        """Tamaño total en bytes de las entradas de la caché."""
+        return sum(tam for _, tam, _ in self._entradas())
+
+    def _entradas(self):
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith(".npz"):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                info = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            entradas.append((ruta, info.st_size, info.st_mtime))
+        return entradas
+
+    def _desalojar(self):
+        with self._lock:
+            entradas = self._entradas()
+            total = sum(tam for _, tam, _ in entradas)
+            if total <= self.max_bytes:
+                return
+            # Las menos usadas recientemente primero
+            for ruta, tam, _ in sorted(entradas, key=lambda e: e[2]):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(ruta)
+                    total -= tam
+                except FileNotFoundError:
+                    pass
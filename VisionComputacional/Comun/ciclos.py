@@ -0,0 +1,157 @@
+# Ciclos de la marcha y resumen de arcos de movilidad por ciclo.
+# La serie de fases y ángulos de un video se divide en ciclos (de un
+# contacto inicial al siguiente del mismo pie), cada ciclo se normaliza a
+# 0-100 % y se resumen sus máximos, mínimos, rango de movimiento, apoyo y
+# balanceo, además de la simetría entre ambos lados. Todos los ciclos se
+# calculan a la vez con NumPy, así que el resumen de un video de varios
+# minutos tarda milisegundos.
+
+import numpy as np
+
+# Las fases que predice el modelo son las de la pierna izquierda (la que se
+# requiere visible para clasificar). Los eventos del lado derecho salen de
+# las mismas fases: el contacto inicial derecho marca el inicio del
+# pre-balanceo izquierdo y el despegue derecho el inicio del apoyo medio.
+EVENTOS = {
+    "izquierdo": {"contacto": "INITIAL CONTACT", "despegue": "INITIAL SWING", "columnas": [3, 4, 5]},
+    "derecho": {"contacto": "PRE-SWING", "despegue": "MID-STANCE", "columnas": [0, 1, 2]},
+}
+
+# Articulaciones en el orden de las columnas de cada lado (COLUMNAS_ANGULOS)
+ARTICULACIONES = ["cadera", "rodilla", "tobillo"]
+
+CONFIG_CICLOS = dict(
+    puntos=101,               # muestras del ciclo normalizado (0, 1, ..., 100 %)
+    duracion_minima=0.4,      # s; ciclos más cortos se descartan
+    duracion_maxima=3.0,      # s; ciclos más largos (pausas, pérdidas) se descartan
+    max_invalidos=0.2,        # fracción máxima de frames del ciclo sin ángulos de ese lado
+)
+
+
+def inicios_fase(fases, fase):
+    """Índices de los frames en que empieza `fase`, ignorando los frames sin fase."""
+    fases = np.asarray(fases, dtype=object)
+    con_fase = np.flatnonzero(np.not_equal(fases, None))
+    es = (fases[con_fase] == fase).astype(np.int8)
+    return con_fase[np.diff(np.r_[0, es]) == 1]
+
+
+def segmentar_ciclos(tiempos, fases, validos_lado, lado, **config):
+    """Ciclos de un lado: de cada contacto inicial al siguiente.
+
+    Devuelve un diccionario de arreglos (K,): `inicio` y `fin` (frames),
+    `t_inicio`, `duracion` (s) y `apoyo` (% del ciclo hasta el despegue,
+    NaN si no se detectó), sólo con los ciclos aceptados.
+    """
+    config = {**CONFIG_CICLOS, **config}
+    eventos = EVENTOS[lado]
+    contactos = inicios_fase(fases, eventos["contacto"])
+    despegues = inicios_fase(fases, eventos["despegue"])
+
+    inicio, fin = contactos[:-1], contactos[1:]
+    t_inicio, t_fin = tiempos[inicio], tiempos[fin]
+    duracion = t_fin - t_inicio
+
+    # Frames sin ángulos de este lado dentro de cada ciclo
+    invalidos = np.r_[0, np.cumsum(~validos_lado)]
+    fraccion = (invalidos[fin] - invalidos[inicio]) / np.maximum(fin - inicio, 1)
+
+    # Primer despegue dentro de cada ciclo
+    t_despegues = tiempos[despegues]
+    k = np.searchsorted(t_despegues, t_inicio, side='right')
+    t_despegue = np.append(t_despegues, np.inf)[k]
+    apoyo = np.where(t_despegue < t_fin, 100 * (t_despegue - t_inicio) / np.where(duracion > 0, duracion, 1), np.nan)
+
+    aceptados = ((duracion >= config['duracion_minima']) & (duracion <= config['duracion_maxima']) &
+                 (fraccion <= config['max_invalidos']))
+    return {"inicio": inicio[aceptados], "fin": fin[aceptados], "t_inicio": t_inicio[aceptados],
+            "duracion": duracion[aceptados], "apoyo": apoyo[aceptados]}
+
+
+def normalizar_ciclos(tiempos, angulos_lado, validos_lado, t_inicio, duracion, puntos=CONFIG_CICLOS['puntos']):
+    """Ángulos de cada ciclo remuestreados a `puntos` muestras: (K, puntos, columnas).
+
+    Se interpola sólo entre los frames en que el lado tiene ángulos válidos.
+    """
+    k = len(t_inicio)
+    columnas = angulos_lado.shape[1]
+    if k == 0 or not validos_lado.any():
+        return np.full((k, puntos, columnas), np.nan)
+    t = tiempos[validos_lado]
+    valores = angulos_lado[validos_lado].astype(float)
+    consulta = (t_inicio[:, None] + np.linspace(0.0, 1.0, puntos) * duracion[:, None]).ravel()
+    curvas = np.stack([np.interp(consulta, t, valores[:, c]) for c in range(columnas)], axis=1)
+    return curvas.reshape(k, puntos, columnas)
+
+
+def indice_simetria(izquierdo, derecho):
+    """Índice de simetría (%): 0 es simetría perfecta (Robinson et al., 1987)."""
+    suma = izquierdo + derecho
+    if not np.isfinite(suma) or suma == 0:
+        return None
+    return round(float(200 * abs(izquierdo - derecho) / abs(suma)), 1)
+
+
+def _estadistica(valores):
+    valores = np.asarray(valores, dtype=float)
+    valores = valores[np.isfinite(valores)]
+    if len(valores) == 0:
+        return None
+    return {"media": round(float(valores.mean()), 1), "de": round(float(valores.std()), 1)}
+
+
+def resumen_ciclos(tiempos, angulos, validos, fases, **config):
+    """Resumen por ciclo de la marcha de cada lado y simetría entre lados.
+
+    `tiempos` (F,) en segundos, `angulos` (F, 6) en el orden de
+    COLUMNAS_ANGULOS, `validos` (F, 2) [derecho, izquierdo] y `fases` (F,)
+    son los arreglos del análisis (Comun/analisis.py). Devuelve un
+    diccionario serializable a JSON.
+    """
+    config = {**CONFIG_CICLOS, **config}
+    tiempos = np.asarray(tiempos, dtype=float)
+    angulos = np.asarray(angulos)
+    validos = np.asarray(validos, dtype=bool)
+
+    lados = {}
+    for lado, eventos in EVENTOS.items():
+        validos_lado = validos[:, 1 if lado == "izquierdo" else 0]
+        ciclos = segmentar_ciclos(tiempos, fases, validos_lado, lado, **config)
+        curvas = normalizar_ciclos(tiempos, angulos[:, eventos["columnas"]], validos_lado,
+                                   ciclos["t_inicio"], ciclos["duracion"], config['puntos'])
+        maximos, minimos = curvas.max(axis=1), curvas.min(axis=1)     # (K, 3)
+        rangos = maximos - minimos
+
+        lados[lado] = {
+            "ciclos": len(ciclos["inicio"]),
+            "duracion_s": _estadistica(ciclos["duracion"]),
+            "apoyo_%": _estadistica(ciclos["apoyo"]),
+            "balanceo_%": _estadistica(100 - ciclos["apoyo"]),
+            "articulaciones": {
+                nombre: {"maximo": _estadistica(maximos[:, j]), "minimo": _estadistica(minimos[:, j]),
+                         "rango": _estadistica(rangos[:, j]),
+                         "curva_media": (np.round(curvas[:, :, j].mean(axis=0), 1).tolist()
+                                         if len(curvas) else None)}
+                for j, nombre in enumerate(ARTICULACIONES)
+            },
+            "por_ciclo": [
+                {"inicio_s": round(float(t), 2), "duracion_s": round(float(d), 2),
+                 "apoyo_%": round(float(a), 1) if np.isfinite(a) else None,
+                 "rango": dict(zip(ARTICULACIONES, np.round(r, 1).tolist()))}
+                for t, d, a, r in zip(ciclos["t_inicio"], ciclos["duracion"], ciclos["apoyo"], rangos)
+            ],
+        }
+
+    def media(lado, *claves):
+        valor = lados[lado]
+        for clave in claves:
+            valor = valor.get(clave) if valor is not None else None
+        return valor["media"] if valor is not None else np.nan
+
+    simetria = {"duracion": indice_simetria(media("izquierdo", "duracion_s"), media("derecho", "duracion_s")),
+                "apoyo": indice_simetria(media("izquierdo", "apoyo_%"), media("derecho", "apoyo_%"))}
+    for nombre in ARTICULACIONES:
+        simetria[f"rango_{nombre}"] = indice_simetria(media("izquierdo", "articulaciones", nombre, "rango"),
+                                                      media("derecho", "articulaciones", nombre, "rango"))
+
+    return {"lados": lados, "simetria": simetria}
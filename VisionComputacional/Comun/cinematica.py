@@ -0,0 +1,132 @@
+# Cinemática de la marcha a partir de los landmarks de mediapipe.
+# Todas las funciones trabajan sobre arreglos de forma (frames, 33, C), con
+# C >= 2 (x, y normalizadas), así que un video completo se resuelve en una
+# sola pasada de NumPy. Para un solo frame basta con un arreglo (1, 33, C).
+
+import numpy as np
+
+# Diccionario de índices de landmarks
+INDICES = {
+    'N': 0, 'H_I': 11, 'H_D': 12, 'C_I': 23, 'C_D': 24,
+    'R_I': 25, 'R_D': 26, 'TO_I': 27, 'TO_D': 28,
+    'TA_I': 29, 'TA_D': 30
+}
+
+# Landmarks que deben ser visibles para calcular cada lado
+VISIBLES_DERECHA = [24, 26, 28]
+VISIBLES_IZQUIERDA = [23, 25, 27]
+UMBRAL_VISIBILIDAD = 0.5
+
+# Orden de las columnas de ángulos (el mismo que en los CSV de análisis)
+COLUMNAS_ANGULOS = ['Hip Joint Angle (R)', 'Knee Joint Angle (R)', 'Ankle Joint Angle (R)',
+                    'Hip Joint Angle (L)', 'Knee Joint Angle (L)', 'Ankle Joint Angle (L)']
+
+# Tripletas (a, b, c) de cada ángulo; el vértice es b
+TRIPLETAS = [
+    ('H_D', 'C_D', 'R_D'), ('C_D', 'R_D', 'TO_D'), ('R_D', 'TO_D', 'TA_D'),
+    ('H_I', 'C_I', 'R_I'), ('C_I', 'R_I', 'TO_I'), ('R_I', 'TO_I', 'TA_I'),
+]
+VERTICES = [INDICES[b] for _, b, _ in TRIPLETAS]
+
+
+def landmarks_a_array(pose_landmarks):
+    """Convierte `results.pose_landmarks` de mediapipe en un arreglo (33, 4).
+
+    Las columnas son x, y, z y visibility.
+    """
+    return np.array([[l.x, l.y, l.z, l.visibility] for l in pose_landmarks.landmark],
+                    dtype=np.float32)
+
+
+def posiciones(landmarks, W, H):
+    """Coordenadas en pixeles (enteras) de cada landmark: (frames, 33, 2)."""
+    landmarks = np.asarray(landmarks)
+    return (landmarks[..., :2] * [W, H]).astype(int)
+
+
+def angulo(a, b, c):
+    """Ángulo en b, en grados, con las mismas reglas que la versión escalar.
+
+    a, b y c tienen forma (..., 2); el resultado tiene forma (...,) y vale
+    NaN cuando alguno de los segmentos tiene longitud cero.
+    """
+    ba = a - b
+    bc = c - b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cosine_angle = np.sum(ba * bc, axis=-1) / (np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1))
+    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
+    ang = np.degrees(np.arccos(cosine_angle))
+    ang = np.where(ang > 180, ang - 180, ang)
+    ang = np.where(ang < 90, 180 - ang, ang)
+    return np.abs(np.round(ang))
+
+
+def angulos_articulares(landmarks, W, H, visibilidad=None):
+    """Ángulos de cadera, rodilla y tobillo de ambos lados.
+
+    landmarks tiene forma (frames, 33, C) con coordenadas normalizadas; si
+    C >= 4 la cuarta columna se usa como visibilidad, salvo que se pase
+    `visibilidad` (frames, 33) explícitamente. Sin visibilidad se asume que
+    todos los puntos son visibles.
+
+    Devuelve (angulos, validos): angulos es un arreglo entero (frames, 6) en
+    el orden de COLUMNAS_ANGULOS, con 0 en los lados no visibles, y validos
+    es un arreglo booleano (frames, 2) que indica si se calcularon el lado
+    derecho y el izquierdo.
+    """
+    landmarks = np.asarray(landmarks, dtype=float)
+    if visibilidad is None and landmarks.shape[-1] >= 4:
+        visibilidad = landmarks[..., 3]
+
+    puntos = posiciones(landmarks, W, H)
+    a = puntos[:, [INDICES[t[0]] for t in TRIPLETAS]]
+    b = puntos[:, [INDICES[t[1]] for t in TRIPLETAS]]
+    c = puntos[:, [INDICES[t[2]] for t in TRIPLETAS]]
+    ang = angulo(a, b, c)
+
+    # Correcciones de rodilla y tobillo
+    ang[:, [1, 4]] = 180 - ang[:, [1, 4]]
+    ang[:, [2, 5]] = 180 - (ang[:, [2, 5]] - 45)
+
+    n = len(landmarks)
+    if visibilidad is None:
+        validos = np.ones((n, 2), dtype=bool)
+    else:
+        visibilidad = np.asarray(visibilidad)
+        validos = np.stack([
+            np.all(visibilidad[:, VISIBLES_DERECHA] > UMBRAL_VISIBILIDAD, axis=1),
+            np.all(visibilidad[:, VISIBLES_IZQUIERDA] > UMBRAL_VISIBILIDAD, axis=1),
+        ], axis=1)
+    validos &= np.stack([np.all(np.isfinite(ang[:, :3]), axis=1),
+                         np.all(np.isfinite(ang[:, 3:]), axis=1)], axis=1)
+
+    lado = np.repeat(validos, 3, axis=1)
+    angulos = np.where(lado, np.nan_to_num(ang), 0).astype(int)
+    return angulos, validos
+
+
+def caracteristicas(landmarks, angulos, W, H):
+    """Matriz (frames, 9) de características del modelo de fases.
+
+    Las diferencias se toman según hacia dónde mira la persona (la nariz a
+    la derecha o a la izquierda de la cadera izquierda):
+    [dif_ac, dif_ar, dif_at, dif_pcx, dif_pcy, dif_prx, dif_pry, dif_ptx, dif_pty]
+    """
+    landmarks = np.asarray(landmarks, dtype=float)
+    angulos = np.asarray(angulos)
+    puntos = posiciones(landmarks, W, H)
+    x = landmarks[..., 0]
+    y = landmarks[..., 1]
+
+    mirada_derecha = puntos[:, INDICES['N'], 0] > puntos[:, INDICES['C_I'], 0]
+    signo = np.where(mirada_derecha, 1.0, -1.0)
+
+    dif_ang = (angulos[:, 3:] - angulos[:, :3]) * signo[:, None]
+    dif_y = (y[:, [23, 25, 27]] - y[:, [24, 26, 28]]) * signo[:, None]
+    dif_x = x[:, [23, 25, 27]] - x[:, [24, 26, 28]]
+
+    X = np.empty((len(landmarks), 9))
+    X[:, 0:3] = dif_ang
+    X[:, 3::2] = dif_x
+    X[:, 4::2] = dif_y
+    return X
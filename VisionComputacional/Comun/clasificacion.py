@@ -0,0 +1,44 @@
+# Clasificación de las fases de la marcha con el modelo preentrenado.
+# Las predicciones se hacen por lotes: una sola llamada a transform/predict
+# para todas las filas de la matriz de características.
+
+import os
+import numpy as np
+from joblib import load
+
+# CARGAR ARCHIVOS
+current_dir = os.path.dirname(__file__)
+
+# Modelo y scaler
+model_path = os.path.join(current_dir, '..', 'ModelosML', 'PrediccionEtapas.joblib')
+model = load(model_path)
+scaler_path = os.path.join(current_dir, '..', 'ModelosML', 'Scaler.joblib')
+scaler = load(scaler_path)
+scaler.feature_names_in_ = None
+
+# Diccionario para cambiar etiquetas
+mapa_etiquetas = {
+    "CONTACTO INICIAL": "INITIAL CONTACT",
+    "RESPUESTA A LA CARGA": "LOADING RESPONSE",
+    "APOYO MEDIO": "MID-STANCE",
+    "APOYO FINAL": "TERMINAL STANCE",
+    "PRE OSCILACION": "PRE-SWING",
+    "OSCILACION INICIAL": "INITIAL SWING",
+    "OSCILACION MEDIA": "MID-SWING",
+    "OSCILACION FINAL": "TERMINAL SWING",
+}
+
+# Número de características que usa el modelo:
+# [dif_ac, dif_ar, dif_at, dif_pcx, dif_pcy, dif_prx, dif_pry, dif_ptx, dif_pty]
+N_CARACTERISTICAS = 9
+
+# Etiquetas traducidas en el mismo orden que model.classes_ (que está ordenado)
+_etiquetas_traducidas = np.array([mapa_etiquetas.get(c, c) for c in model.classes_], dtype=object)
+
+def clasificar_fases(X):
+    """Devuelve la fase (ya traducida) de cada fila de la matriz X de (n, 9)."""
+    X = np.asarray(X, dtype=float).reshape(-1, N_CARACTERISTICAS)
+    if len(X) == 0:
+        return np.array([], dtype=object)
+    y_pred = model.predict(scaler.transform(X))
+    return _etiquetas_traducidas[np.searchsorted(model.classes_, y_pred)]
@@ -0,0 +1,144 @@
+# Recepción de grabaciones como un flujo de frames.
+# Formato del flujo: por cada frame, un entero sin signo de 4 bytes
+# (big-endian) con la longitud de la imagen, seguido de la imagen codificada
+# (JPEG o PNG). El mismo formato se usa para guardar el flujo en disco, de
+# modo que la grabación queda en un solo archivo en lugar de miles de PNG.
+
+import queue
+import struct
+import threading
+import cv2
+import numpy as np
+import mediapipe as mp
+
+from Comun.analisis import CONFIG_POSE, estimar_pose, empaquetar_landmarks
+
+mp_pose = mp.solutions.pose
+
+CABECERA = struct.Struct(">I")
+
+# Tamaño máximo aceptado para un frame (bytes)
+MAX_BYTES_FRAME = 32 * 1024 * 1024
+
+
+class LectorFrames:
+    """Separa los frames de un flujo que llega en bloques de cualquier tamaño."""
+
+    def __init__(self, max_bytes_frame=MAX_BYTES_FRAME):
+        self.buffer = bytearray()
+        self.max_bytes_frame = max_bytes_frame
+
+    def agregar(self, bloque):
+        """Agrega un bloque del flujo y devuelve los frames completos."""
+        self.buffer += bloque
+        frames = []
+        inicio = 0
+        while len(self.buffer) - inicio >= CABECERA.size:
+            (longitud,) = CABECERA.unpack_from(self.buffer, inicio)
+            if longitud > self.max_bytes_frame:
+                raise ValueError(f"Frame de {longitud} bytes excede el máximo permitido")
+            fin = inicio + CABECERA.size + longitud
+            if fin > len(self.buffer):
+                break
+            frames.append(bytes(self.buffer[inicio + CABECERA.size:fin]))
+            inicio = fin
+        del self.buffer[:inicio]
+        return frames
+
+    def incompleto(self):
+        """True si quedaron bytes de un frame que no terminó de llegar."""
+        return len(self.buffer) > 0
+
+
+def leer_frames(ruta):
+    """Itera sobre los frames (bytes codificados) de un archivo de flujo."""
+    with open(ruta, "rb") as f:
+        while True:
+            cabecera = f.read(CABECERA.size)
+            if len(cabecera) < CABECERA.size:
+                return
+            (longitud,) = CABECERA.unpack(cabecera)
+            datos = f.read(longitud)
+            if len(datos) < longitud:
+                return
+            yield datos
+
+
+def imagenes_flujo(ruta, indices):
+    """Decodifica, en orden, los frames del archivo cuyos índices se indican."""
+    indices = iter(indices)
+    siguiente = next(indices, None)
+    for i, datos in enumerate(leer_frames(ruta)):
+        if siguiente is None:
+            return
+        if i == siguiente:
+            yield cv2.imdecode(np.frombuffer(datos, np.uint8), cv2.IMREAD_COLOR)
+            siguiente = next(indices, None)
+
+
+class ProcesadorFlujo:
+    """Estima la pose de los frames conforme llegan, en un hilo aparte.
+
+    Los frames se guardan en `ruta_frames` (mismo formato del flujo) y se
+    procesan en orden con un solo `mp_pose.Pose` en modo video. La cola
+    tiene un tamaño máximo: si la inferencia va más lenta que la subida,
+    `enviar` bloquea y la conexión deja de leer datos.
+    """
+
+    def __init__(self, ruta_frames, max_pendientes=64):
+        self.ruta_frames = ruta_frames
+        self.cola = queue.Queue(maxsize=max_pendientes)
+        self.landmarks = []
+        self.indices = []
+        self.dimensiones = (0, 0)
+        self.recibidos = 0
+        self.error = None
+        self.hilo = threading.Thread(target=self._procesar, daemon=True)
+        self.hilo.start()
+
+    def enviar(self, frame, timeout=None):
+        self.cola.put(frame, timeout=timeout)
+
+    def enviar_sin_bloquear(self, frame):
+        """Intenta encolar sin bloquear; devuelve False si la cola está llena."""
+        try:
+            self.cola.put_nowait(frame)
+            return True
+        except queue.Full:
+            return False
+
+    def terminar(self):
+        """Espera a que se procesen todos los frames y devuelve los arreglos."""
+        self.cola.put(None)
+        self.hilo.join()
+        if self.error is not None:
+            raise self.error
+        W, H = self.dimensiones
+        return empaquetar_landmarks(self.landmarks, self.indices,
+                                    np.zeros(len(self.indices)), W, H, 0)
+
+    def _procesar(self):
+        try:
+            with open(self.ruta_frames, "wb") as archivo, mp_pose.Pose(**CONFIG_POSE) as pose:
+                while True:
+                    frame = self.cola.get()
+                    if frame is None:
+                        break
+                    indice = self.recibidos
+                    self.recibidos += 1
+                    archivo.write(CABECERA.pack(len(frame)))
+                    archivo.write(frame)
+
+                    image = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+                    if image is None:
+                        continue
+                    if self.dimensiones == (0, 0):
+                        H, W = image.shape[:2]
+                        self.dimensiones = (W, H)
+                    self.landmarks.append(estimar_pose(pose, image))
+                    self.indices.append(indice)
+        except Exception as e:
+            self.error = e
+            # Descartar el resto del flujo para que `enviar` no quede bloqueado
+            while self.cola.get() is not None:
+                pass
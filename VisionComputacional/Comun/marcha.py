@@ -0,0 +1,75 @@
+# Análisis de la marcha frame a frame para flujos en tiempo real.
+# A diferencia de Comun/analisis.py (videos completos), aquí cada frame se
+# procesa en cuanto llega, con un solo `mp_pose.Pose` en modo video que se
+# conserva durante toda la sesión para aprovechar el seguimiento entre frames.
+
+import numpy as np
+import mediapipe as mp
+
+from Comun.analisis import estimar_pose
+from Comun.cinematica import angulos_articulares, caracteristicas
+from Comun.clasificacion import clasificar_fases
+from Comun.render import dibujar_frame
+
+mp_pose = mp.solutions.pose
+
+# Decimales con los que se envían los landmarks
+DECIMALES = 4
+
+
+class AnalizadorMarcha:
+    """Pose, ángulos y fase de una secuencia de frames de una misma persona.
+
+    Uso:
+        with AnalizadorMarcha() as analizador:
+            resultado = analizador.procesar(frame)
+    """
+
+    def __init__(self, model_complexity=2, min_detection_confidence=0.5):
+        self.pose = mp_pose.Pose(static_image_mode=False,
+                                 model_complexity=model_complexity,
+                                 min_detection_confidence=min_detection_confidence)
+        self.frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+    def cerrar(self):
+        if self.pose is not None:
+            self.pose.close()
+            self.pose = None
+
+    def procesar(self, image, dibujar=False):
+        """Analiza un frame BGR.
+
+        Devuelve un diccionario serializable a JSON con `detectado`,
+        `angulos` (orden de COLUMNAS_ANGULOS), `validos` ([derecho,
+        izquierdo]), `fase` y `landmarks` (33 x [x, y, z, visibility]).
+        Con `dibujar=True` se dibuja además el resultado sobre `image`.
+        """
+        H, W = image.shape[:2]
+        self.frames += 1
+        resultado = {"frame": self.frames, "detectado": False, "angulos": [0] * 6,
+                     "validos": [False, False], "fase": None, "landmarks": None}
+
+        lm = estimar_pose(self.pose, image)
+        if lm is None:
+            if dibujar:
+                dibujar_frame(image, None, False, None, None, None, W, H)
+            return resultado
+
+        angulos, validos = angulos_articulares(lm[None], W, H)
+        fase = None
+        if validos[0, 1]:
+            fase = clasificar_fases(caracteristicas(lm[None], angulos, W, H))[0]
+
+        if dibujar:
+            dibujar_frame(image, lm, True, angulos[0], validos[0], fase, W, H)
+
+        resultado.update(detectado=True, angulos=angulos[0].tolist(),
+                         validos=validos[0].tolist(), fase=fase,
+                         landmarks=np.round(lm.astype(float), DECIMALES).tolist())
+        return resultado
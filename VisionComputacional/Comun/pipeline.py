@@ -0,0 +1,199 @@
+# Captura, inferencia y visualización en tiempo real en etapas separadas.
+# Cada etapa corre en su propio hilo y entre etapas hay un buzón de un solo
+# lugar: si la siguiente etapa va más lenta, el frame viejo se descarta y
+# se reemplaza por el nuevo en lugar de hacer cola. Así la cámara se lee
+# sin parar (el buffer del driver no se llena), la inferencia siempre toma
+# el frame más reciente y la latencia de punta a punta no crece con el
+# tiempo. cv2.imshow se queda en el hilo principal, como pide OpenCV.
+
+import threading
+import time
+
+import cv2
+import mediapipe as mp
+
+from Comun.analisis import CONFIG_POSE
+
+mp_pose = mp.solutions.pose
+
+# Peso de la última medición en los promedios de fps y latencia
+SUAVIZADO = 0.1
+
+TECLA_SALIR = 27  # ESC
+
+
+class Buzon:
+    """Cola de un solo elemento que reemplaza el elemento no leído."""
+
+    def __init__(self):
+        self.condicion = threading.Condition()
+        self.elemento = None
+        self.hay_nuevo = False
+        self.cerrado = False
+        self.descartados = 0
+
+    def poner(self, elemento):
+        with self.condicion:
+            if self.hay_nuevo:
+                self.descartados += 1
+            self.elemento = elemento
+            self.hay_nuevo = True
+            self.condicion.notify()
+
+    def tomar(self, timeout=None):
+        """Devuelve el elemento más reciente, o None si se cerró o pasó el timeout."""
+        with self.condicion:
+            if not self.condicion.wait_for(lambda: self.hay_nuevo or self.cerrado, timeout):
+                return None
+            if not self.hay_nuevo:
+                return None
+            self.hay_nuevo = False
+            return self.elemento
+
+    def cerrar(self):
+        with self.condicion:
+            self.cerrado = True
+            self.condicion.notify_all()
+
+
+class Etapa:
+    """Frames por segundo y latencia (desde la captura) de una etapa."""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.frames = 0
+        self.fps = 0.0
+        self.latencia = 0.0
+        self.latencia_maxima = 0.0
+        self.ultimo = None
+
+    def registrar(self, t_captura):
+        ahora = time.perf_counter()
+        latencia = ahora - t_captura
+        if self.ultimo is not None and ahora > self.ultimo:
+            fps = 1.0 / (ahora - self.ultimo)
+            self.fps = fps if not self.fps else self.fps + SUAVIZADO * (fps - self.fps)
+        self.latencia = latencia if not self.frames else self.latencia + SUAVIZADO * (latencia - self.latencia)
+        self.latencia_maxima = max(self.latencia_maxima, latencia)
+        self.ultimo = ahora
+        self.frames += 1
+
+    def resumen(self):
+        return {"frames": self.frames, "fps": round(self.fps, 1),
+                "latencia_ms": round(1000 * self.latencia, 1),
+                "latencia_maxima_ms": round(1000 * self.latencia_maxima, 1)}
+
+
+class PipelineCamara:
+    """Cámara → `procesar(pose, frame)` → `dibujar(frame, resultado)` → ventana.
+
+    Uso:
+        pipeline = PipelineCamara(procesar, dibujar, titulo="Arcos de movilidad")
+        pipeline.ejecutar()     # hasta ESC o fin del video
+
+    `procesar` corre en el hilo de inferencia con un modelo propio
+    (`mp_pose.Pose`, o lo que devuelva `crear_modelo`) y `dibujar` en el
+    hilo principal sobre el mismo frame que se procesó, así que lo dibujado
+    siempre corresponde a la imagen mostrada.
+    """
+
+    def __init__(self, procesar, dibujar, fuente=0, titulo="Pipeline", config_pose=None,
+                 mostrar_estadisticas=True, crear_modelo=None):
+        self.procesar = procesar
+        self.dibujar = dibujar
+        self.fuente = fuente
+        self.titulo = titulo
+        self.config_pose = config_pose if config_pose is not None else CONFIG_POSE
+        # Fábrica del modelo de pose (por defecto mp_pose.Pose con config_pose)
+        self.crear_modelo = crear_modelo or (lambda: mp_pose.Pose(**self.config_pose))
+        self.mostrar_estadisticas = mostrar_estadisticas
+        self.capturas = Buzon()
+        self.resultados = Buzon()
+        self.etapas = {nombre: Etapa(nombre) for nombre in ("captura", "inferencia", "pantalla")}
+        self.activo = threading.Event()
+        self.error = None
+
+    def _capturar(self, cap):
+        indice = 0
+        try:
+            while self.activo.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                t_captura = time.perf_counter()
+                self.etapas["captura"].registrar(t_captura)
+                self.capturas.poner((indice, t_captura, frame))
+                indice += 1
+        finally:
+            self.capturas.cerrar()
+
+    def _inferir(self):
+        try:
+            with self.crear_modelo() as pose:
+                while True:
+                    elemento = self.capturas.tomar()
+                    if elemento is None:
+                        break
+                    indice, t_captura, frame = elemento
+                    try:
+                        resultado = self.procesar(pose, frame)
+                    except Exception as e:
+                        print(f"Error: {e}")
+                        continue
+                    self.etapas["inferencia"].registrar(t_captura)
+                    self.resultados.poner((indice, t_captura, frame, resultado))
+        except Exception as e:
+            self.error = e
+        finally:
+            self.resultados.cerrar()
+
+    def ejecutar(self):
+        cap = cv2.VideoCapture(self.fuente)
+        if not cap.isOpened():
+            raise RuntimeError("Error al capturar video")
+        # Con un solo frame en el buffer del driver se lee siempre el más nuevo
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self.activo.set()
+        hilos = [threading.Thread(target=self._capturar, args=(cap,), daemon=True),
+                 threading.Thread(target=self._inferir, daemon=True)]
+        for hilo in hilos:
+            hilo.start()
+        try:
+            while True:
+                elemento = self.resultados.tomar()
+                if elemento is None:
+                    break
+                indice, t_captura, frame, resultado = elemento
+                image = self.dibujar(frame, resultado)
+                self.etapas["pantalla"].registrar(t_captura)
+                if self.mostrar_estadisticas:
+                    dibujar_estadisticas(image, self.estadisticas())
+                cv2.imshow(self.titulo, image)
+                if cv2.waitKey(1) & 0xFF == TECLA_SALIR:
+                    break
+        finally:
+            self.activo.clear()
+            for hilo in hilos:
+                hilo.join()
+            cap.release()
+            cv2.destroyAllWindows()
+        if self.error is not None:
+            raise self.error
+        return self.estadisticas()
+
+    def estadisticas(self):
+        resumen = {nombre: etapa.resumen() for nombre, etapa in self.etapas.items()}
+        resumen["descartados"] = {"inferencia": self.capturas.descartados,
+                                  "pantalla": self.resultados.descartados}
+        return resumen
+
+
+def dibujar_estadisticas(image, estadisticas):
+    """Escribe los fps y la latencia de cada etapa en la esquina inferior izquierda."""
+    H = image.shape[0]
+    lineas = [f"{nombre}: {e['fps']:.1f} fps, {e['latencia_ms']:.0f} ms"
+              for nombre, e in estadisticas.items() if nombre != "descartados"]
+    for i, texto in enumerate(reversed(lineas)):
+        cv2.putText(image, texto, (10, H - 10 - 22 * i), cv2.FONT_HERSHEY_PLAIN, 1.4, (0, 0, 255), 2)
+    return image
@@ -0,0 +1,90 @@
+# Pool de modelos de mediapipe reutilizables.
+# Crear un `mp_pose.Pose` carga el grafo de TFLite y es mucho más lento que
+# procesar una imagen, por lo que las APIs crean los modelos una sola vez al
+# iniciar y cada petición toma uno prestado del pool mientras lo usa.
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import mediapipe as mp
+
+mp_pose = mp.solutions.pose
+
+
+class PoolPose:
+    """Conjunto fijo de `mp_pose.Pose` precalentados.
+
+    Los modelos se usan desde hilos de trabajo (run_in_threadpool); `usar`
+    bloquea hasta que haya uno libre, así que nunca se procesan más
+    imágenes a la vez que modelos hay en el pool.
+    """
+
+    def __init__(self, tamano=None, **config):
+        self.tamano = tamano or os.cpu_count() or 1
+        self.config = config
+        self.libres = queue.Queue()
+        self.modelos = []
+        self.en_uso = 0
+        self.en_espera = 0
+        self.atendidas = 0
+        self.lock = threading.Lock()
+        self.lock_inicio = threading.Lock()
+
+    def iniciar(self):
+        """Crea los modelos y procesa una imagen vacía con cada uno."""
+        with self.lock_inicio:
+            if self.modelos:
+                return
+            vacia = np.zeros((256, 256, 3), dtype=np.uint8)
+            for _ in range(self.tamano):
+                pose = mp_pose.Pose(**self.config)
+                pose.process(vacia)
+                self.modelos.append(pose)
+                self.libres.put(pose)
+
+    def cerrar(self):
+        for pose in self.modelos:
+            pose.close()
+        self.modelos = []
+        self.libres = queue.Queue()
+
+    @contextmanager
+    def usar(self, timeout=None):
+        """Presta un modelo del pool durante el bloque `with`."""
+        if not self.modelos:
+            self.iniciar()
+        with self.lock:
+            self.en_espera += 1
+        try:
+            pose = self.libres.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("No hay modelos de pose disponibles")
+        finally:
+            with self.lock:
+                self.en_espera -= 1
+        with self.lock:
+            self.en_uso += 1
+        try:
+            yield pose
+        finally:
+            with self.lock:
+                self.en_uso -= 1
+                self.atendidas += 1
+            self.libres.put(pose)
+
+    def estado(self):
+        with self.lock:
+            en_uso = self.en_uso
+            en_espera = self.en_espera
+            atendidas = self.atendidas
+        return {
+            "tamano": len(self.modelos),
+            "en_uso": en_uso,
+            "disponibles": len(self.modelos) - en_uso,
+            "en_espera": en_espera,
+            "utilizacion": round(en_uso / len(self.modelos), 2) if self.modelos else 0.0,
+            "atendidas": atendidas,
+        }
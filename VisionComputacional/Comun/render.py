@@ -0,0 +1,80 @@
+# Dibujo de los resultados del análisis sobre los frames.
+# Trabaja sólo con arreglos (landmarks, ángulos, fases), por lo que el video
+# anotado puede generarse a partir de landmarks guardados sin volver a pasar
+# los frames por mediapipe.
+
+import cv2
+import numpy as np
+import mediapipe as mp
+from mediapipe.framework.formats import landmark_pb2
+
+from Comun.cinematica import VERTICES, posiciones
+
+mp_pose = mp.solutions.pose
+mp_drawing = mp.solutions.drawing_utils
+
+# Colores y parametros
+CL = (130,140,40)
+CP = (205,218,56)
+CCI, CRI, CTOI = (30,180,200), (30,120,200), (30,60,200)
+CCD, CRD, CTOD = (200,180,30), (200,120,30), (200,60,30)
+font = cv2.FONT_HERSHEY_PLAIN
+text_color = (0, 0, 0)
+T1 = 2
+T2 = T1 + 1
+
+def a_landmark_list(landmarks):
+    """Reconstruye el NormalizedLandmarkList de mediapipe a partir de (33, 4)."""
+    lista = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z, v in np.asarray(landmarks, dtype=float):
+        lista.landmark.add(x=x, y=y, z=z, visibility=v)
+    return lista
+
+def dibujar_fase(image, text, W):
+    """Dibuja el recuadro con la fase de la marcha en la esquina superior."""
+    top_left = (5,5)
+    BCX, BCY = round(W/4.8), round(W/24)
+    bottom_right = (600, BCY)
+
+    (text_width, text_height), baseline = cv2.getTextSize(text, font, T1, T2)
+    center_x = (top_left[0] + bottom_right[0]) // 2
+    center_y = (top_left[1] + bottom_right[1]) // 2
+    text_x = center_x - text_width // 2
+    text_y = center_y + text_height // 2
+
+    cv2.rectangle(image, top_left, bottom_right, (255,255,255), -1)
+    cv2.rectangle(image, top_left, bottom_right, (0,0,0), T2)
+    cv2.putText(image, text, (text_x, text_y), font, T1, text_color, T2)
+
+def dibujar_pose(image, landmarks, angulos, validos, W, H):
+    """Dibuja el esqueleto y los ángulos de los lados válidos de un frame."""
+    CXI, CXD = round(W/55), -round(W/17)
+    puntos = posiciones(landmarks[None], W, H)[0]
+
+    mp_drawing.draw_landmarks(image, a_landmark_list(landmarks), mp_pose.POSE_CONNECTIONS,
+                            mp_drawing.DrawingSpec(CL, T2, T2),
+                            mp_drawing.DrawingSpec(CP, T2, T2))
+
+    # Lado derecho (columnas 0-2) e izquierdo (columnas 3-5)
+    for lado, colores, CX in [(0, [CCD, CRD, CTOD], CXI), (1, [CCI, CRI, CTOI], CXD)]:
+        if not validos[lado]:
+            continue
+        for col, color in zip(range(3*lado, 3*lado + 3), colores):
+            pos = puntos[VERTICES[col]]
+            cv2.circle(image, tuple(pos), T2*2, color, -1)
+            cv2.putText(image, str(angulos[col]), tuple(pos + [CX, -1]), font, T1, color, T2)
+
+def dibujar_frame(image, landmarks, detectado, angulos, validos, fase, W, H):
+    """Dibuja sobre `image` (BGR) todo el resultado de un frame.
+
+    `fase` es None cuando el frame no se clasificó.
+    """
+    if not detectado:
+        cv2.putText(image, "Persona fuera de cuadro", (W//4, H//2),
+               font, 2, (0, 0, 255), 3)
+        return image
+
+    dibujar_pose(image, landmarks, angulos, validos, W, H)
+    if fase is not None:
+        dibujar_fase(image, fase, W)
+    return image
@@ -0,0 +1,288 @@
+# Suavizado temporal de landmarks y fases como una etapa de flujo.
+# Cada frame se procesa en cuanto llega y con un costo constante:
+#   1. RellenoHuecos: los landmarks que faltan (sin persona o con visibilidad
+#      baja) se interpolan entre el último frame válido y el siguiente, si el
+#      hueco dura a lo más `max_hueco` frames. Para eso la salida se retrasa
+#      exactamente `max_hueco` frames.
+#   2. FiltroOneEuro: filtro pasa bajas cuya frecuencia de corte crece con la
+#      velocidad, de modo que quita el temblor de los landmarks quietos sin
+#      atrasar los movimientos rápidos (Casiez et al., 2012).
+#   3. SuavizadorFases: la fase sólo avanza en el orden de la marcha y un
+#      cambio se acepta cuando se repite varios frames seguidos.
+
+from collections import deque
+
+import numpy as np
+
+from Comun.cinematica import UMBRAL_VISIBILIDAD
+
+# Fases de la marcha en el orden del ciclo (etiquetas de Comun/clasificacion.py)
+ORDEN_FASES = [
+    "INITIAL CONTACT", "LOADING RESPONSE", "MID-STANCE", "TERMINAL STANCE",
+    "PRE-SWING", "INITIAL SWING", "MID-SWING", "TERMINAL SWING",
+]
+POSICION_FASE = {fase: i for i, fase in enumerate(ORDEN_FASES)}
+
+CONFIG_SUAVIZADO = dict(
+    max_hueco=5,              # frames máximos que se interpolan (= retraso de la salida)
+    fps=30.0,                 # se usa si el origen no indica sus fps
+    min_corte=1.5,            # Hz, corte del filtro con los landmarks quietos
+    beta=4.0,                 # aumento del corte por unidad de velocidad (coordenadas normalizadas/s)
+    corte_derivada=1.0,       # Hz, corte del filtro de la velocidad
+)
+
+CONFIG_FASES = dict(
+    confirmacion=2,           # frames seguidos para aceptar la fase siguiente
+    max_salto=3,              # fases que se pueden saltar hacia adelante (1 = sólo la siguiente)
+    reinicio=10,              # frames seguidos para aceptar una fase fuera de orden
+    frames_perdida=15,        # frames sin fase tras los que se olvida la fase actual
+)
+
+
+def _alfa(corte, dt):
+    tau = 1.0 / (2 * np.pi * corte)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class FiltroOneEuro:
+    """Filtro One Euro sobre un arreglo de cualquier forma (cada elemento por separado).
+
+    Uso:
+        filtro = FiltroOneEuro()
+        suave = filtro.filtrar(valores, t)    # valores (33, 3), t en segundos
+
+    Los elementos NaN se devuelven como NaN y su filtro se reinicia, para
+    que después de un hueco largo no se arrastre la posición anterior.
+    """
+
+    def __init__(self, **config):
+        self.config = {**CONFIG_SUAVIZADO, **config}
+        self.x = None
+        self.dx = None
+        self.t = None
+
+    def filtrar(self, valores, t):
+        valores = np.asarray(valores, dtype=np.float64)
+        if self.x is None:
+            self.x = valores.copy()
+            self.dx = np.zeros_like(valores)
+            self.t = t
+            return valores.copy()
+
+        dt = t - self.t
+        if dt <= 0:
+            dt = 1.0 / self.config['fps']
+        self.t = t
+
+        nuevos = np.isnan(self.x) & ~np.isnan(valores)
+        dx = (valores - self.x) / dt
+        a_d = _alfa(self.config['corte_derivada'], dt)
+        self.dx = self.dx + a_d * (dx - self.dx)
+        corte = self.config['min_corte'] + self.config['beta'] * np.abs(self.dx)
+        self.x = self.x + _alfa(corte, dt) * (valores - self.x)
+
+        # Reinicio de los elementos que vuelven después de un hueco
+        self.x[nuevos] = valores[nuevos]
+        self.dx[nuevos | np.isnan(self.dx)] = 0.0
+        return self.x.copy()
+
+
+class RellenoHuecos:
+    """Interpola los landmarks faltantes con `max_hueco` frames de anticipación.
+
+    Uso:
+        relleno = RellenoHuecos(max_hueco=5)
+        for t, landmarks in frames:                # landmarks (33, 4) o None
+            for t, landmarks, interpolado in relleno.agregar(t, landmarks):
+                ...
+        for ... in relleno.terminar(): ...
+
+    Un landmark falta cuando el frame no tiene persona o su visibilidad no
+    pasa de UMBRAL_VISIBILIDAD; un frame sin persona se reconstruye completo
+    si a ambos lados del hueco hay frames con persona. `interpolado` (33,)
+    indica qué landmarks se reconstruyeron; los frames de un hueco más largo
+    que `max_hueco` quedan como NaN.
+    """
+
+    def __init__(self, **config):
+        self.config = {**CONFIG_SUAVIZADO, **config}
+        self.max_hueco = self.config['max_hueco']
+        self.pendientes = deque()               # [t, landmarks (33, 4), interpolado (33,)]
+        self.ultimo = np.full((33, 4), np.nan)  # último valor visible de cada landmark
+        self.desde = np.full(33, np.inf)        # frames transcurridos desde ese valor
+        self.ultimo_frame = None                # último frame con persona
+        self.desde_frame = np.inf
+
+    def _interpolar(self, inicio, fin, g, elegir):
+        """Rellena los últimos g frames pendientes entre `inicio` y `fin` (33, 4)."""
+        n = len(self.pendientes)
+        fracciones = np.arange(1, g + 1) / (g + 1)
+        for j, fraccion in zip(range(n - g, n), fracciones):
+            _, landmarks, interpolado = self.pendientes[j]
+            cambiar = elegir(landmarks)
+            landmarks[cambiar] = (inicio + fraccion * (fin - inicio))[cambiar]
+            interpolado[cambiar] = True
+
+    def agregar(self, t, landmarks):
+        presente = landmarks is not None
+        landmarks = (np.array(landmarks, dtype=np.float64) if presente
+                     else np.full((33, 4), np.nan))
+        visibles = landmarks[:, 3] > UMBRAL_VISIBILIDAD
+
+        # Landmarks que vuelven a ser visibles después de un hueco corto
+        huecos = self.desde - 1
+        for i in np.flatnonzero(visibles & (huecos >= 1) & (huecos <= self.max_hueco)):
+            marca = np.zeros(33, dtype=bool)
+            marca[i] = True
+            self._interpolar(self.ultimo, landmarks, int(huecos[i]), lambda _: marca)
+
+        # Frames sin persona entre dos con persona: los landmarks que siguen
+        # sin valor (no visibles a ningún lado del hueco) se interpolan igual
+        if presente:
+            g = self.desde_frame - 1
+            if 1 <= g <= self.max_hueco:
+                self._interpolar(self.ultimo_frame, landmarks, int(g),
+                                 lambda lm: np.isnan(lm[:, 0]))
+            self.ultimo_frame = landmarks.copy()
+            self.desde_frame = 0
+        self.desde_frame += 1
+
+        self.ultimo[visibles] = landmarks[visibles]
+        self.desde += 1
+        self.desde[visibles] = 1
+        self.pendientes.append([t, landmarks, np.zeros(33, dtype=bool)])
+
+        salida = []
+        while len(self.pendientes) > self.max_hueco:
+            salida.append(tuple(self.pendientes.popleft()))
+        return salida
+
+    def terminar(self):
+        """Entrega los frames retenidos (sus huecos finales ya no se pueden cerrar)."""
+        salida = [tuple(p) for p in self.pendientes]
+        self.pendientes.clear()
+        return salida
+
+
+class EtapaSuavizado:
+    """Relleno de huecos + filtro One Euro de los landmarks, frame a frame.
+
+    `agregar(t, landmarks)` devuelve la lista de frames listos, cada uno
+    (t, landmarks (33, 4) o None, interpolado); la salida va `max_hueco`
+    frames detrás de la entrada. Un frame sale como None cuando le faltan
+    todos los landmarks.
+    """
+
+    def __init__(self, **config):
+        self.config = {**CONFIG_SUAVIZADO, **config}
+        self.relleno = RellenoHuecos(**self.config)
+        self.filtro = FiltroOneEuro(**self.config)
+
+    def agregar(self, t, landmarks):
+        return [self._filtrar(*frame) for frame in self.relleno.agregar(t, landmarks)]
+
+    def terminar(self):
+        return [self._filtrar(*frame) for frame in self.relleno.terminar()]
+
+    def _filtrar(self, t, landmarks, interpolado):
+        landmarks[:, :3] = self.filtro.filtrar(landmarks[:, :3], t)
+        if np.isnan(landmarks[:, 3]).all():
+            return t, None, interpolado
+        return t, landmarks, interpolado
+
+
+class SuavizadorFases:
+    """Impone el orden del ciclo de la marcha a las fases predichas.
+
+    Uso:
+        suavizador = SuavizadorFases()
+        fase = suavizador.agregar(fase_predicha)     # None si no hay predicción
+
+    Una fase hasta `max_salto` lugares adelante de la actual se acepta
+    después de `confirmacion` frames seguidos; cualquier otra (hacia atrás o
+    un salto mayor) necesita `reinicio` frames seguidos, lo que permite
+    recuperarse si la fase actual era un error. Las etiquetas que no son
+    fases del ciclo se dejan pasar sin cambios.
+    """
+
+    def __init__(self, **config):
+        self.config = {**CONFIG_FASES, **config}
+        self.actual = None
+        self.candidata = None
+        self.repeticiones = 0
+        self.sin_fase = 0
+
+    def agregar(self, fase):
+        if fase is None or fase not in POSICION_FASE:
+            self.sin_fase += 1
+            if self.sin_fase > self.config['frames_perdida']:
+                self.actual = self.candidata = None
+                self.repeticiones = 0
+            return fase
+        self.sin_fase = 0
+
+        if fase == self.actual:
+            self.candidata = None
+            self.repeticiones = 0
+            return self.actual
+
+        if fase == self.candidata:
+            self.repeticiones += 1
+        else:
+            self.candidata = fase
+            self.repeticiones = 1
+
+        if self.actual is None:
+            necesarias = self.config['confirmacion']
+        else:
+            avance = (POSICION_FASE[fase] - POSICION_FASE[self.actual]) % len(ORDEN_FASES)
+            necesarias = (self.config['confirmacion'] if avance <= self.config['max_salto']
+                          else self.config['reinicio'])
+        if self.repeticiones >= necesarias:
+            self.actual = fase
+            self.candidata = None
+            self.repeticiones = 0
+        # Mientras no hay una fase confirmada se deja pasar la predicción
+        return self.actual if self.actual is not None else fase
+
+
+def suavizar_datos(datos, fps=None, **config):
+    """Aplica EtapaSuavizado a todos los frames de los arreglos de la caché.
+
+    Devuelve una copia de `datos` con los landmarks rellenados y filtrados,
+    `detectado` actualizado (un frame sin persona dentro de un hueco corto
+    pasa a tener landmarks) e `interpolado` (frames, 33). `fps` se usa para
+    el tiempo de cada frame cuando `datos` no trae tiempos.
+    """
+    config = {**CONFIG_SUAVIZADO, **config}
+    indices = datos["indices"]
+    fps = fps or float(datos["fps"]) or config['fps']
+    tiempos = indices / fps
+
+    etapa = EtapaSuavizado(**config)
+    landmarks = np.full(datos["landmarks"].shape, np.nan, dtype=np.float32)
+    detectado = np.zeros(len(indices), dtype=bool)
+    interpolado = np.zeros((len(indices), 33), dtype=bool)
+
+    j = 0
+    def guardar(frames):
+        nonlocal j
+        for _, lm, interp in frames:
+            if lm is not None:
+                landmarks[j] = lm
+                detectado[j] = True
+            interpolado[j] = interp
+            j += 1
+
+    for i in range(len(indices)):
+        lm = datos["landmarks"][i] if datos["detectado"][i] else None
+        guardar(etapa.agregar(tiempos[i], lm))
+    guardar(etapa.terminar())
+
+    return {**datos, "landmarks": landmarks, "detectado": detectado, "interpolado": interpolado}
+
+
+def suavizar_fases(fases, **config):
+    """Aplica SuavizadorFases a una secuencia de fases (arreglo de objetos)."""
+    suavizador = SuavizadorFases(**config)
+    return np.array([suavizador.agregar(f) for f in fases], dtype=object)
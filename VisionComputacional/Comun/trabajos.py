@@ -0,0 +1,136 @@
+# Cola de trabajos en segundo plano para las APIs de video.
+# Los trabajos se ejecutan en un pool de procesos para que la inferencia de
+# pose use varios núcleos y el event loop de FastAPI nunca se bloquee.
+
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Estados posibles de un trabajo
+EN_COLA = "en_cola"
+PROCESANDO = "procesando"
+COMPLETADO = "completado"
+ERROR = "error"
+
+
+class ColaTrabajos:
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.executor = None
+        self.manager = None
+        self.progreso = None
+        self.inicios = None
+        self.trabajos = {}
+        self.lock = threading.Lock()
+
+    def iniciar(self):
+        """Crea el pool de procesos y el diccionario compartido de progreso."""
+        if self.executor is not None:
+            return
+        # "spawn" evita heredar por fork el estado interno de mediapipe
+        contexto = multiprocessing.get_context("spawn")
+        self.manager = contexto.Manager()
+        self.progreso = self.manager.dict()
+        self.inicios = self.manager.dict()
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=contexto)
+
+    def cerrar(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.manager is not None:
+            self.manager.shutdown()
+            self.manager = None
+            self.progreso = None
+            self.inicios = None
+
+    def enviar(self, clave, funcion, *args, **kwargs):
+        """Encola `funcion(*args, progreso=..., clave=clave, **kwargs)`.
+
+        La función debe estar definida a nivel de módulo para poder enviarse
+        a otro proceso.
+        """
+        self.iniciar()
+        with self.lock:
+            self.trabajos[clave] = {
+                "estado": EN_COLA,
+                "creado": time.time(),
+                "fin": None,
+                "error": None,
+                "resultado": None,
+            }
+        future = self.executor.submit(_ejecutar, funcion, self.inicios, clave, args,
+                                      dict(kwargs, progreso=self.progreso, clave=clave))
+        future.add_done_callback(lambda f: self._terminar(clave, f))
+        return future
+
+    def _terminar(self, clave, future):
+        with self.lock:
+            trabajo = self.trabajos.get(clave)
+            if trabajo is None:
+                return
+            trabajo["fin"] = time.time()
+            if future.cancelled():
+                trabajo["estado"] = ERROR
+                trabajo["error"] = "Trabajo cancelado"
+            elif future.exception() is not None:
+                trabajo["estado"] = ERROR
+                trabajo["error"] = str(future.exception())
+            else:
+                trabajo["estado"] = COMPLETADO
+                trabajo["resultado"] = future.result()
+
+    def estado(self, clave):
+        """Devuelve el estado del trabajo con frames procesados, total y ETA."""
+        with self.lock:
+            trabajo = self.trabajos.get(clave)
+            if trabajo is None:
+                return None
+            trabajo = dict(trabajo)
+
+        frames, total = (0, 0)
+        inicio = None
+        if self.progreso is not None:
+            frames, total = self.progreso.get(clave, (0, 0))
+            inicio = self.inicios.get(clave)
+
+        # El trabajo pasa a "procesando" en cuanto un proceso lo toma
+        if trabajo["estado"] == EN_COLA and inicio is not None:
+            trabajo["estado"] = PROCESANDO
+
+        eta = None
+        if trabajo["estado"] == PROCESANDO and frames > 0 and total > frames:
+            transcurrido = time.time() - inicio
+            eta = round(transcurrido / frames * (total - frames), 1)
+        elif trabajo["estado"] == COMPLETADO:
+            eta = 0.0
+
+        return {
+            "estado": trabajo["estado"],
+            "frames_procesados": frames,
+            "total_frames": total,
+            "progreso": round(100 * frames / total, 1) if total else 0.0,
+            "eta_segundos": eta,
+            "error": trabajo["error"],
+        }
+
+    def resultado(self, clave):
+        """Valor que devolvió la función del trabajo (None si no ha terminado)."""
+        with self.lock:
+            trabajo = self.trabajos.get(clave)
+            return trabajo["resultado"] if trabajo is not None else None
+
+    def liberar(self, clave):
+        with self.lock:
+            self.trabajos.pop(clave, None)
+        if self.progreso is not None:
+            self.progreso.pop(clave, None)
+            self.inicios.pop(clave, None)
+
+
+def _ejecutar(funcion, inicios, clave, args, kwargs):
+    # Se ejecuta en el proceso de trabajo; registra cuándo empezó realmente
+    inicios[clave] = time.time()
+    return funcion(*args, **kwargs)
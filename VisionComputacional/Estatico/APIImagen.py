@@ -1,119 +1,91 @@
 # COMANDOS NECESARIOS PARA EJECUTAR, UBICARSE EN:
 # cd NEMI
 # Ejecutar el comando:
-# uvicorn VisionArtificial.Estatico.APIImagen:app
+# uvicorn VisionComputacional.Estatico.APIImagen:app
 
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, File, UploadFile, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import asyncio
 import numpy as np
 import cv2
-import mediapipe as mp
-from io import BytesIO
-
-app = FastAPI()
-
-# Inicializar mediapipe
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
-
-# Configuración de constantes
-CL = (130, 140, 40)        # Color para líneas
-CP = (205, 218, 56)        # Color para puntos
-CCI, CRI, CTOI = (30, 180, 200), (30, 120, 200), (30, 60, 200)  # Colores izquierdos
-CCD, CRD, CTOD = (200, 180, 30), (200, 120, 30), (200, 60, 30)  # Colores derechos
-font = cv2.FONT_HERSHEY_PLAIN
-T1 = 2                     # Grosor texto 1
-T2 = T1 + 1                # Grosor texto 2
-
-# Diccionario de índices de landmarks
-INDICES = {
-    'N': 0, 'H_I': 11, 'H_D': 12, 'C_I': 23, 'C_D': 24,
-    'R_I': 25, 'R_D': 26, 'TO_I': 27, 'TO_D': 28,
-    'TA_I': 29, 'TA_D': 30
-}
-
-# FUNCIÓN PARA CALCULAR ANGULOS
-def angle(a, b, c):
-    ba = a - b
-    bc = c - b
-    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
-    ang = np.degrees(np.arccos(cosine_angle))
-    if ang > 180:
-        ang = ang - 180
-    if ang < 90:
-        ang = 180 - ang
-    ang = abs(round(ang))
-    return ang, b  # Devuelve una tupla (ángulo, punto)
+from io import BytesIO, StringIO
+import os
+import sys
+import csv
+import json
+import time
+import zipfile
 
-def procesar_imagen(img):
+current_dir = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..')))
+# Cliente del servicio de fusión (Fusion/cliente_fusion.py)
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..', '..', 'Fusion')))
+
+from Comun.analisis import estimar_pose
+from Comun.cinematica import COLUMNAS_ANGULOS, angulos_articulares
+from Comun.render import dibujar_frame
+from Comun.marcha import AnalizadorMarcha
+from Comun.pool_pose import PoolPose
+from cliente_fusion import ClienteFusion
+
+# Modelos de mediapipe para imágenes individuales, uno por núcleo; se crean
+# una sola vez al iniciar la API y cada petición toma uno prestado
+pool = PoolPose(static_image_mode=True, model_complexity=2, min_detection_confidence=0.5)
+
+# Hilos para procesar las imágenes de un lote, tantos como modelos en el pool
+executor = ThreadPoolExecutor(max_workers=pool.tamano)
+
+# Límite de imágenes por lote
+MAX_IMAGENES_LOTE = 200
+# Límites de tamaño de cada imagen y del lote ya descomprimidos (bytes)
+MAX_BYTES_IMAGEN = 25 * 1024**2
+MAX_BYTES_LOTE = 500 * 1024**2
+EXTENSIONES_IMAGEN = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Entrada de la visión del servicio de fusión (Fusion/API.py)
+FUSION_URL = "ws://localhost:8002/ws/vision"
+
+@asynccontextmanager
+async def lifespan(app):
+    await run_in_threadpool(pool.iniciar)
+    yield
+    executor.shutdown(wait=False, cancel_futures=True)
+    pool.cerrar()
+
+app = FastAPI(lifespan=lifespan)
+
+def analizar_imagen(img, dibujar=True):
+    """Ángulos de una imagen usando un modelo del pool.
+
+    Devuelve (resultado, imagen anotada); la imagen es None si dibujar=False.
+    """
     # Obtener dimensiones del frame
     H, W, _ = img.shape
-    CXI, CXD = round(W/55), -round(W/17)
-
-    with mp_pose.Pose(static_image_mode=True, 
-                     model_complexity=2, 
-                     min_detection_confidence=0.5) as pose:
-        
-        image_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        results = pose.process(image_rgb)
-        image = img.copy()
-
-        # Verificar si se detectó una persona
-        if results.pose_landmarks is None:
-            cv2.putText(image, "Persona fuera de cuadro", (W//4, H//2), 
-                       font, 2, (0, 0, 255), 3)
-        else:
-            try:
-                landmarks = results.pose_landmarks.landmark
-
-                # Obtener puntos relevantes
-                puntos = {}
-                for k, i in INDICES.items():
-                    puntos[k] = np.multiply([landmarks[i].x, landmarks[i].y], [W, H]).astype(int)
-
-                # Dibujar pose
-                mp_drawing.draw_landmarks(
-                    image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                    mp_drawing.DrawingSpec(CL, T2, T2),
-                    mp_drawing.DrawingSpec(CP, T2, T2)
-                )
-
-                # Procesar lado derecho
-                if all(landmarks[i].visibility > 0.5 for i in [24, 26, 28]):
-                    DCD_ang, DCD_pos = angle(puntos['H_D'], puntos['C_D'], puntos['R_D'])
-                    DRD_ang, DRD_pos = angle(puntos['C_D'], puntos['R_D'], puntos['TO_D'])
-                    DTOD_ang, DTOD_pos = angle(puntos['R_D'], puntos['TO_D'], puntos['TA_D'])
-                    
-                    DRD_ang = 180 - DRD_ang
-                    DTOD_ang = 180 - (DTOD_ang - 45)
-
-                    # Dibujar ángulos derecho
-                    for ang, pos, color in zip([DCD_ang, DRD_ang, DTOD_ang],
-                                            [DCD_pos, DRD_pos, DTOD_pos],
-                                            [CCD, CRD, CTOD]):
-                        cv2.circle(image, pos, T2*2, color, -1)
-                        cv2.putText(image, str(ang), pos + [CXI, -1], font, T1, color, T2)
-
-                # Procesar lado izquierdo
-                if all(landmarks[i].visibility > 0.5 for i in [23, 25, 27]):
-                    DCI_ang, DCI_pos = angle(puntos['H_I'], puntos['C_I'], puntos['R_I'])
-                    DRI_ang, DRI_pos = angle(puntos['C_I'], puntos['R_I'], puntos['TO_I'])
-                    DTOI_ang, DTOI_pos = angle(puntos['R_I'], puntos['TO_I'], puntos['TA_I'])
-                    
-                    DRI_ang = 180 - DRI_ang
-                    DTOI_ang = 180 - (DTOI_ang - 45)
-
-                    # Dibujar ángulos izquierdo
-                    for ang, pos, color in zip([DCI_ang, DRI_ang, DTOI_ang],
-                                            [DCI_pos, DRI_pos, DTOI_pos],
-                                            [CCI, CRI, CTOI]):
-                        cv2.circle(image, pos, T2*2, color, -1)
-                        cv2.putText(image, str(ang), pos + [CXD, -1], font, T1, color, T2)
-
-            except Exception as e:
-                return None, f"Error {str(e)}"
 
+    with pool.usar() as pose:
+        lm = estimar_pose(pose, img)
+
+    resultado = {"detectado": lm is not None, "angulos": [0] * 6, "validos": [False, False]}
+    angulos = validos = None
+    if lm is not None:
+        angulos, validos = angulos_articulares(lm[None], W, H)
+        angulos, validos = angulos[0], validos[0]
+        resultado.update(angulos=angulos.tolist(), validos=validos.tolist())
+
+    image = None
+    if dibujar:
+        image = dibujar_frame(img.copy(), lm, lm is not None, angulos, validos, None, W, H)
+    return resultado, image
+
+def procesar_imagen(img):
+    try:
+        _, image = analizar_imagen(img)
+    except Exception as e:
+        return None, f"Error {str(e)}"
     return image, None
 
 @app.post("/Arcos_Movilidad/")
@@ -122,11 +94,193 @@ async def endpoint_procesar_imagen(file: UploadFile = File(...)):
     np_img = np.frombuffer(contents, np.uint8)
     img = cv2.imdecode(np_img, cv2.IMREAD_COLOR)
     
-    result_img, error = procesar_imagen(img)
+    if img is None:
+        return {"error": "No se pudo decodificar la imagen"}
+
+    # La inferencia se ejecuta en un hilo para no bloquear el event loop
+    result_img, error = await run_in_threadpool(procesar_imagen, img)
 
     if error:
         return {"error": error}
 
     # Codificar imagen como JPEG
     _, img_encoded = cv2.imencode(".jpg", result_img)
-    return StreamingResponse(BytesIO(img_encoded.tobytes()), media_type="image/jpeg")
\ No newline at end of file
+    return StreamingResponse(BytesIO(img_encoded.tobytes()), media_type="image/jpeg")
+
+def _leer_lote(archivos):
+    # Lista de (nombre, bytes) con las imágenes subidas; `archivos` son pares
+    # (nombre, archivo abierto) y los .zip se expanden sin cargarlos completos.
+    # Los límites se revisan conforme se lee cada imagen, y cada lectura se
+    # corta en el límite, también por si un zip declara un tamaño falso
+    imagenes = []
+    total = 0
+
+    def verificar(nombre, tamano):
+        if len(imagenes) >= MAX_IMAGENES_LOTE:
+            raise HTTPException(status_code=400,
+                                detail=f"El lote excede el máximo de {MAX_IMAGENES_LOTE} imágenes")
+        if tamano > MAX_BYTES_IMAGEN:
+            raise HTTPException(status_code=400, detail=f"La imagen {nombre} excede el tamaño máximo")
+        if total + tamano > MAX_BYTES_LOTE:
+            raise HTTPException(status_code=400, detail="El lote excede el tamaño máximo")
+
+    for nombre, archivo in archivos:
+        if not nombre.lower().endswith('.zip'):
+            verificar(nombre, 0)
+            datos = archivo.read(MAX_BYTES_IMAGEN + 1)
+            verificar(nombre, len(datos))
+            imagenes.append((nombre, datos))
+            total += len(datos)
+            continue
+        try:
+            with zipfile.ZipFile(archivo) as z:
+                for info in z.infolist():
+                    if info.is_dir() or info.filename.startswith('__MACOSX/'):
+                        continue
+                    if not info.filename.lower().endswith(EXTENSIONES_IMAGEN):
+                        continue
+                    verificar(info.filename, info.file_size)
+                    with z.open(info) as f:
+                        datos = f.read(MAX_BYTES_IMAGEN + 1)
+                    verificar(info.filename, len(datos))
+                    imagenes.append((info.filename, datos))
+                    total += len(datos)
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError):
+            raise HTTPException(status_code=400, detail=f"Archivo zip inválido: {nombre}")
+    return imagenes
+
+def _procesar_lote(nombre, contenido, dibujar):
+    img = cv2.imdecode(np.frombuffer(contenido, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return {"imagen": nombre, "error": "No se pudo decodificar la imagen"}, None
+    resultado, image = analizar_imagen(img, dibujar)
+    resultado = {"imagen": nombre, **resultado, "error": None}
+    if image is None:
+        return resultado, None
+    _, img_encoded = cv2.imencode(".jpg", image)
+    return resultado, img_encoded.tobytes()
+
+def _csv_lote(resultados):
+    # Los lados no visibles quedan vacíos
+    salida = StringIO()
+    writer = csv.writer(salida)
+    writer.writerow(['Image', 'Person', *COLUMNAS_ANGULOS, 'Error'])
+    for r in resultados:
+        if r["error"]:
+            writer.writerow([r["imagen"], '', *[''] * 6, r["error"]])
+            continue
+        angulos = [a if r["validos"][i // 3] else '' for i, a in enumerate(r["angulos"])]
+        writer.writerow([r["imagen"], int(r["detectado"]), *angulos, ''])
+    return salida.getvalue()
+
+@app.post("/Arcos_Movilidad/lote/")
+async def endpoint_procesar_lote(files: List[UploadFile] = File(...), formato: str = "json",
+                                 imagenes: bool = False):
+    """Analiza varias imágenes (o uno o más .zip con imágenes) en una petición.
+
+    Las imágenes se procesan en paralelo con los modelos del pool. Devuelve
+    los ángulos de cada imagen como JSON o CSV (`formato`); con
+    `imagenes=true` se devuelve un zip con ese archivo y las imágenes
+    anotadas en JPEG.
+    """
+    if formato not in ("json", "csv"):
+        raise HTTPException(status_code=400, detail="El formato debe ser 'json' o 'csv'")
+
+    if len(files) > MAX_IMAGENES_LOTE:
+        raise HTTPException(status_code=400,
+                            detail=f"El lote excede el máximo de {MAX_IMAGENES_LOTE} imágenes")
+    # Los archivos subidos ya están en disco (o en memoria si son pequeños);
+    # se leen por partes, sin copiar cada uno completo a memoria
+    lote = await run_in_threadpool(_leer_lote, [(file.filename or "", file.file) for file in files])
+    if not lote:
+        raise HTTPException(status_code=400, detail="No se recibieron imágenes")
+
+    # Se envía todo el lote a la vez; el pool limita cuántas se procesan en paralelo
+    loop = asyncio.get_running_loop()
+    salidas = await asyncio.gather(*[
+        loop.run_in_executor(executor, _procesar_lote, nombre, contenido, imagenes)
+        for nombre, contenido in lote])
+    resultados = [resultado for resultado, _ in salidas]
+
+    if formato == "csv":
+        contenido, media_type, nombre_salida = _csv_lote(resultados), "text/csv", "resultados.csv"
+    else:
+        contenido = json.dumps({"total": len(resultados), "imagenes": resultados})
+        media_type, nombre_salida = "application/json", "resultados.json"
+
+    if not imagenes:
+        return Response(contenido, media_type=media_type)
+
+    # Zip con los resultados y las imágenes anotadas
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr(nombre_salida, contenido)
+        for i, (resultado, imagen) in enumerate(salidas):
+            if imagen is not None:
+                # Los JPEG ya están comprimidos; se guardan sin volver a comprimir.
+                # El índice evita choques entre a/x.png y b/x.png o x.png y x.jpg
+                base = os.path.basename(os.path.splitext(resultado["imagen"])[0])
+                z.writestr(f"anotadas/{i:03d}_{base}.jpg", imagen, compress_type=zipfile.ZIP_STORED)
+    return Response(buffer.getvalue(), media_type="application/zip",
+                    headers={"Content-Disposition": "attachment; filename=lote.zip"})
+
+@app.get("/health")
+async def health():
+    return {"estado": "ok", "pool": pool.estado()}
+
+@app.websocket("/ws/Arcos_Movilidad/")
+async def endpoint_tiempo_real(websocket: WebSocket, overlay: bool = False, fusion: bool = False):
+    """Análisis en tiempo real sobre una conexión persistente.
+
+    El cliente envía cada frame como un mensaje binario (imagen JPEG o PNG)
+    y por cada uno recibe un mensaje de texto con el JSON de
+    AnalizadorMarcha.procesar. Con `?overlay=true` después del JSON se envía
+    además la imagen anotada como mensaje binario (JPEG). El tracker de
+    mediapipe se conserva durante toda la conexión. Con `?fusion=true` los
+    ángulos y la fase de cada frame se envían también al servicio de fusión
+    (FUSION_URL), con la hora de llegada del frame como tiempo. Un mensaje
+    de texto o una imagen que no se puede decodificar recibe un JSON con
+    "error" y la conexión sigue abierta.
+    """
+    await websocket.accept()
+    analizador = await run_in_threadpool(AnalizadorMarcha)
+    cliente = ClienteFusion(FUSION_URL) if fusion else None
+
+    def procesar(contents):
+        try:
+            img = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+        except cv2.error:
+            img = None
+        if img is None:
+            return {"error": "No se pudo decodificar la imagen"}, None
+        resultado = analizador.procesar(img, dibujar=overlay)
+        if not overlay:
+            return resultado, None
+        _, img_encoded = cv2.imencode(".jpg", img)
+        return resultado, img_encoded.tobytes()
+
+    try:
+        while True:
+            mensaje = await websocket.receive()
+            if mensaje["type"] == "websocket.disconnect":
+                break
+            contents = mensaje.get("bytes")
+            if contents is None:
+                await websocket.send_json({"error": "Se esperaba un frame binario (imagen JPEG o PNG)"})
+                continue
+            llegada = time.time()
+            resultado, imagen = await run_in_threadpool(procesar, contents)
+            if cliente is not None and resultado.get("detectado"):
+                cliente.enviar({"t": llegada, "angulos": resultado["angulos"],
+                                "validos": resultado["validos"], "fase": resultado["fase"]})
+            await websocket.send_json(resultado)
+            if imagen is not None:
+                await websocket.send_bytes(imagen)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        try:
+            analizador.cerrar()
+        finally:
+            if cliente is not None:
+                await cliente.cerrar()
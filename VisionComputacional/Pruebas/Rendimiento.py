@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import mediapipe as mp
+
+current_dir = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..')))
+
+from Comun.adaptativo import EstimadorAdaptativo
+from Comun.analisis import CONFIG_POSE
+from Comun.cinematica import COLUMNAS_ANGULOS, angulos_articulares
+
+mp_pose = mp.solutions.pose
+
+# Video de prueba y número máximo de frames
+RUTA_VIDEO = "prueba_marcha.mp4"
+MAX_FRAMES = 300
+
+# Escalar los frames a esta resolución (por ejemplo (1920, 1080)); None = original
+RESOLUCION = None
+
+# FPS objetivo del modo con complejidad adaptativa
+OBJETIVO_FPS = 30
+
+
+def leer_frames():
+    cap = cv2.VideoCapture(RUTA_VIDEO)
+    frames = []
+    while len(frames) < MAX_FRAMES:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if RESOLUCION is not None:
+            frame = cv2.resize(frame, RESOLUCION, interpolation=cv2.INTER_LINEAR)
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    cap.release()
+    return frames
+
+
+def medir(nombre, modelo, frames):
+    """Landmarks (frames, 33, 4) con NaN donde no hubo persona, y segundos por frame."""
+    landmarks = np.full((len(frames), 33, 4), np.nan, dtype=np.float32)
+    with modelo as pose:
+        # El primer frame incluye la carga del modelo y no se mide
+        pose.process(frames[0])
+        inicio = time.perf_counter()
+        for i, frame in enumerate(frames):
+            results = pose.process(frame)
+            if results.pose_landmarks is not None:
+                landmarks[i] = [[l.x, l.y, l.z, l.visibility] for l in results.pose_landmarks.landmark]
+        duracion = (time.perf_counter() - inicio) / len(frames)
+        if isinstance(pose, EstimadorAdaptativo):
+            print(f"  {nombre}: {pose.estadisticas()}")
+    return landmarks, duracion
+
+
+def main():
+    frames = leer_frames()
+    if not frames:
+        print(f"No se pudieron leer frames de {RUTA_VIDEO}")
+        return
+    H, W = frames[0].shape[:2]
+    print(f"{len(frames)} frames de {W}x{H}\n")
+
+    complejidad = CONFIG_POSE['model_complexity']
+    modos = [
+        ("Frame completo", mp_pose.Pose(**CONFIG_POSE)),
+        ("Recorte de región", EstimadorAdaptativo(complejidades=(complejidad,))),
+        ("Recorte + complejidad adaptativa", EstimadorAdaptativo(objetivo_fps=OBJETIVO_FPS)),
+    ]
+    resultados = [(nombre, *medir(nombre, modelo, frames)) for nombre, modelo in modos]
+
+    referencia, tiempo_referencia = resultados[0][1], resultados[0][2]
+    angulos_ref, validos_ref = angulos_articulares(np.nan_to_num(referencia), W, H)
+    detectados_ref = ~np.isnan(referencia[:, 0, 0])
+
+    print(f"\n{'Modo':<34}{'ms/frame':>10}{'fps':>8}{'aceleración':>13}{'detección':>11}{'error medio (°)':>17}")
+    for nombre, landmarks, tiempo in resultados:
+        angulos, validos = angulos_articulares(np.nan_to_num(landmarks), W, H)
+        detectados = ~np.isnan(landmarks[:, 0, 0])
+        coincidencia = np.mean(detectados == detectados_ref) * 100
+        # Error de cada ángulo respecto al frame completo, en los frames válidos para ambos
+        ambos = np.repeat(validos & validos_ref & (detectados & detectados_ref)[:, None], 3, axis=1)
+        errores = np.abs(angulos - angulos_ref)[ambos]
+        error = errores.mean() if len(errores) else float('nan')
+        print(f"{nombre:<34}{1000 * tiempo:>10.1f}{1 / tiempo:>8.1f}"
+              f"{tiempo_referencia / tiempo:>12.2f}x{coincidencia:>10.1f}%{error:>17.2f}")
+
+    # Detalle por ángulo del último modo
+    nombre, landmarks, _ = resultados[-1]
+    angulos, validos = angulos_articulares(np.nan_to_num(landmarks), W, H)
+    print(f"\nError por ángulo ({nombre}):")
+    for col, columna in enumerate(COLUMNAS_ANGULOS):
+        ambos = validos[:, col // 3] & validos_ref[:, col // 3]
+        if ambos.any():
+            print(f"  {columna}: {np.abs(angulos[ambos, col] - angulos_ref[ambos, col]).mean():.2f}°")
+
+
+if __name__ == "__main__":
+    main()
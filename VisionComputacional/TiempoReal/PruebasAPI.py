@@ -1,57 +1,76 @@
 import cv2
+import os
+import sys
+import json
 import numpy as np
-import requests
-from io import BytesIO
-
-# Configuración de la API
-API_URL = "http://127.0.0.1:8000/Arcos_Movilidad/"
-
-def procesar_frame_con_api(frame):
-    """Envía un frame a la API y devuelve el resultado procesado"""
-    # Codificar el frame como JPEG
-    _, img_encoded = cv2.imencode(".jpg", frame)
-    bytes_imagen = BytesIO(img_encoded.tobytes())
-    
-    # Enviar a la API
-    files = {"file": ("frame.jpg", bytes_imagen, "image/jpeg")}
-    try:
-        response = requests.post(API_URL, files=files)
-        
-        if response.status_code == 200:
-            # Convertir la respuesta a imagen
-            img_array = np.frombuffer(response.content, np.uint8)
-            return cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-        else:
-            print(f"Error en la API: {response.status_code}")
-            return None
-    except Exception as e:
-        print(f"Error al conectar con la API: {str(e)}")
+from websockets.sync.client import connect
+
+current_dir = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..')))
+
+from Comun.render import dibujar_frame
+
+# Configuración de la API (conexión WebSocket persistente)
+API_URL = "ws://127.0.0.1:8000/ws/Arcos_Movilidad/"
+
+# True: la API devuelve también la imagen anotada
+# False: la API sólo devuelve el JSON y el dibujo se hace localmente
+OVERLAY = False
+
+# Calidad JPEG de los frames enviados
+CALIDAD_JPEG = 80
+
+def procesar_frame_con_api(websocket, frame):
+    """Envía un frame por la conexión abierta y devuelve la imagen a mostrar"""
+    _, img_encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, CALIDAD_JPEG])
+    websocket.send(img_encoded.tobytes())
+
+    resultado = json.loads(websocket.recv())
+    if "error" in resultado:
+        print(f"Error en la API: {resultado['error']}")
         return None
 
+    if OVERLAY:
+        img_array = np.frombuffer(websocket.recv(), np.uint8)
+        return cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+
+    # Dibujar el resultado sobre el frame original
+    H, W = frame.shape[:2]
+    landmarks = None
+    if resultado["detectado"]:
+        landmarks = np.array(resultado["landmarks"], dtype=np.float32)
+    return dibujar_frame(frame, landmarks, resultado["detectado"], resultado["angulos"],
+                         resultado["validos"], resultado["fase"], W, H)
+
 # Iniciar captura de video
 cap = cv2.VideoCapture(0)
 if not cap.isOpened():
     print("Error al abrir la cámara")
     exit()
 
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        print("Error al capturar frame")
-        break
-
-    # Procesar cada frame con la API
-    resultado = procesar_frame_con_api(frame)
-    
-    # Mostrar el frame procesado o el original si hay error
-    if resultado is not None:
-        cv2.imshow("Arcos de movilidad - API", resultado)
-    else:
-        cv2.imshow("Arcos de movilidad - API", frame)
-    
-    # Salir con ESC
-    if cv2.waitKey(1) & 0xFF == 27:
-        break
+url = f"{API_URL}?overlay={str(OVERLAY).lower()}"
+try:
+    with connect(url, max_size=None) as websocket:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                print("Error al capturar frame")
+                break
+
+            # Procesar cada frame con la API
+            resultado = procesar_frame_con_api(websocket, frame)
+
+            # Mostrar el frame procesado o el original si hay error
+            if resultado is not None:
+                cv2.imshow("Arcos de movilidad - API", resultado)
+            else:
+                cv2.imshow("Arcos de movilidad - API", frame)
+
+            # Salir con ESC
+            if cv2.waitKey(1) & 0xFF == 27:
+                break
+except Exception as e:
+    print(f"Error al conectar con la API: {str(e)}")
 
 cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+cv2.destroyAllWindows()
@@ -1,82 +1,59 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.responses import FileResponse
-import cv2
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import asyncio
 import os
-import mediapipe as mp
-import numpy as np
-import csv
-from joblib import load
+import sys
+import shutil
 import tempfile
 import uuid
 from typing import Dict
 
-app = FastAPI()
-
-# Diccionario para almacenar las sesiones de procesamiento
-processing_sessions: Dict[str, dict] = {}
-
 # CARGAR ARCHIVOS
 current_dir = os.path.dirname(__file__)
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..')))
 
-# Modelo y scaler
-model_path = os.path.join(current_dir, '..', 'ModelosML', 'PrediccionEtapas.joblib')
-model = load(model_path)
-scaler_path = os.path.join(current_dir, '..', 'ModelosML', 'Scaler.joblib')
-scaler = load(scaler_path)
-scaler.feature_names_in_ = None
+from Comun.analisis import analizar_video, generar_video
+from Comun.trabajos import ColaTrabajos, COMPLETADO, ERROR
+from Comun.cache_landmarks import CacheLandmarks
 
-# INICIALIZAR MEDIAPIPE
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+# Cola de procesamiento; cada video se analiza en un proceso independiente
+cola = ColaTrabajos()
 
-# Colores y parametros
-CL = (130,140,40)
-CP = (205,218,56)
-CCI, CRI, CTOI = (30,180,200), (30,120,200), (30,60,200)
-CCD, CRD, CTOD = (200,180,30), (200,120,30), (200,60,30)
-font = cv2.FONT_HERSHEY_PLAIN
-text_color = (0, 0, 0)
-T1 = 2
-T2 = T1 + 1
+# Landmarks de los videos ya analizados; un video que se vuelve a subir no
+# pasa otra vez por mediapipe (se descartan los menos usados al pasar de 2 GB)
+cache = CacheLandmarks(os.path.join(tempfile.gettempdir(), "nemi_landmarks"), max_bytes=2 * 1024**3)
 
-# Diccionario de índices
-indices = {
-    'N': 0, 'H_I': 11, 'H_D': 12, 'C_I': 23, 'C_D': 24,
-    'R_I': 25, 'R_D': 26, 'TO_I': 27, 'TO_D': 28,
-    'TA_I': 29, 'TA_D': 30
-}
+@asynccontextmanager
+async def lifespan(app):
+    cola.iniciar()
+    yield
+    cola.cerrar()
 
-# Diccionario para cambiar etiquetas
-mapa_etiquetas = {
-    "CONTACTO INICIAL": "INITIAL CONTACT",
-    "RESPUESTA A LA CARGA": "LOADING RESPONSE",
-    "APOYO MEDIO": "MID-STANCE",
-    "APOYO FINAL": "TERMINAL STANCE",
-    "PRE OSCILACION": "PRE-SWING",
-    "OSCILACION INICIAL": "INITIAL SWING",
-    "OSCILACION MEDIA": "MID-SWING",
-    "OSCILACION FINAL": "TERMINAL SWING",
-}
+app = FastAPI(lifespan=lifespan)
 
-# FUNCIÓN PARA CALCULAR ANGULOS
-def angle(a, b, c):
-    ba = a - b
-    bc = c - b
-    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
-    ang = np.degrees(np.arccos(cosine_angle))
-    if ang > 180:
-        ang = ang - 180
-    if ang < 90:
-        ang = 180 - ang
-    ang = abs(round(ang))
-    return ang, b
+# Diccionario para almacenar las sesiones de procesamiento
+processing_sessions: Dict[str, dict] = {}
+
+def verificar_sesion(session_id: str):
+    if session_id not in processing_sessions:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+
+    estado = cola.estado(session_id)
+    if estado is not None and estado["estado"] == ERROR:
+        raise HTTPException(status_code=500, detail=f"Error al procesar el video: {estado['error']}")
+    if estado is not None and estado["estado"] != COMPLETADO:
+        raise HTTPException(status_code=409, detail="El video aún se está procesando")
 
 @app.post("/analizar_video/")
-async def process_video(file: UploadFile = File(...)):
+async def process_video(file: UploadFile = File(...), segmentos: int = 1, renderizar: bool = True,
+                        suavizar: bool = True):
     # Validar que es un video
     if not file.content_type.startswith('video/'):
         raise HTTPException(status_code=400, detail="El archivo debe ser un video")
+    # Cada tramo es un proceso con su propio modelo de mediapipe
+    segmentos = max(1, min(segmentos, os.cpu_count() or 1))
     
     # Crear un ID único para esta sesión
     session_id = str(uuid.uuid4())
@@ -89,155 +66,59 @@ async def process_video(file: UploadFile = File(...)):
     
     # Guardar el archivo subido
     with open(input_path, "wb") as buffer:
-        buffer.write(await file.read())
-    
-    # Configurar la captura de video
-    cap = cv2.VideoCapture(input_path)
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    frames = 0
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    W = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    H = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    out = cv2.VideoWriter(output_path, fourcc, fps, (W, H))
-    
-    # Procesamiento del video
-    with mp_pose.Pose(static_image_mode=False, model_complexity=2, min_detection_confidence=0.5) as pose:
-        with open(csv_path, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['Time [s]','Phase', 'Hip Joint Angle (R)','Knee Joint Angle (R)','Ankle Joint Angle (R)',
-                             'Hip Joint Angle (L)','Knee Joint Angle (L)','Ankle Joint Angle (L)'])
-            
-            while cap.isOpened():
-                ret, image = cap.read()
-                if not ret:
-                    break
-                frames += 1
-                if frames % int(total_frames*0.05) == 0:
-                    print(f"Progreso: {frames}/{total_frames} frames ({100*frames/total_frames:.0f}%)")   
-
-                ts = cap.get(cv2.CAP_PROP_POS_MSEC)
-                ts = round(ts/1000, 2)
-                
-                CXI, CXD = round(W/55), -round(W/17)
-                top_left = (5,5)
-                BCX, BCY = round(W/4.8), round(W/24)
-                TX, TY = round(W/120), round(W/38)
-                bottom_right = (600, BCY)
-
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                results = pose.process(image_rgb)
-                image = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
-
-                if results.pose_landmarks is None:
-                    cv2.putText(image, "Persona fuera de cuadro", (W//4, H//2), 
-                           font, 2, (0, 0, 255), 3)
-                    writer.writerow([ts, "NO PERSON", 0, 0, 0, 0, 0, 0])
-                else:
-                    try:
-                        landmarks = results.pose_landmarks.landmark
-                        
-                        puntos = {}
-                        for k, i in indices.items():
-                            puntos[k] = np.multiply([landmarks[i].x, landmarks[i].y], [W, H]).astype(int)
-
-                        mp_drawing.draw_landmarks(image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                                                mp_drawing.DrawingSpec(CL, T2, T2),
-                                                mp_drawing.DrawingSpec(CP, T2, T2))
-
-                        DCD_ang, DRD_ang, DTOD_ang = 0, 0, 0
-                        DCI_ang, DRI_ang, DTOI_ang = 0, 0, 0
-
-                        if all(landmarks[i].visibility > 0.5 for i in [24, 26, 28]):
-                            DCD_ang, DCD_pos = angle(puntos['H_D'], puntos['C_D'], puntos['R_D'])
-                            DRD_ang, DRD_pos = angle(puntos['C_D'], puntos['R_D'], puntos['TO_D'])
-                            DTOD_ang, DTOD_pos = angle(puntos['R_D'], puntos['TO_D'], puntos['TA_D'])
-                            DRD_ang = 180 - DRD_ang
-                            DTOD_ang = 180 - (DTOD_ang - 45)
-
-                            for ang, pos, color in zip([DCD_ang, DRD_ang, DTOD_ang], 
-                                                    [DCD_pos, DRD_pos, DTOD_pos], 
-                                                    [CCD, CRD, CTOD]):
-                                cv2.circle(image, pos, T2*2, color, -1)
-                                cv2.putText(image, str(ang), np.array(pos) + [CXI, -1], font, T1, color, T2)
-
-                        if all(landmarks[i].visibility > 0.5 for i in [23, 25, 27]):
-                            DCI_ang, DCI_pos = angle(puntos['H_I'], puntos['C_I'], puntos['R_I'])
-                            DRI_ang, DRI_pos = angle(puntos['C_I'], puntos['R_I'], puntos['TO_I'])
-                            DTOI_ang, DTOI_pos = angle(puntos['R_I'], puntos['TO_I'], puntos['TA_I'])
-                            DRI_ang = 180 - DRI_ang
-                            DTOI_ang = 180 - (DTOI_ang - 45)
-
-                            for ang, pos, color in zip([DCI_ang, DRI_ang, DTOI_ang], 
-                                                    [DCI_pos, DRI_pos, DTOI_pos], 
-                                                    [CCI, CRI, CTOI]):
-                                cv2.circle(image, pos, T2*2, color, -1)
-                                cv2.putText(image, str(ang), np.array(pos) + [CXD, -1], font, T1, color, T2)
-
-                            if puntos['N'][0] > puntos['C_I'][0]:  
-                                dif_ac = DCI_ang - DCD_ang
-                                dif_ar = DRI_ang - DRD_ang
-                                dif_at = DTOI_ang - DTOD_ang
-                                dif_pcy = landmarks[23].y - landmarks[24].y
-                                dif_pry = landmarks[25].y - landmarks[26].y
-                                dif_pty = landmarks[27].y - landmarks[28].y
-                            else:  
-                                dif_ac = DCD_ang - DCI_ang
-                                dif_ar = DRD_ang - DRI_ang
-                                dif_at = DTOD_ang - DTOI_ang
-                                dif_pcy = landmarks[24].y - landmarks[23].y
-                                dif_pry = landmarks[26].y - landmarks[25].y
-                                dif_pty = landmarks[28].y - landmarks[27].y
-
-                            dif_pcx = landmarks[23].x - landmarks[24].x
-                            dif_prx = landmarks[25].x - landmarks[26].x
-                            dif_ptx = landmarks[27].x - landmarks[28].x
-
-                            X = [[dif_ac, dif_ar, dif_at, dif_pcx, dif_pcy, dif_prx, dif_pry, dif_ptx, dif_pty]]
-                            X = scaler.transform(X)
-                            y_pred = model.predict(X)
-                            text = [mapa_etiquetas.get(label, label) for label in y_pred][0]
-
-                            (text_width, text_height), baseline = cv2.getTextSize(text, font, T1, T2)
-                            center_x = (top_left[0] + bottom_right[0]) // 2
-                            center_y = (top_left[1] + bottom_right[1]) // 2
-                            text_x = center_x - text_width // 2
-                            text_y = center_y + text_height // 2
-
-                            cv2.rectangle(image, top_left, bottom_right, (255,255,255), -1)
-                            cv2.rectangle(image, top_left, bottom_right, (0,0,0), T2)
-                            cv2.putText(image, text, (text_x, text_y), font, T1, text_color, T2)
-
-                            writer.writerow([ts, text, DCD_ang, DRD_ang, DTOD_ang, 
-                                            DCI_ang, DRI_ang, DTOI_ang])
-
-                    except Exception as e:
-                        print(f"Error: {e}")
-
-                out.write(image)
-
-    # Liberar recursos
-    cap.release()
-    out.release()
-    cv2.destroyAllWindows()
+        await run_in_threadpool(shutil.copyfileobj, file.file, buffer)
     
     # Almacenar información de la sesión
     processing_sessions[session_id] = {
         "temp_dir": temp_dir,
+        "input_video": input_path,
         "processed_video": output_path,
-        "csv_file": csv_path
+        "csv_file": csv_path,
+        "suavizar": suavizar,
+        "segmentos": segmentos,
+        "render": None
     }
+
+    # Encolar el análisis; la respuesta no espera a que termine. Con
+    # segmentos > 1 el video se divide en tramos analizados en paralelo (a lo
+    # más uno por núcleo; el resultado es aproximado, ver landmarks_video) y con
+    # renderizar=False sólo se genera el CSV (el video se genera al descargarlo).
+    # Con suavizar=True se rellenan los huecos cortos y se filtran landmarks y fases
+    cola.enviar(session_id, analizar_video, input_path, output_path, csv_path,
+                segmentos=segmentos, renderizar=renderizar, cache=cache, suavizar=suavizar)
     
-    return {"session_id": session_id, "message": "Video procesado exitosamente"}
+    return {"session_id": session_id, "message": "Video en cola de procesamiento"}
 
-@app.get("/descargar_video/{session_id}")
-async def download_video(session_id: str):
+@app.get("/status/{session_id}")
+async def status(session_id: str):
     if session_id not in processing_sessions:
         raise HTTPException(status_code=404, detail="Sesión no encontrada")
+
+    return {
+        "session_id": session_id,
+        **cola.estado(session_id),
+        "video_disponible": os.path.exists(processing_sessions[session_id]["processed_video"])
+    }
+
+@app.get("/descargar_video/{session_id}")
+async def download_video(session_id: str):
+    verificar_sesion(session_id)
     
-    video_path = processing_sessions[session_id]["processed_video"]
+    sesion = processing_sessions[session_id]
+    video_path = sesion["processed_video"]
     if not os.path.exists(video_path):
-        raise HTTPException(status_code=404, detail="Video no encontrado")
+        # Análisis sin video: se dibuja ahora a partir de los landmarks en caché
+        if sesion["render"] is None:
+            sesion["render"] = cola.enviar(f"{session_id}:video", generar_video,
+                                           sesion["input_video"], video_path, cache=cache,
+                                           suavizar=sesion["suavizar"], segmentos=sesion["segmentos"])
+        try:
+            await asyncio.wrap_future(sesion["render"])
+        except Exception as e:
+            sesion["render"] = None
+            raise HTTPException(status_code=500, detail=f"Error al generar el video: {str(e)}")
+        if not os.path.exists(video_path):
+            raise HTTPException(status_code=404, detail="Video no encontrado")
     
     return FileResponse(
         video_path,
@@ -245,10 +126,20 @@ async def download_video(session_id: str):
         filename=f"processed_video_{session_id}.mp4"
     )
 
+@app.get("/resumen/{session_id}")
+async def summary(session_id: str):
+    # Ciclos de la marcha de cada lado: duración, apoyo/balanceo, máximos,
+    # mínimos y rango de cada articulación, curvas normalizadas y simetría
+    verificar_sesion(session_id)
+
+    resultado = cola.resultado(session_id)
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="Resumen no encontrado")
+    return {"session_id": session_id, **resultado["resumen"]}
+
 @app.get("/descargar_csv/{session_id}")
 async def download_csv(session_id: str):
-    if session_id not in processing_sessions:
-        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+    verificar_sesion(session_id)
     
     csv_path = processing_sessions[session_id]["csv_file"]
     if not os.path.exists(csv_path):
@@ -264,6 +155,11 @@ async def download_csv(session_id: str):
 async def cleanup_session(session_id: str):
     if session_id not in processing_sessions:
         raise HTTPException(status_code=404, detail="Sesión no encontrada")
+
+    for clave in (session_id, f"{session_id}:video"):
+        estado = cola.estado(clave)
+        if estado is not None and estado["estado"] not in (COMPLETADO, ERROR):
+            raise HTTPException(status_code=409, detail="El video aún se está procesando")
     
     try:
         temp_dir = processing_sessions[session_id]["temp_dir"]
@@ -283,6 +179,8 @@ async def cleanup_session(session_id: str):
         
         # Eliminar la sesión del diccionario
         del processing_sessions[session_id]
+        cola.liberar(session_id)
+        cola.liberar(f"{session_id}:video")
         
         return {"message": "Sesión limpiada exitosamente"}
     except Exception as e:
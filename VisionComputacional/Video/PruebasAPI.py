@@ -4,6 +4,7 @@ import time
 
 # Configuración de la API
 API_URL = "http://127.0.0.1:8000/analizar_video/"
+STATUS_URL = "http://127.0.0.1:8000/status/"
 DOWNLOAD_VIDEO_URL = "http://127.0.0.1:8000/descargar_video/"
 DOWNLOAD_CSV_URL = "http://127.0.0.1:8000/descargar_csv/"
 CLEANUP_URL = "http://127.0.0.1:8000/cleanup/"
@@ -30,9 +31,18 @@ def process_video():
     session_id = session_data['session_id']
     print(f"Video subido correctamente. ID de sesión: {session_id}")
     
-    # 2. Esperar un tiempo razonable para el procesamiento
+    # 2. Consultar el estado hasta que termine el procesamiento
     print("Procesando video...")
-    time.sleep(5) 
+    while True:
+        estado = requests.get(f"{STATUS_URL}{session_id}").json()
+        if estado["estado"] == "completado":
+            break
+        if estado["estado"] == "error":
+            print(f"Error al procesar el video: {estado['error']}")
+            return None
+        print(f"Progreso: {estado['frames_procesados']}/{estado['total_frames']} frames "
+              f"({estado['progreso']:.0f}%), ETA: {estado['eta_segundos']} s")
+        time.sleep(2)
     
     # 3. Descargar el video procesado
     video_url = f"{DOWNLOAD_VIDEO_URL}{session_id}"